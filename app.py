@@ -1,25 +1,125 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, request, jsonify, render_template, Response, stream_with_context
 from flask_cors import CORS
-from models import db, User, Skill, Transaction, TrustScore
+from models import db, User, Skill, Transaction, TrustScore, IPFSOutbox, AnchorBatch, utcnow
 from ipfs_service import IPFSService
+from ipfs_cache import CIDCache
+from ipfs_publisher import IPFSPublisher
+import ipfs_uploads
+import search_index
+import query_plans
+from skill_matcher import SkillMatchIndex
+from recommender import SkillRecommender
+import fraud
+import stats_store
+import ledger
+import bulk_import
+import merkle
+import trust
+import database
+from database import read_only, RoutingSession
+import http_cache
+import idempotency
+import transaction_history
+from metrics import Instrumentation
+from cid import document_cid
 import os
+import sys
 import datetime
+import io
 import json
+import click
 from config import Config
 from flask_migrate import Migrate
+from werkzeug.exceptions import RequestEntityTooLarge
 
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
 app.config.from_object(Config)
+# Bodies too large for any upload are refused before Werkzeug parses or spools them
+app.config['MAX_CONTENT_LENGTH'] = Config.IPFS_UPLOAD_MAX_BYTES + ipfs_uploads.FORM_OVERHEAD
+# Pool sizing from Config; options set explicitly in SQLALCHEMY_ENGINE_OPTIONS win
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = dict(
+    database.engine_options(app.config['SQLALCHEMY_DATABASE_URI'], Config),
+    **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+)
 db.init_app(app)
+database.init_app(app, db, Config)  # SQLite pragmas and the optional read-only engine
+http_cache.track_table_versions(RoutingSession)  # Version counters behind the ETags of read endpoints
 
-migrate = Migrate(app, db)
+def _include_in_migrations(object, name, type_, reflected, compare_to):
+    # The FTS5 search index is managed by search_index, not by autogenerate
+    return not (type_ == 'table' and name.startswith('skill_fts'))
 
+migrate = Migrate(app, db, render_as_batch=True, include_object=_include_in_migrations)
 
 
-ipfs_service = IPFSService()
+
+# Content-addressed read cache shared by every IPFS lookup
+ipfs_cache = CIDCache(
+    memory_bytes=Config.IPFS_CACHE_MEMORY_BYTES,
+    disk_dir=Config.IPFS_CACHE_DIR or os.path.join(app.instance_path, 'ipfs_cache'),
+    disk_bytes=Config.IPFS_CACHE_DISK_BYTES
+)
+
+ipfs_service = IPFSService(
+    cache=ipfs_cache,
+    pool_size=Config.IPFS_POOL_SIZE,
+    connect_timeout=Config.IPFS_CONNECT_TIMEOUT,
+    read_timeout=Config.IPFS_READ_TIMEOUT,
+    max_retries=Config.IPFS_MAX_RETRIES,
+    backoff_factor=Config.IPFS_RETRY_BACKOFF,
+    base_url=Config.IPFS_API_URL
+)
+
+# Response bodies by ETag, shared by every request of this worker
+response_cache = http_cache.ResponseCache(max_bytes=Config.RESPONSE_CACHE_BYTES)
+
+# Stored responses of write requests sent with an Idempotency-Key, replayed to retries
+idempotency_keys = idempotency.IdempotencyKeys(
+    ttl=Config.IDEMPOTENCY_KEY_TTL,
+    purge_interval=Config.IDEMPOTENCY_PURGE_INTERVAL
+)
+
+# Offerers per skill sorted by trust score, for /match_skills
+skill_match_index = SkillMatchIndex(app, max_age=Config.MATCH_INDEX_MAX_AGE)
+
+# Skill co-occurrence and ranked offerers, for /recommendations
+skill_recommender = SkillRecommender(app, max_age=Config.RECOMMENDER_MAX_AGE, related_k=Config.RECOMMENDER_RELATED_K)
+
+# Publishes queued transactions to IPFS off the request thread
+ipfs_publisher = IPFSPublisher(
+    app, ipfs_service,
+    batch_size=Config.IPFS_OUTBOX_BATCH_SIZE,
+    concurrency=Config.IPFS_OUTBOX_CONCURRENCY,
+    poll_interval=Config.IPFS_OUTBOX_POLL_INTERVAL,
+    max_attempts=Config.IPFS_OUTBOX_MAX_ATTEMPTS,
+    claim_timeout=Config.IPFS_OUTBOX_CLAIM_TIMEOUT,
+    autostart=Config.IPFS_PUBLISHER_AUTOSTART,
+    anchor_mode=Config.IPFS_ANCHOR_MODE,
+    anchor_interval=Config.IPFS_ANCHOR_INTERVAL,
+    anchor_max_leaves=Config.IPFS_ANCHOR_MAX_LEAVES
+)
+
+# Streams uploaded files to IPFS off the request thread
+ipfs_upload_dir = Config.IPFS_UPLOAD_DIR or os.path.join(app.instance_path, 'ipfs_uploads')
+file_uploader = ipfs_uploads.FileUploader(
+    app, ipfs_service,
+    concurrency=Config.IPFS_UPLOAD_CONCURRENCY,
+    max_pending=Config.IPFS_UPLOAD_MAX_PENDING,
+    status_ttl=Config.IPFS_UPLOAD_STATUS_TTL,
+    stale_after=Config.IPFS_UPLOAD_STALE_AFTER
+)
+
+# Per-request SQL and IPFS timings for Server-Timing headers and /metrics
+instrumentation = Instrumentation(
+    sample_rate=Config.METRICS_SAMPLE_RATE,
+    server_timing=Config.METRICS_SERVER_TIMING
+)
+if Config.METRICS_ENABLED:
+    instrumentation.init_app(app)
+    instrumentation.instrument_ipfs(ipfs_service)
 
 
 @app.route('/')
@@ -29,29 +129,80 @@ def home():
     except:
         return jsonify({'message': 'API is running. Templates not found.'}), 200
     
+def _transaction_for_ipfs(transaction_id):
+    """Plain values /ipfs/transaction needs from the database"""
+    transaction = Transaction.query.get_or_404(transaction_id)
+    outbox_entry = IPFSOutbox.query.filter_by(transaction_id=transaction.id).first()
+    record = {
+        'id': transaction.id,
+        'ipfs_hash': transaction.ipfs_hash,
+        'outbox_status': outbox_entry.status if outbox_entry else None,
+        'anchor_cid': transaction.anchor_cid,
+        'anchor_leaf_index': transaction.anchor_leaf_index,
+        'anchor_proof': transaction.anchor_proof,
+        'document': None
+    }
+    
+    queued = record['outbox_status'] in ('pending', 'publishing')
+    if not transaction.ipfs_hash and not transaction.anchor_cid and not queued:
+        # Prepare transaction data
+        offerer = User.query.get(transaction.offerer_id)
+        requester = User.query.get(transaction.requester_id)
+        skill = Skill.query.get(transaction.skill_id)
+        
+        record['document'] = {
+            'id': transaction.id,
+            'offerer': offerer.name,
+            'requester': requester.name,
+            'skill': skill.skill_name if skill else 'Unknown',
+            'amount_paid': transaction.amount_paid,
+            'transaction_date': transaction.transaction_date.isoformat(),
+            'status': transaction.status,
+            'timestamp': datetime.datetime.now().isoformat()
+        }
+    return record
+
+def _store_transaction_hash(transaction_id, ipfs_hash):
+    transaction = Transaction.query.get(transaction_id)
+    transaction.ipfs_hash = ipfs_hash
+    outbox_entry = IPFSOutbox.query.filter_by(transaction_id=transaction_id).first()
+    if outbox_entry:
+        outbox_entry.status = 'published'
+    db.session.commit()
+
 @app.route('/ipfs/transaction/<transaction_id>', methods=['GET'])
 def get_transaction_from_ipfs(transaction_id):
     try:
-        # Get transaction from database
-        transaction = Transaction.query.get_or_404(transaction_id)
+        record = _transaction_for_ipfs(transaction_id)
+        
+        # If the transaction is still queued in the outbox, report its publish state
+        if not record['ipfs_hash'] and record['outbox_status'] in ('pending', 'publishing'):
+            ipfs_publisher.notify()
+            return jsonify({
+                'message': 'Transaction is queued for IPFS publishing',
+                'transaction_id': record['id'],
+                'ipfs_status': record['outbox_status']
+            }), 202
+        
+        # Anchored in a Merkle batch: the proof leads from this transaction to the published root
+        if record['anchor_cid']:
+            # The anchor and proof of a transaction never change once it is anchored
+            etag = f"{record['anchor_cid']}-{record['anchor_leaf_index']}"
+            if request.if_none_match.contains(etag):
+                return http_cache.not_modified(etag, immutable_content=True)
+            return http_cache.immutable(jsonify({
+                'message': 'Transaction anchored on IPFS in a Merkle batch',
+                'transaction_id': record['id'],
+                'ipfs_status': 'anchored',
+                'anchor_cid': record['anchor_cid'],
+                'gateway_url': f"{Config.IPFS_GATEWAY_URL}{record['anchor_cid']}",
+                'leaf_index': record['anchor_leaf_index'],
+                'proof': json.loads(record['anchor_proof'])
+            }), etag)
         
         # If transaction doesn't have an IPFS hash yet, create one
-        if not hasattr(transaction, 'ipfs_hash') or not transaction.ipfs_hash:
-            # Prepare transaction data
-            offerer = User.query.get(transaction.offerer_id)
-            requester = User.query.get(transaction.requester_id)
-            skill = Skill.query.get(transaction.skill_id)
-            
-            transaction_data = {
-                'id': transaction.id,
-                'offerer': offerer.name,
-                'requester': requester.name,
-                'skill': skill.skill_name if skill else 'Unknown',
-                'amount_paid': transaction.amount_paid,
-                'transaction_date': transaction.transaction_date.isoformat(),
-                'status': transaction.status,
-                'timestamp': datetime.datetime.now().isoformat()
-            }
+        if not record['ipfs_hash']:
+            transaction_data = record['document']
             
             # Add to IPFS via Filebase
             ipfs_hash = ipfs_service.add_json_to_ipfs(transaction_data)
@@ -59,13 +210,12 @@ def get_transaction_from_ipfs(transaction_id):
             if isinstance(ipfs_hash, dict) and 'error' in ipfs_hash:
                 return jsonify({'error': ipfs_hash['error']}), 500
             
-            # Store the hash in the transaction
-            transaction.ipfs_hash = ipfs_hash
-            db.session.commit()
-            
-            # Pin the hash to ensure it persists
+            # Pin the hash to ensure persistence
             pin_result = ipfs_service.pin_hash(ipfs_hash)
             
+            # Store the hash in the transaction
+            _store_transaction_hash(record['id'], ipfs_hash)
+            
             return jsonify({
                 'message': 'Transaction added to IPFS',
                 'ipfs_hash': ipfs_hash,
@@ -74,63 +224,163 @@ def get_transaction_from_ipfs(transaction_id):
                 'pin_result': pin_result
             })
         
-        # If transaction already has an IPFS hash, retrieve the data
-        ipfs_data = ipfs_service.get_json_from_ipfs(transaction.ipfs_hash)
+        # If transaction already has an IPFS hash, retrieve the data; a client holding it needs no fetch
+        if request.if_none_match.contains(record['ipfs_hash']):
+            return http_cache.not_modified(record['ipfs_hash'], immutable_content=True)
+        
+        ipfs_data = ipfs_service.get_json_from_ipfs(record['ipfs_hash'])
         
         if isinstance(ipfs_data, dict) and 'error' in ipfs_data:
             return jsonify({'error': ipfs_data['error']}), 500
         
-        return jsonify({
-            'ipfs_hash': transaction.ipfs_hash,
-            'gateway_url': f"{Config.IPFS_GATEWAY_URL}{transaction.ipfs_hash}",
+        return http_cache.immutable(jsonify({
+            'ipfs_hash': record['ipfs_hash'],
+            'gateway_url': f"{Config.IPFS_GATEWAY_URL}{record['ipfs_hash']}",
             'transaction_data': ipfs_data
+        }), record['ipfs_hash'])
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    if not Config.METRICS_ENABLED:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    return Response(instrumentation.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/ipfs/stats', methods=['GET'])
+def ipfs_stats():
+    try:
+        return jsonify({
+            'pool': ipfs_service.pool_stats(),
+            'cache': ipfs_service.cache.stats() if ipfs_service.cache is not None else None,
+            'uploads': file_uploader.stats()
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/ipfs/upload', methods=['POST'])
+def upload_file():
+    """Take a file as the raw request body or a multipart 'file' field and upload it in the background"""
+    try:
+        try:
+            if request.files:
+                upload = request.files.get('file')
+                if upload is None:
+                    return jsonify({'error': "Multipart uploads need a 'file' field"}), 400
+                stream, filename = upload.stream, upload.filename or ''
+            else:
+                stream, filename = request.stream, request.headers.get('X-Filename', '')
+            
+            # One pass over the body: written to disk and hashed block by block
+            path, cid, size = ipfs_uploads.spool(stream, ipfs_upload_dir, Config.IPFS_UPLOAD_MAX_BYTES)
+        except (ipfs_uploads.UploadTooLarge, RequestEntityTooLarge):
+            return jsonify({'error': f'File is larger than {Config.IPFS_UPLOAD_MAX_BYTES} bytes'}), 413
+        if size == 0:
+            os.remove(path)
+            return jsonify({'error': 'The file is empty'}), 400
+        
+        try:
+            upload_status = file_uploader.submit(path, cid, size, filename)
+        except ipfs_uploads.UploadQueueFull as e:
+            return jsonify({'error': str(e)}), 503
+        
+        # Content already pinned is done right away; anything else is polled at status_url
+        if not upload_status['deduplicated']:
+            message = 'File upload to IPFS queued'
+        elif upload_status['state'] == 'done':
+            message = 'File already on IPFS'
+        else:
+            message = 'File upload already in progress'
+        return jsonify({
+            'message': message,
+            'upload': upload_status,
+            'status_url': f"/ipfs/uploads/{upload_status['id']}",
+            'gateway_url': f"{Config.IPFS_GATEWAY_URL}{cid}"
+        }), 200 if upload_status['state'] == 'done' else 202
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/ipfs/uploads', methods=['GET'])
+def list_uploads():
+    try:
+        active_only = request.args.get('active', 'false').lower() == 'true'
+        return jsonify({'uploads': file_uploader.uploads(active_only=active_only), 'stats': file_uploader.stats()})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/ipfs/uploads/<upload_id>', methods=['GET'])
+def get_upload(upload_id):
+    try:
+        upload_status = file_uploader.status(upload_id)
+        if upload_status is None:
+            return jsonify({'error': 'Upload not found'}), 404
+        return jsonify(upload_status)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _user_profile_document(user_id):
+    """The profile document published for a user and the hash stored for the last one"""
+    # Get user from database
+    user = User.query.get_or_404(user_id)
+    
+    # Get skills, in a fixed order so the same profile always serialises the same way
+    skills = Skill.query.filter_by(user_id=user_id).order_by(Skill.id).all()
+    skills_data = [{'name': skill.skill_name, 'is_offered': skill.is_offered} for skill in skills]
+    
+    # Create user profile data; no timestamp, so unchanged data keeps its CID
+    return {
+        'id': user.id,
+        'name': user.name,
+        'trust_score': user.trust_score,
+        'skills': skills_data
+    }, user.ipfs_profile_hash
+
+def _store_user_profile_hash(user_id, ipfs_hash):
+    User.query.get(user_id).ipfs_profile_hash = ipfs_hash
+    db.session.commit()
+
 @app.route('/ipfs/user/<user_id>', methods=['GET'])
 def store_user_profile_on_ipfs(user_id):
     try:
-        # Get user from database
-        user = User.query.get_or_404(user_id)
-        
-        # Get skills
-        skills = Skill.query.filter_by(user_id=user_id).all()
-        skills_data = [{'name': skill.skill_name, 'is_offered': skill.is_offered} for skill in skills]
-        
-        # Create user profile data
-        user_data = {
-            'id': user.id,
-            'name': user.name,
-            'trust_score': user.trust_score,
-            'skills': skills_data,
-            'timestamp': datetime.datetime.now().isoformat()
-        }
+        user_data, stored_hash = _user_profile_document(user_id)
+        
+        # The profile is already on IPFS if its CID is the stored one: no upload, no pin
+        cid = document_cid(user_data)
+        if cid == stored_hash:
+            if request.if_none_match.contains_weak(cid):
+                return http_cache.not_modified(cid)
+            return http_cache.revalidate(jsonify({
+                'message': 'User profile unchanged on IPFS via Filebase',
+                'ipfs_hash': cid,
+                'gateway_url': f"{Config.IPFS_GATEWAY_URL}{cid}",
+                'user_data': user_data,
+                'pin_result': None
+            }), cid)
         
         # Add to IPFS via Filebase
         ipfs_hash = ipfs_service.add_json_to_ipfs(user_data)
         
         if isinstance(ipfs_hash, dict) and 'error' in ipfs_hash:
             return jsonify({'error': ipfs_hash['error']}), 500
+        if ipfs_hash != cid:
+            app.logger.warning('Filebase returned %s for a profile computed locally as %s', ipfs_hash, cid)
         
-        # Store the hash
-        user.ipfs_profile_hash = ipfs_hash
-        db.session.commit()
-        
-        # Pin the hash to ensure it persists
+        # Pin the hash to ensure persistence, then store it
         pin_result = ipfs_service.pin_hash(ipfs_hash)
+        _store_user_profile_hash(user_data['id'], ipfs_hash)
         
-        return jsonify({
+        return http_cache.revalidate(jsonify({
             'message': 'User profile added to IPFS via Filebase',
             'ipfs_hash': ipfs_hash,
             'gateway_url': f"{Config.IPFS_GATEWAY_URL}{ipfs_hash}",
             'user_data': user_data,
             'pin_result': pin_result
-        })
+        }), ipfs_hash)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/register', methods=['GET', 'POST'])
+@idempotency_keys.idempotent
 def register_user():
     try:
         if request.method == 'GET':
@@ -158,9 +408,11 @@ def register_user():
             trust_score=5.0  # Default trust score
         )
         db.session.add(new_user)
-        db.session.commit()
+        stats_store.record_users_created()
+        db.session.flush()  # Assign the user id; user and skills commit together below
 
         # Register skills the user offers/requested
+        new_skills = []
         if 'skills' in data:
             for skill_data in data['skills']:
                 new_skill = Skill(
@@ -170,43 +422,132 @@ def register_user():
                     is_offered=skill_data['is_offered']
                 )
                 db.session.add(new_skill)
+                new_skills.append(new_skill)
+                stats_store.record_skill_added(new_skill.skill_name, new_skill.is_offered)
 
         db.session.commit()
+        
+        for new_skill in new_skills:
+            skill_match_index.put_skill(new_skill, new_user)
+        
         return jsonify({'message': 'User registered successfully!', 'user_id': new_user.id})
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
-@app.route('/users', methods=['GET'])
-def get_users():
+@app.route('/register/bulk', methods=['POST'])
+def register_users_bulk():
+    """Register many users from NDJSON, CSV or a JSON list, reporting errors per row"""
     try:
-        users = User.query.all()
-        user_list = []
+        content_type = request.mimetype
+        if content_type == 'application/json':
+            data = request.get_json()
+            users = data.get('users') if isinstance(data, dict) else data
+            if not isinstance(users, list):
+                return jsonify({'error': 'A list of users is required'}), 400
+            rows = enumerate(users, 1)
+        elif content_type in ('application/x-ndjson', 'text/csv'):
+            lines = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+            rows = bulk_import.parse_csv(lines) if content_type == 'text/csv' else bulk_import.parse_ndjson(lines)
+        else:
+            return jsonify({'error': 'Send application/json, application/x-ndjson or text/csv'}), 415
+        
+        created, errors = bulk_import.import_users(rows)
+        if created:
+            skill_match_index.invalidate()
+        
+        return jsonify({'created': created, 'failed': len(errors), 'errors': errors})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+USERS_PAGE_SIZE = 100
+USERS_MAX_PAGE_SIZE = 1000
 
-        for user in users:
-            skills = Skill.query.filter_by(user_id=user.id).all()
-            skills_data = [
+def _users_page(after_id, limit):
+    """One keyset page of users with their skills loaded in a single batched query"""
+    users = User.query.options(db.selectinload(User.skills)).filter(
+        User.id > after_id
+    ).order_by(User.id).limit(limit).all()
+    
+    return [
+        {
+            'id': user.id,
+            'name': user.name,
+            'email': user.email,
+            'trust_score': user.trust_score,
+            'skillcoins_balance': user.skillcoins_balance,
+            'skills': [
                 {
                     'skill_name': skill.skill_name,
                     'is_offered': skill.is_offered,
                     'availability': skill.availability
-                } for skill in skills
+                } for skill in user.skills
             ]
+        } for user in users
+    ]
 
-            user_list.append({
-                'id': user.id,
-                'name': user.name,
-                'email': user.email,
-                'trust_score': user.trust_score,
-                'skillcoins_balance': user.skillcoins_balance,
-                'skills': skills_data
-            })
+def _users_page_args():
+    """(after_id, limit) of a /users request"""
+    after_id = request.args.get('after_id', 0, type=int)
+    limit = min(max(request.args.get('limit', USERS_PAGE_SIZE, type=int), 1), USERS_MAX_PAGE_SIZE)
+    return after_id, limit
+
+def _users_page_ids():
+    """Ids of the users on the requested /users page, for its ETag; None for streamed exports"""
+    if request.args.get('format', 'json') == 'ndjson' or request.args.get('stream', 'false').lower() in ('1', 'true'):
+        return None
+    after_id, limit = _users_page_args()
+    return db.session.scalars(db.select(User.id).where(User.id > after_id).order_by(User.id).limit(limit)).all()
+
+def _view_user_id():
+    return [request.view_args['user_id']]
+
+def _iter_users(after_id, page_size):
+    """Walk every user after after_id one page at a time"""
+    while True:
+        page = _users_page(after_id, page_size)
+        yield from page
+        if len(page) < page_size:
+            return
+        after_id = page[-1]['id']
+        db.session.expunge_all()  # Keep the identity map from growing with the export
 
-        return jsonify(user_list)
+@app.route('/users', methods=['GET'])
+@read_only
+@response_cache.versioned('user', 'skill', users=_users_page_ids)
+def get_users():
+    try:
+        after_id, limit = _users_page_args()
+        output_format = request.args.get('format', 'json')
+        
+        # Full export: stream page by page instead of building the whole list
+        if output_format == 'ndjson':
+            lines = (json.dumps(user) + '\n' for user in _iter_users(after_id, limit))
+            return Response(stream_with_context(lines), mimetype='application/x-ndjson')
+        
+        if request.args.get('stream', 'false').lower() in ('1', 'true'):
+            def generate():
+                yield '['
+                for index, user in enumerate(_iter_users(after_id, limit)):
+                    yield (',' if index else '') + json.dumps(user)
+                yield ']'
+            return Response(stream_with_context(generate()), mimetype='application/json')
+        
+        user_list = _users_page(after_id, limit)
+        response = jsonify(user_list)
+        
+        # Cursor for the next page, absent on the last one
+        if len(user_list) == limit:
+            response.headers['X-Next-After-Id'] = str(user_list[-1]['id'])
+        return response
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Served from the in-memory index, so its generation alone tells whether the response changed
 @app.route('/match_skills', methods=['GET'])
+@read_only
+@response_cache.versioned(generation=skill_match_index.generation)
 def match_skills():
     try:
         # Get skill requested by the user
@@ -215,25 +556,11 @@ def match_skills():
         if not requested_skill:
             return jsonify({'error': 'Please provide a skill_name parameter'}), 400
         
-        # Find users offering this skill
-        matching_skills = Skill.query.filter_by(
-            skill_name=requested_skill, 
-            is_offered=True
-        ).all()
-        
-        matches = []
-        for skill in matching_skills:
-            user = User.query.get(skill.user_id)
-            if user:  # Make sure user exists
-                matches.append({
-                    'user_id': user.id,
-                    'name': user.name,
-                    'trust_score': user.trust_score,
-                    'availability': skill.availability
-                })
+        limit = request.args.get('limit', type=int)
+        min_trust = request.args.get('min_trust', type=float)
         
-        # Sort matches by trust score (higher score first)
-        matches.sort(key=lambda x: x['trust_score'], reverse=True)
+        # Users offering this skill, already sorted by trust score (higher score first)
+        matches = skill_match_index.match(requested_skill, limit=limit, min_trust=min_trust)
         
         return jsonify({
             'requested_skill': requested_skill,
@@ -242,48 +569,84 @@ def match_skills():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     
+def _skill_document(skill_id):
+    """The metadata document published for a skill and the hash stored for the last one"""
+    # Get skill from database
+    skill = Skill.query.get_or_404(skill_id)
+    user = User.query.get(skill.user_id)
+    
+    # Create skill metadata; no timestamp, so unchanged data keeps its CID
+    return {
+        'id': skill.id,
+        'name': skill.skill_name,
+        'offered_by': user.name,
+        'user_id': user.id,
+        'is_offered': skill.is_offered,
+        'availability': skill.availability
+    }, skill.ipfs_hash
+
+def _store_skill_hash(skill_id, ipfs_hash):
+    Skill.query.get(skill_id).ipfs_hash = ipfs_hash
+    db.session.commit()
+
 @app.route('/ipfs/skill/<skill_id>', methods=['GET'])
 def store_skill_on_ipfs(skill_id):
     try:
-        # Get skill from database
-        skill = Skill.query.get_or_404(skill_id)
-        user = User.query.get(skill.user_id)
-        
-        # Create skill metadata
-        skill_data = {
-            'id': skill.id,
-            'name': skill.skill_name,
-            'offered_by': user.name,
-            'user_id': user.id,
-            'is_offered': skill.is_offered,
-            'availability': skill.availability,
-            'timestamp': datetime.datetime.now().isoformat()
-        }
+        skill_data, stored_hash = _skill_document(skill_id)
+        
+        # The metadata is already on IPFS if its CID is the stored one: no upload, no pin
+        cid = document_cid(skill_data)
+        if cid == stored_hash:
+            if request.if_none_match.contains_weak(cid):
+                return http_cache.not_modified(cid)
+            return http_cache.revalidate(jsonify({
+                'message': 'Skill metadata unchanged on IPFS via Filebase',
+                'ipfs_hash': cid,
+                'gateway_url': f"{Config.IPFS_GATEWAY_URL}{cid}",
+                'skill_data': skill_data,
+                'pin_result': None
+            }), cid)
         
         # Add to IPFS via Filebase
         ipfs_hash = ipfs_service.add_json_to_ipfs(skill_data)
         
         if isinstance(ipfs_hash, dict) and 'error' in ipfs_hash:
             return jsonify({'error': ipfs_hash['error']}), 500
+        if ipfs_hash != cid:
+            app.logger.warning('Filebase returned %s for skill metadata computed locally as %s', ipfs_hash, cid)
         
-        # Store the hash
-        skill.ipfs_hash = ipfs_hash
-        db.session.commit()
-        
-        # Pin the hash to ensure it persists
+        # Pin the hash to ensure persistence, then store it
         pin_result = ipfs_service.pin_hash(ipfs_hash)
+        _store_skill_hash(skill_data['id'], ipfs_hash)
         
-        return jsonify({
+        return http_cache.revalidate(jsonify({
             'message': 'Skill metadata added to IPFS via Filebase',
             'ipfs_hash': ipfs_hash,
             'gateway_url': f"{Config.IPFS_GATEWAY_URL}{ipfs_hash}",
             'skill_data': skill_data,
             'pin_result': pin_result
-        })
+        }), ipfs_hash)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     
+def _is_positive_amount(amount):
+    return not isinstance(amount, bool) and isinstance(amount, (int, float)) and amount > 0
+
+def _transaction_document(transaction_id, offerer, requester, skill, amount, transaction_date):
+    # The document published to IPFS for a transaction; its date is the stored one, so it can be verified
+    return {
+        'id': transaction_id,
+        'offerer': offerer.name,
+        'requester': requester.name,
+        'skill': skill.skill_name,
+        'amount_paid': amount,
+        'transaction_date': transaction_date.isoformat(),
+        'status': 'completed',
+        'timestamp': datetime.datetime.now().isoformat()
+    }
+
 @app.route('/create_transaction', methods=['POST'])
+@idempotency_keys.idempotent
 def create_transaction():
     try:
         data = request.get_json()
@@ -308,9 +671,9 @@ def create_transaction():
         if skill.user_id != data['offerer_id']:
             return jsonify({'error': 'This skill does not belong to the specified offerer'}), 400
         
-        # Check if requester has enough SkillCoins
-        if requester.skillcoins_balance < data['amount_paid']:
-            return jsonify({'error': 'Insufficient SkillCoins balance'}), 400
+        amount = data['amount_paid']
+        if not _is_positive_amount(amount):
+            return jsonify({'error': 'amount_paid must be a positive number'}), 400
         
         # Create transaction
         new_transaction = Transaction(
@@ -320,64 +683,215 @@ def create_transaction():
             amount_paid=data['amount_paid']
         )
         
-        # Transfer coins from requester to offerer
-        requester.skillcoins_balance -= data['amount_paid']
-        offerer.skillcoins_balance += data['amount_paid']
+        db.session.add(new_transaction)
+        db.session.flush()  # Assign the transaction id for the ledger and the IPFS document
         
-        # Update trust scores (simple increment)
-        offerer.trust_score += 0.1
-        requester.trust_score += 0.05
+        # Transfer coins from requester to offerer; the balance check happens in the debit itself
+        try:
+            ledger.transfer(new_transaction.id, requester.id, offerer.id, amount)
+        except ledger.InsufficientFunds as e:
+            db.session.rollback()
+            return jsonify({'error': str(e)}), 400
         
-        db.session.add(new_transaction)
+        # Update trust scores (simple increment)
+        ledger.adjust_trust(offerer.id, trust.OFFERER_TRUST_INCREMENT)
+        ledger.adjust_trust(requester.id, trust.REQUESTER_TRUST_INCREMENT)
+        
+        # Queue the IPFS document in the same database transaction as the transfer
+        db.session.add(IPFSOutbox(
+            transaction_id=new_transaction.id,
+            payload=json.dumps(_transaction_document(new_transaction.id, offerer, requester, skill, amount,
+                                                     new_transaction.transaction_date))
+        ))
+        stats_store.record_transaction(offerer.id, requester.id)
         db.session.commit()
         
-        # Store transaction on IPFS via Filebase
-        transaction_data = {
-            'id': new_transaction.id,
-            'offerer': offerer.name,
-            'requester': requester.name,
-            'skill': skill.skill_name,
-            'amount_paid': data['amount_paid'],
-            'transaction_date': datetime.datetime.now().isoformat(),
-            'status': 'completed',
-            'timestamp': datetime.datetime.now().isoformat()
-        }
+        skill_match_index.update_trust(offerer.id, offerer.trust_score)
+        skill_match_index.update_trust(requester.id, requester.trust_score)
         
-        # Add to IPFS and pin
-        ipfs_hash = ipfs_service.add_json_to_ipfs(transaction_data)
+        # Publishing and pinning happen in the background
+        ipfs_publisher.notify()
         
-        if isinstance(ipfs_hash, dict) and 'error' in ipfs_hash:
-            return jsonify({'error': ipfs_hash['error']}), 500
+        return jsonify({
+            'message': 'Transaction successful',
+            'transaction_id': new_transaction.id,
+            'ipfs_status': 'pending',
+            'ipfs_hash': None,
+            'ipfs_gateway_url': None
+        })
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+TRANSACTION_BATCH_MAX_SIZE = 1000
+
+@app.route('/create_transactions', methods=['POST'])
+@idempotency_keys.idempotent
+def create_transactions():
+    """Apply a batch of transfers in one database transaction with a result per item"""
+    try:
+        data = request.get_json()
+        items = data.get('transactions') if isinstance(data, dict) else data
+        if not isinstance(items, list) or not items:
+            return jsonify({'error': 'A non-empty list of transactions is required'}), 400
+        if len(items) > TRANSACTION_BATCH_MAX_SIZE:
+            return jsonify({'error': f'At most {TRANSACTION_BATCH_MAX_SIZE} transactions per batch'}), 400
+        
+        results = [None] * len(items)
+        required_fields = ['offerer_id', 'requester_id', 'skill_id', 'amount_paid']
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                results[index] = 'Transaction must be an object'
+                continue
+            missing = [field for field in required_fields if field not in item]
+            if missing:
+                results[index] = f'Field {missing[0]} is required'
+            elif not _is_positive_amount(item['amount_paid']):
+                results[index] = 'amount_paid must be a positive number'
+        
+        # Load every referenced user and skill with one query each
+        candidates = [i for i, error in enumerate(results) if error is None]
+        user_ids = {items[i][field] for i in candidates for field in ('offerer_id', 'requester_id')}
+        skill_ids = {items[i]['skill_id'] for i in candidates}
+        users = {user.id: user for user in User.query.filter(User.id.in_(user_ids))} if user_ids else {}
+        skills = {skill.id: skill for skill in Skill.query.filter(Skill.id.in_(skill_ids))} if skill_ids else {}
+        
+        valid = []
+        for index in candidates:
+            item = items[index]
+            skill = skills.get(item['skill_id'])
+            if item['offerer_id'] not in users or item['requester_id'] not in users or not skill:
+                results[index] = 'Invalid user or skill IDs'
+            elif skill.user_id != item['offerer_id']:
+                results[index] = 'This skill does not belong to the specified offerer'
+            else:
+                valid.append(index)
+        
+        # Transfers run in request order; one the requester cannot cover is skipped
+        applied = ledger.apply_transfers(
+            [(items[i]['requester_id'], items[i]['offerer_id'], items[i]['amount_paid']) for i in valid]
+        )
+        accepted = []
+        for index, ok in zip(valid, applied):
+            if ok:
+                accepted.append(index)
+            else:
+                results[index] = 'Insufficient SkillCoins balance'
+        
+        if accepted:
+            transaction_date = utcnow()
+            transaction_ids = db.session.scalars(
+                db.insert(Transaction).returning(Transaction.id, sort_by_parameter_order=True),
+                [{
+                    'offerer_id': items[i]['offerer_id'],
+                    'requester_id': items[i]['requester_id'],
+                    'skill_id': items[i]['skill_id'],
+                    'amount_paid': items[i]['amount_paid'],
+                    'transaction_date': transaction_date
+                } for i in accepted]
+            ).all()
+            
+            ledger.record_transfers([
+                (transaction_id, items[i]['requester_id'], items[i]['offerer_id'], items[i]['amount_paid'])
+                for transaction_id, i in zip(transaction_ids, accepted)
+            ])
+            
+            trust_deltas = {}
+            for i in accepted:
+                offerer_id, requester_id = items[i]['offerer_id'], items[i]['requester_id']
+                trust_deltas[offerer_id] = trust_deltas.get(offerer_id, 0) + trust.OFFERER_TRUST_INCREMENT
+                trust_deltas[requester_id] = trust_deltas.get(requester_id, 0) + trust.REQUESTER_TRUST_INCREMENT
+            ledger.adjust_trust_many(trust_deltas)
             
-        new_transaction.ipfs_hash = ipfs_hash
+            # Queue every IPFS document in the same database transaction
+            db.session.execute(db.insert(IPFSOutbox), [{
+                'transaction_id': transaction_id,
+                'payload': json.dumps(_transaction_document(
+                    transaction_id,
+                    users[items[i]['offerer_id']],
+                    users[items[i]['requester_id']],
+                    skills[items[i]['skill_id']],
+                    items[i]['amount_paid'],
+                    transaction_date
+                ))
+            } for transaction_id, i in zip(transaction_ids, accepted)])
+            
+            stats_store.record_transactions([(items[i]['offerer_id'], items[i]['requester_id']) for i in accepted])
+            for transaction_id, i in zip(transaction_ids, accepted):
+                results[i] = transaction_id
+        
         db.session.commit()
         
-        # Pin the hash
-        ipfs_service.pin_hash(ipfs_hash)
+        if accepted:
+            trust_scores = db.session.query(User.id, User.trust_score).filter(User.id.in_(list(trust_deltas)))
+            for user_id, trust_score in trust_scores:
+                skill_match_index.update_trust(user_id, trust_score)
+            
+            # The whole batch is published and pinned in the background
+            ipfs_publisher.notify()
         
         return jsonify({
-            'message': 'Transaction successful',
-            'transaction_id': new_transaction.id,
-            'ipfs_hash': ipfs_hash,
-            'ipfs_gateway_url': f"{Config.IPFS_GATEWAY_URL}{ipfs_hash}"
+            'created': len(accepted),
+            'failed': len(items) - len(accepted),
+            'results': [
+                {'index': index, 'status': 'error', 'error': result} if isinstance(result, str) else
+                {'index': index, 'status': 'created', 'transaction_id': result, 'ipfs_status': 'pending'}
+                for index, result in enumerate(results)
+            ]
         })
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+def _anchored_transaction(ipfs_hash, transaction_id):
+    """The transaction with this id if it is anchored under the batch root ipfs_hash, else None"""
+    if transaction_id is None:
+        return None
+    transaction = Transaction.query.get(transaction_id)
+    return transaction if transaction and transaction.anchor_cid == ipfs_hash else None
+
+def _database_record(ipfs_hash):
+    """The local record of the transaction published under ipfs_hash, or None"""
+    transaction = Transaction.query.filter_by(ipfs_hash=ipfs_hash).first()
+    if not transaction:
+        return None
+    
+    offerer = User.query.get(transaction.offerer_id)
+    requester = User.query.get(transaction.requester_id)
+    skill = Skill.query.get(transaction.skill_id)
+    return {
+        'id': transaction.id,
+        'offerer': offerer.name,
+        'requester': requester.name,
+        'skill': skill.skill_name if skill else 'Unknown',
+        'amount_paid': float(transaction.amount_paid),
+        'status': transaction.status
+    }
+
 @app.route('/verify/transaction/<ipfs_hash>', methods=['GET'])
+@read_only
 def verify_transaction(ipfs_hash):
     try:
-        # Try to retrieve transaction from IPFS via Filebase
+        # Anchored transactions are checked locally against their batch root
+        transaction_id = request.args.get('transaction_id', type=int)
+        transaction = _anchored_transaction(ipfs_hash, transaction_id)
+        if transaction is not None:
+            # Root documents are content addressed, so after the first fetch this is served from the local cache
+            return _verify_anchored(transaction, ipfs_service.get_json_from_ipfs(ipfs_hash))
+        if transaction_id is None and AnchorBatch.query.filter_by(root_cid=ipfs_hash).first():
+            return jsonify({
+                'verified': False,
+                'error': 'This is an anchor batch root; pass transaction_id to verify one of its transactions'
+            }), 400
+        
+        # Fetch the document from IPFS via Filebase
         ipfs_data = ipfs_service.get_json_from_ipfs(ipfs_hash)
         
         if isinstance(ipfs_data, dict) and 'error' in ipfs_data:
             return jsonify({'verified': False, 'error': ipfs_data['error']}), 404
         
-        # Check if transaction exists in database
-        transaction = Transaction.query.filter_by(ipfs_hash=ipfs_hash).first()
-        
-        if not transaction:
+        database_record = _database_record(ipfs_hash)
+        if not database_record:
             return jsonify({
                 'verified': False,
                 'message': 'Transaction exists on IPFS but not in local database',
@@ -385,19 +899,8 @@ def verify_transaction(ipfs_hash):
             })
         
         # Verify that the transaction details match
-        offerer = User.query.get(transaction.offerer_id)
-        requester = User.query.get(transaction.requester_id)
-        skill = Skill.query.get(transaction.skill_id)
-        
         verification = {
-            'database_record': {
-                'id': transaction.id,
-                'offerer': offerer.name,
-                'requester': requester.name,
-                'skill': skill.skill_name if skill else 'Unknown',
-                'amount_paid': float(transaction.amount_paid),
-                'status': transaction.status
-            },
+            'database_record': database_record,
             'ipfs_record': ipfs_data,
             'gateway_url': f"{Config.IPFS_GATEWAY_URL}{ipfs_hash}",
             'verified': True
@@ -407,47 +910,100 @@ def verify_transaction(ipfs_hash):
     except Exception as e:
         return jsonify({'verified': False, 'error': str(e)}), 500
 
+# Fields of an anchored document that never change after the transaction is created
+ANCHORED_FIELDS = ('id', 'amount_paid', 'transaction_date', 'status')
+
+def _verify_anchored(transaction, root_document):
+    """Check a transaction against its Merkle root document, fetched by the caller"""
+    anchor = AnchorBatch.query.filter_by(root_cid=transaction.anchor_cid).first()
+    outbox_entry = IPFSOutbox.query.filter_by(transaction_id=transaction.id).first()
+    if not anchor or not outbox_entry:
+        return jsonify({'verified': False, 'error': 'Anchor batch or anchored document not found locally'}), 404
+    
+    if isinstance(root_document, dict) and 'error' in root_document:
+        return jsonify({'verified': False, 'error': root_document['error']}), 404
+    
+    document = json.loads(outbox_entry.payload)
+    leaf = merkle.leaf_hash(document)
+    proof = json.loads(transaction.anchor_proof)
+    
+    offerer = User.query.get(transaction.offerer_id)
+    requester = User.query.get(transaction.requester_id)
+    skill = Skill.query.get(transaction.skill_id)
+    database_record = {
+        'id': transaction.id,
+        'offerer': offerer.name,
+        'requester': requester.name,
+        'skill': skill.skill_name if skill else 'Unknown',
+        'amount_paid': float(transaction.amount_paid),
+        'transaction_date': transaction.transaction_date.isoformat(),
+        'status': transaction.status
+    }
+    
+    checks = {
+        # Users and skills can be renamed after anchoring; only fields fixed at creation must match
+        'record_matches': all(document.get(key) == database_record[key] for key in ANCHORED_FIELDS),
+        'proof_valid': merkle.verify(leaf, proof, anchor.root_hash),
+        'root_matches': root_document.get('root') == anchor.root_hash
+    }
+    
+    return jsonify({
+        'database_record': database_record,
+        'anchored_record': document,
+        'anchor': {
+            'cid': transaction.anchor_cid,
+            'root': anchor.root_hash,
+            'leaf': leaf,
+            'leaf_index': transaction.anchor_leaf_index,
+            'proof': proof
+        },
+        'checks': checks,
+        'gateway_url': f"{Config.IPFS_GATEWAY_URL}{transaction.anchor_cid}",
+        'verified': all(checks.values())
+    })
+
+SEARCH_DEFAULT_LIMIT = 50
+SEARCH_MAX_LIMIT = 500
+
 @app.route('/search_skills', methods=['GET'])
+@read_only
 def search_skills():
     try:
         skill_type = request.args.get('type', 'offered')  # 'offered' or 'requested'
         skill_name = request.args.get('name', '')
+        limit = min(max(request.args.get('limit', SEARCH_DEFAULT_LIMIT, type=int), 1), SEARCH_MAX_LIMIT)
         
         # Filter by is_offered based on type parameter
         is_offered = True if skill_type == 'offered' else False
         
-        query = Skill.query.filter_by(is_offered=is_offered)
-        
-        # Add skill name filter if provided
-        if skill_name:
-            query = query.filter(Skill.skill_name.like(f'%{skill_name}%'))
-        
-        skills = query.all()
+        # Ranked top-N from the trigram index, user joined in the same query
+        rows = search_index.search_skills(skill_name, is_offered, limit)
         
-        if not skills:
-            return jsonify([]), 200  # Return empty array rather than potential error
-        
-        result = []
-        for skill in skills:
-            user = User.query.get(skill.user_id)
-            if user:  # Make sure user exists
-                result.append({
-                    'skill_id': skill.id,
-                    'skill_name': skill.skill_name,
-                    'user_id': user.id,
-                    'user_name': user.name,
-                    'availability': skill.availability,
-                    'trust_score': user.trust_score
-                })
+        result = [
+            {
+                'skill_id': row['id'],
+                'skill_name': row['skill_name'],
+                'user_id': row['user_id'],
+                'user_name': row['user_name'],
+                'availability': row['availability'],
+                'trust_score': row['trust_score']
+            } for row in rows
+        ]
         
         return jsonify(result)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 500
+
 @app.route('/user/<int:user_id>', methods=['GET'])
+@read_only
+@response_cache.versioned('user', 'skill', 'transaction', users=_view_user_id)
 def get_user_profile(user_id):
     try:
         user = User.query.get_or_404(user_id)
+        limit = min(max(request.args.get('history_limit', HISTORY_PAGE_SIZE, type=int), 1), HISTORY_MAX_PAGE_SIZE)
         
         # Get skills offered by this user
         offered_skills = Skill.query.filter_by(user_id=user_id, is_offered=True).all()
@@ -468,23 +1024,8 @@ def get_user_profile(user_id):
             } for skill in requested_skills
         ]
         
-        # Get transaction history
-        given_transactions = Transaction.query.filter_by(offerer_id=user_id).all()
-        received_transactions = Transaction.query.filter_by(requester_id=user_id).all()
-        
-        transaction_history = []
-        for tx in given_transactions + received_transactions:
-            skill = Skill.query.get(tx.skill_id)
-            transaction_history.append({
-                'id': tx.id,
-                'date': tx.transaction_date.strftime('%Y-%m-%d %H:%M:%S'),
-                'skill': skill.skill_name if skill else 'Unknown',
-                'amount': tx.amount_paid,
-                'type': 'given' if tx.offerer_id == user_id else 'received'
-            })
-        
-        # Sort transactions by date (newest first)
-        transaction_history.sort(key=lambda x: x['date'], reverse=True)
+        # First page of the transaction history, newest first
+        history, history_next_cursor = transaction_history.history_page(user_id, limit=limit)
         
         return jsonify({
             'id': user.id,
@@ -494,12 +1035,34 @@ def get_user_profile(user_id):
             'skillcoins_balance': user.skillcoins_balance,
             'offered_skills': offered_skills_data,
             'requested_skills': requested_skills_data,
-            'transaction_history': transaction_history
+            'transaction_history': history,
+            'transaction_history_next_cursor': history_next_cursor
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/user/<int:user_id>/transactions', methods=['GET'])
+@read_only
+@response_cache.versioned('user', 'skill', 'transaction', users=_view_user_id)
+def get_user_transactions(user_id):
+    try:
+        User.query.get_or_404(user_id)
+        limit = min(max(request.args.get('limit', HISTORY_PAGE_SIZE, type=int), 1), HISTORY_MAX_PAGE_SIZE)
+        
+        # Cursor from transaction_history_next_cursor or a previous page's next_cursor
+        cursor = request.args.get('cursor')
+        try:
+            cursor = transaction_history.decode_cursor(cursor) if cursor else None
+        except transaction_history.InvalidCursor as e:
+            return jsonify({'error': str(e)}), 400
+        
+        history, next_cursor = transaction_history.history_page(user_id, cursor, limit)
+        return jsonify({'transactions': history, 'next_cursor': next_cursor})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/skill', methods=['POST'])
+@idempotency_keys.idempotent
 def add_skill():
     try:
         data = request.get_json()
@@ -529,8 +1092,11 @@ def add_skill():
         )
         
         db.session.add(new_skill)
+        stats_store.record_skill_added(new_skill.skill_name, new_skill.is_offered)
         db.session.commit()
         
+        skill_match_index.put_skill(new_skill, user)
+        
         return jsonify({
             'message': 'Skill added successfully',
             'skill_id': new_skill.id
@@ -540,13 +1106,16 @@ def add_skill():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/skill/<int:skill_id>', methods=['PUT', 'DELETE'])
+@idempotency_keys.idempotent
 def manage_skill(skill_id):
     try:
         skill = Skill.query.get_or_404(skill_id)
         
         if request.method == 'DELETE':
             db.session.delete(skill)
+            stats_store.record_skill_removed(skill.skill_name, skill.is_offered)
             db.session.commit()
+            skill_match_index.remove_skill(skill_id)
             return jsonify({'message': 'Skill deleted successfully'})
         
         # If PUT request
@@ -554,6 +1123,7 @@ def manage_skill(skill_id):
         if not data:
             return jsonify({'error': 'No data provided'}), 400
         
+        old_name, old_offered = skill.skill_name, skill.is_offered
         if 'skill_name' in data:
             skill.skill_name = data['skill_name']
         if 'availability' in data:
@@ -561,7 +1131,9 @@ def manage_skill(skill_id):
         if 'is_offered' in data:
             skill.is_offered = data['is_offered']
         
+        stats_store.record_skill_changed(old_name, old_offered, skill.skill_name, skill.is_offered)
         db.session.commit()
+        skill_match_index.put_skill(skill, skill.user)
         
         return jsonify({
             'message': 'Skill updated successfully',
@@ -576,40 +1148,28 @@ def manage_skill(skill_id):
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+FRAUD_PAGE_SIZE = 1000
+FRAUD_MAX_PAGE_SIZE = 10000
+
 @app.route('/check_fraud', methods=['GET'])
+@read_only
 def check_fraud():
     try:
-        # Get all users
-        users = User.query.all()
-        
-        suspicious_users = []
-        for user in users:
-            # Check if user has too many skills without transactions
-            skill_count = Skill.query.filter_by(user_id=user.id, is_offered=True).count()
-            transaction_count = Transaction.query.filter_by(offerer_id=user.id).count()
-            
-            # If user claims more than 5 skills but has no transactions
-            if skill_count > 5 and transaction_count == 0:
-                suspicious_users.append({
-                    'user_id': user.id,
-                    'name': user.name,
-                    'skill_count': skill_count,
-                    'transaction_count': transaction_count,
-                    'reason': 'Many skills claimed but no transaction history'
-                })
-            
-            # If user has very low trust score
-            if user.trust_score < 3.0:
-                suspicious_users.append({
-                    'user_id': user.id,
-                    'name': user.name,
-                    'trust_score': user.trust_score,
-                    'reason': 'Low trust score'
-                })
+        after_id = request.args.get('after_id', 0, type=int)
+        limit = min(max(request.args.get('limit', FRAUD_PAGE_SIZE, type=int), 1), FRAUD_MAX_PAGE_SIZE)
+        
+        # Full sweep streamed as NDJSON, one finding per line
+        if request.args.get('format') == 'ndjson':
+            lines = (json.dumps(finding) + '\n' for finding in fraud.iter_findings(limit))
+            return Response(stream_with_context(lines), mimetype='application/x-ndjson')
+        
+        # One grouped query per page of users, rules evaluated over the counts
+        suspicious_users, next_after_id = fraud.check_page(after_id, limit)
         
         return jsonify({
             'suspicious_users': suspicious_users,
-            'count': len(suspicious_users)
+            'count': len(suspicious_users),
+            'next_after_id': next_after_id
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -617,35 +1177,14 @@ def check_fraud():
 @app.route('/dashboard', methods=['GET'])
 def dashboard():
     try:
-        # Count total users, skills and transactions
-        user_count = User.query.count()
-        skill_count = Skill.query.count() 
-        transaction_count = Transaction.query.count()
-        
-        # Get most popular skills (offered by multiple users)
-        popular_skills = db.session.query(
-            Skill.skill_name, 
-            db.func.count(Skill.id).label('count')
-        ).filter_by(is_offered=True).group_by(
-            Skill.skill_name
-        ).order_by(db.desc('count')).limit(5).all()
-        
-        # Get most sought-after skills (requested by multiple users)
-        sought_skills = db.session.query(
-            Skill.skill_name, 
-            db.func.count(Skill.id).label('count')
-        ).filter_by(is_offered=False).group_by(
-            Skill.skill_name
-        ).order_by(db.desc('count')).limit(5).all()
-        
-        # Get most active users (by transaction count)
-        active_users = db.session.query(
-            User.id, User.name,
-            db.func.count(Transaction.id).label('tx_count')
-        ).outerjoin(
-            Transaction, 
-            (User.id == Transaction.offerer_id) | (User.id == Transaction.requester_id)
-        ).group_by(User.id).order_by(db.desc('tx_count')).limit(5).all()
+        # Counts and top-5 lists are maintained by the write endpoints
+        stats = stats_store.dashboard_stats(app, Config.STATS_REBUILD_INTERVAL)
+        user_count = stats['user_count']
+        skill_count = stats['skill_count']
+        transaction_count = stats['transaction_count']
+        popular_skills = stats['popular_skills']
+        sought_skills = stats['sought_skills']
+        active_users = stats['active_users']
         
         try:
             return render_template('dashboard.html', 
@@ -654,7 +1193,8 @@ def dashboard():
                                   transaction_count=transaction_count,
                                   popular_skills=popular_skills,
                                   sought_skills=sought_skills,
-                                  active_users=active_users)
+                                  active_users=active_users,
+                                  stats_updated_at=stats['updated_at'])
         except:
             # If template not found, return JSON
             return jsonify({
@@ -665,12 +1205,15 @@ def dashboard():
                 },
                 'popular_skills': [{'name': skill[0], 'count': skill[1]} for skill in popular_skills],
                 'sought_skills': [{'name': skill[0], 'count': skill[1]} for skill in sought_skills],
-                'active_users': [{'id': user[0], 'name': user[1], 'transactions': user[2]} for user in active_users]
+                'active_users': [{'id': user[0], 'name': user[1], 'transactions': user[2]} for user in active_users],
+                'updated_at': stats['updated_at'].isoformat(),
+                'rebuilt_at': stats['rebuilt_at'].isoformat()
             })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/rate_transaction/<int:transaction_id>', methods=['POST'])
+@idempotency_keys.idempotent
 def rate_transaction(transaction_id):
     try:
         data = request.get_json()
@@ -714,9 +1257,10 @@ def rate_transaction(transaction_id):
         
         # Update user's trust score (weighted average)
         user = User.query.get(user_id)
-        user.trust_score = (0.9 * user.trust_score) + (0.1 * rating)
+        user.trust_score = (1 - trust.RATING_WEIGHT) * user.trust_score + trust.RATING_WEIGHT * rating
         
         db.session.commit()
+        skill_match_index.update_trust(user.id, user.trust_score)
         
         return jsonify({
             'message': 'Rating submitted successfully',
@@ -727,6 +1271,7 @@ def rate_transaction(transaction_id):
         return jsonify({'error': str(e)}), 500
 
 @app.route('/recommendations/<int:user_id>', methods=['GET'])
+@read_only
 def get_recommendations(user_id):
     try:
         # Check if user exists
@@ -735,62 +1280,17 @@ def get_recommendations(user_id):
             return jsonify({'error': 'User not found'}), 404
             
         # Get user's requested skills
-        user_requested_skills = Skill.query.filter_by(
-            user_id=user_id, 
+        requested_skill_names = [name for name, in db.session.query(Skill.skill_name).filter_by(
+            user_id=user_id,
             is_offered=False
-        ).all()
-        requested_skill_names = [skill.skill_name for skill in user_requested_skills]
-        
-        # Find users offering these skills
-        relevant_users = []
-        for skill_name in requested_skill_names:
-            matching_skills = Skill.query.filter_by(
-                skill_name=skill_name, 
-                is_offered=True
-            ).all()
-            
-            for skill in matching_skills:
-                if skill.user_id != user_id:  # Don't recommend the user's own skills
-                    user = User.query.get(skill.user_id)
-                    if user:  # Make sure user exists
-                        relevant_users.append({
-                            'user_id': user.id,
-                            'name': user.name,
-                            'skill': skill_name,
-                            'trust_score': user.trust_score,
-                            'availability': skill.availability
-                        })
-        
-        # Find similar skills they might be interested in
-        skill_recommendations = []
-        for relevant_user in relevant_users:
-            other_skills = Skill.query.filter_by(
-                user_id=relevant_user['user_id'],
-                is_offered=True
-            ).all()
-            
-            for skill in other_skills:
-                if skill.skill_name not in requested_skill_names:
-                    skill_recommendations.append({
-                        'skill_name': skill.skill_name,
-                        'offered_by': relevant_user['name'],
-                        'user_id': relevant_user['user_id'],
-                        'trust_score': relevant_user['trust_score']
-                    })
-        
-        # Remove duplicates and limit to top 5
-        unique_recommendations = []
-        seen_skills = set()
-        for rec in skill_recommendations:
-            if rec['skill_name'] not in seen_skills:
-                seen_skills.add(rec['skill_name'])
-                unique_recommendations.append(rec)
-                if len(unique_recommendations) >= 5:
-                    break
+        )]
+        
+        # Offerers of the requested skills and skills their offerers also offer, from the model
+        skill_recommendations, user_matches = skill_recommender.recommend(user_id, requested_skill_names)
         
         return jsonify({
-            'skill_recommendations': unique_recommendations,
-            'user_matches': relevant_users[:5]  # Limit to top 5
+            'skill_recommendations': skill_recommendations,
+            'user_matches': user_matches
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -832,11 +1332,96 @@ def setup_database():
     try:
         with app.app_context():
             db.create_all()
+            search_index.init_search_index(db.engine)
             init_db()
+            stats_store.rebuild()
+            skill_match_index.warm()
+            skill_recommender.refresh()
         return jsonify({'message': 'Database initialized with sample data'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.cli.command('publish-outbox')
+def publish_outbox_command():
+    """Publish all pending outbox entries to IPFS and exit"""
+    published = ipfs_publisher.drain()
+    print(f"Processed {published} outbox entries")
+
+@app.cli.command('check-query-plans')
+def check_query_plans_command():
+    """Explain the queries used by the routes and fail on full table scans"""
+    search_index.init_search_index(db.engine)
+    results, failures = query_plans.check_query_plans()
+    for result in results:
+        status = 'ok' if result['ok'] else 'FULL SCAN'
+        if result['full_scans'] and result['allowed_scan']:
+            status = f"scan allowed ({result['allowed_scan']})"
+        print(f"[{status}] {result['name']}")
+        for line in result['plan']:
+            print(f"    {line}")
+    if failures:
+        raise SystemExit(f"{failures} query pattern(s) fall back to a full table scan")
+
+@app.cli.command('import-users')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'file_format', type=click.Choice(['ndjson', 'csv']),
+              help='Input format, guessed from the file extension by default.')
+@click.option('--chunk-size', default=bulk_import.IMPORT_CHUNK_SIZE, show_default=True, help='Rows per commit.')
+def import_users_command(path, file_format, chunk_size):
+    """Register users and skills from an NDJSON or CSV file"""
+    file_format = file_format or ('csv' if path.lower().endswith('.csv') else 'ndjson')
+    with open(path, encoding='utf-8', newline='') as f:
+        rows = bulk_import.parse_csv(f) if file_format == 'csv' else bulk_import.parse_ndjson(f)
+        created, errors = bulk_import.import_users(rows, chunk_size)
+    for error in errors:
+        print(json.dumps(error), file=sys.stderr)
+    print(f"Imported {created} user(s), {len(errors)} row(s) rejected")
+
+@app.cli.command('recompute-trust')
+@click.option('--incremental', is_flag=True, help='Only replay users with ratings or transactions since the last run.')
+@click.option('--dry-run', is_flag=True, help='Report diverging scores without writing them.')
+@click.option('--chunk-size', default=trust.RECOMPUTE_CHUNK_SIZE, show_default=True,
+              help='Event rows per streamed chunk and scores per write.')
+@click.option('--report', type=click.Path(dir_okay=False, writable=True),
+              help='Write every diverging user to this file as NDJSON.')
+def recompute_trust_command(incremental, dry_run, chunk_size, report):
+    """Recompute trust scores from the transaction and rating history"""
+    summary = trust.recompute(incremental=incremental, dry_run=dry_run, chunk_size=chunk_size)
+    if report:
+        with open(report, 'w', encoding='utf-8') as f:
+            for entry in summary['diverged']:
+                f.write(json.dumps(entry) + '\n')
+    
+    # Largest differences first; a missing stored score counts as the largest
+    worst = sorted(summary['diverged'], key=lambda entry: -abs(entry['recomputed'] - entry['stored'])
+                   if entry['stored'] is not None else -float('inf'))
+    for entry in worst[:10]:
+        print(json.dumps(entry), file=sys.stderr)
+    print(f"{summary['mode'].capitalize()} recompute: {summary['users_checked']} user(s) checked, "
+          f"{summary['users_diverged']} diverged, {summary['users_updated']} updated")
+
+@app.cli.command('purge-idempotency-keys')
+def purge_idempotency_keys_command():
+    """Delete stored Idempotency-Key responses older than IDEMPOTENCY_KEY_TTL"""
+    removed = idempotency.purge_expired(Config.IDEMPOTENCY_KEY_TTL)
+    print(f"Purged {removed} expired idempotency keys")
+
+@app.cli.command('rebuild-stats')
+def rebuild_stats_command():
+    """Recompute the dashboard statistics from the source tables"""
+    stats_store.rebuild()
+    print("Dashboard statistics rebuilt")
+
+@app.cli.command('check-fraud')
+@click.option('--page-size', default=5000, show_default=True, help='Users per grouped query.')
+def check_fraud_command(page_size):
+    """Run the fraud rules over every user and print findings as NDJSON"""
+    count = 0
+    for finding in fraud.iter_findings(page_size):
+        print(json.dumps(finding))
+        count += 1
+    print(f"{count} finding(s)", file=sys.stderr)
+
 @app.route('/docs')
 def api_docs():
     try:
@@ -857,7 +1442,10 @@ def api_docs():
                 '/recommendations/<id> - Get recommendations (GET)',
                 '/dashboard - Get system statistics (GET)',
                 '/check_fraud - Check for suspicious users (GET)',
-                '/setup_db - Setup database with sample data (GET)'
+                '/setup_db - Setup database with sample data (GET)',
+                '/ipfs/stats - IPFS connection pool and cache statistics (GET)',
+                '/ipfs/upload - Upload a file to IPFS in the background (POST)',
+                '/ipfs/uploads/<id> - Status of a file upload (GET)'
             ]
         })
 
@@ -865,5 +1453,8 @@ def api_docs():
 if __name__ == '__main__':
     with app.app_context():
         db.create_all()
+        search_index.init_search_index(db.engine)
         init_db()  # Initialize with sample data if needed
+        skill_match_index.warm()
+    ipfs_publisher.start()  # Publish anything left in the outbox
     app.run(debug=True)
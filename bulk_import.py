@@ -0,0 +1,142 @@
+import csv
+import json
+
+from models import db, User, Skill
+import search_index
+import stats_store
+
+IMPORT_CHUNK_SIZE = 5000
+CSV_SKILL_SEPARATOR = ';'
+
+
+def parse_ndjson(lines):
+    """Yield (line number, row) for every non-blank line; malformed lines yield an error string"""
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError as e:
+            yield number, f'Invalid JSON: {e}'
+
+
+def parse_csv(lines):
+    """Yield (line number, row) from CSV with name, email, offered and requested columns.
+
+    offered and requested hold skill names separated by ';', e.g.
+    "Alice,alice@example.com,Python;Web Design,Spanish".
+    """
+    reader = csv.DictReader(lines)
+    for row in reader:
+        skills = []
+        for column, is_offered in (('offered', True), ('requested', False)):
+            for skill_name in (row.get(column) or '').split(CSV_SKILL_SEPARATOR):
+                if skill_name.strip():
+                    skills.append({'name': skill_name.strip(), 'is_offered': is_offered})
+        yield reader.line_num, {'name': row.get('name'), 'email': row.get('email'), 'skills': skills}
+
+
+def _validate(row):
+    """Return (user values, skill values) for a row, or an error message"""
+    if not isinstance(row, dict):
+        return 'Row must be an object'
+    if not row.get('name') or not row.get('email'):
+        return 'name and email are required'
+    if not isinstance(row['name'], str) or not isinstance(row['email'], str):
+        return 'name and email must be strings'
+
+    skills = []
+    for index, skill in enumerate(row.get('skills') or []):
+        if not isinstance(skill, dict) or not skill.get('name'):
+            return f'skills[{index}].name is required'
+        if 'is_offered' not in skill:
+            return f'skills[{index}].is_offered is required'
+        is_offered = skill['is_offered']
+        if isinstance(is_offered, str) and is_offered.lower() in ('true', 'false'):
+            is_offered = is_offered.lower() == 'true'
+        if not isinstance(is_offered, bool):
+            return f'skills[{index}].is_offered must be true or false'
+        skills.append({
+            'skill_name': skill['name'],
+            'availability': skill.get('availability', 'anytime'),
+            'is_offered': is_offered
+        })
+
+    user = {'name': row['name'], 'email': row['email'], 'trust_score': 5.0}
+    return user, skills
+
+
+def _import_chunk(chunk, seen_emails):
+    """Insert one chunk of (line number, row); returns (created count, errors)"""
+    errors = []
+    valid = []
+    for number, row in chunk:
+        result = row if isinstance(row, str) else _validate(row)
+        if isinstance(result, str):
+            errors.append({'row': number, 'error': result})
+        else:
+            valid.append((number, result))
+
+    # One set lookup for the whole chunk instead of a query per email
+    emails = {user['email'] for _, (user, _) in valid}
+    taken = set(db.session.scalars(db.select(User.email).where(User.email.in_(emails)))) if emails else set()
+
+    accepted = []
+    for number, (user, skills) in valid:
+        if user['email'] in taken or user['email'] in seen_emails:
+            errors.append({'row': number, 'email': user['email'], 'error': 'Email already registered!'})
+            continue
+        seen_emails.add(user['email'])
+        accepted.append((user, skills))
+
+    errors.sort(key=lambda error: error['row'])
+    if not accepted:
+        return 0, errors
+
+    user_ids = db.session.scalars(
+        db.insert(User.__table__).returning(User.id, sort_by_parameter_order=True),
+        [user for user, _ in accepted]
+    ).all()
+
+    skill_rows = []
+    skill_counts = {}
+    for user_id, (_, skills) in zip(user_ids, accepted):
+        for skill in skills:
+            skill_rows.append(dict(skill, user_id=user_id))
+            key = (skill['skill_name'], skill['is_offered'])
+            skill_counts[key] = skill_counts.get(key, 0) + 1
+    if skill_rows:
+        with search_index.deferred_insert_indexing():
+            db.session.execute(db.insert(Skill.__table__), skill_rows)
+
+    stats_store.record_users_created(len(accepted))
+    for (skill_name, is_offered), count in skill_counts.items():
+        stats_store.record_skill_added(skill_name, is_offered, count)
+
+    db.session.commit()
+    return len(accepted), errors
+
+
+def import_users(rows, chunk_size=IMPORT_CHUNK_SIZE):
+    """Register users and their skills from (line number, row) pairs.
+
+    Rows are validated and inserted in chunks, each chunk committed on its
+    own, so a bad row only costs that row. Returns the number of users
+    created and the per-row errors.
+    """
+    created = 0
+    errors = []
+    seen_emails = set()
+    chunk = []
+    for item in rows:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            count, chunk_errors = _import_chunk(chunk, seen_emails)
+            created += count
+            errors.extend(chunk_errors)
+            chunk = []
+    if chunk:
+        count, chunk_errors = _import_chunk(chunk, seen_emails)
+        created += count
+        errors.extend(chunk_errors)
+    return created, errors
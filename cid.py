@@ -0,0 +1,184 @@
+import base64
+import hashlib
+import json
+
+# Defaults used by `ipfs add` (kubo) and therefore by Filebase
+CHUNK_SIZE = 262144
+MAX_LINKS = 174
+
+_SHA2_256 = 0x12
+_DAG_PB = 0x70
+_RAW = 0x55
+_BASE58_ALPHABET = '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
+
+
+def _varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _field_bytes(number, payload):
+    return _varint(number << 3 | 2) + _varint(len(payload)) + payload
+
+
+def _field_varint(number, value):
+    return _varint(number << 3) + _varint(value)
+
+
+def _read_varint(data, offset):
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        shift += 7
+        if not byte & 0x80:
+            return value, offset
+
+
+def _b58encode(data):
+    number = int.from_bytes(data, 'big')
+    encoded = ''
+    while number:
+        number, remainder = divmod(number, 58)
+        encoded = _BASE58_ALPHABET[remainder] + encoded
+    padding = len(data) - len(data.lstrip(b'\0'))
+    return _BASE58_ALPHABET[0] * padding + encoded
+
+
+def _b58decode(text):
+    number = 0
+    for char in text:
+        number = number * 58 + _BASE58_ALPHABET.index(char)
+    body = number.to_bytes((number.bit_length() + 7) // 8, 'big')
+    padding = len(text) - len(text.lstrip(_BASE58_ALPHABET[0]))
+    return b'\0' * padding + body
+
+
+def _multihash(data):
+    return bytes([_SHA2_256, 32]) + hashlib.sha256(data).digest()
+
+
+def _file_node(chunk=b'', filesize=0, blocksizes=(), links=()):
+    """Serialise a dag-pb node carrying UnixFS file data"""
+    unixfs = _field_varint(1, 2)  # Type: File
+    if chunk:
+        unixfs += _field_bytes(2, chunk)
+    unixfs += _field_varint(3, filesize)
+    for size in blocksizes:
+        unixfs += _field_varint(4, size)
+
+    # dag-pb puts the links before the data
+    node = b''
+    for link_hash, tsize in links:
+        node += _field_bytes(2, _field_bytes(1, link_hash) + _field_bytes(2, b'') + _field_varint(3, tsize))
+    return node + _field_bytes(1, unixfs)
+
+
+class CIDBuilder:
+    """Incrementally computes the CIDv0 `ipfs add` would give a byte stream.
+
+    Only the per-chunk hashes are kept, so memory stays bounded no matter
+    how large the content is.
+    """
+
+    def __init__(self, chunk_size=CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.size = 0
+        self._buffer = b''
+        self._leaves = []  # (multihash, serialised node size, file size)
+
+    def update(self, data):
+        self.size += len(data)
+        data = self._buffer + bytes(data)
+        offset = 0
+        while len(data) - offset >= self.chunk_size:
+            self._leaves.append(self._leaf(data[offset:offset + self.chunk_size]))
+            offset += self.chunk_size
+        self._buffer = data[offset:]
+
+    @staticmethod
+    def _leaf(chunk):
+        node = _file_node(chunk, len(chunk))
+        return _multihash(node), len(node), len(chunk)
+
+    def multihash(self):
+        level = list(self._leaves)
+        if self._buffer or not level:
+            level.append(self._leaf(self._buffer))
+
+        # Balanced layout: group MAX_LINKS children per parent until one root is left
+        while len(level) > 1:
+            parents = []
+            for start in range(0, len(level), MAX_LINKS):
+                children = level[start:start + MAX_LINKS]
+                filesize = sum(child[2] for child in children)
+                node = _file_node(
+                    filesize=filesize,
+                    blocksizes=[child[2] for child in children],
+                    links=[(child[0], child[1]) for child in children]
+                )
+                parents.append((_multihash(node), len(node) + sum(child[1] for child in children), filesize))
+            level = parents
+        return level[0][0]
+
+    def cid(self):
+        return _b58encode(self.multihash())
+
+
+def compute_cid(data, chunk_size=CHUNK_SIZE):
+    """Compute the CIDv0 that `ipfs add` assigns to the given bytes"""
+    builder = CIDBuilder(chunk_size)
+    builder.update(data)
+    return builder.cid()
+
+
+def canonical_json(document):
+    """The bytes a JSON document is published as: sorted keys, no whitespace, UTF-8"""
+    return json.dumps(document, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def document_cid(document):
+    """The CID add_json_to_ipfs gets back for a document, without uploading it"""
+    return compute_cid(canonical_json(document))
+
+
+def _parse(cid):
+    """Return (version, codec, multihash) for a CID string"""
+    if len(cid) == 46 and cid.startswith('Qm'):
+        return 0, _DAG_PB, _b58decode(cid)
+    if cid.startswith('b'):
+        raw = base64.b32decode(cid[1:].upper() + '=' * (-len(cid[1:]) % 8))
+        version, offset = _read_varint(raw, 0)
+        codec, offset = _read_varint(raw, offset)
+        return version, codec, raw[offset:]
+    raise ValueError(f"Unsupported CID format: {cid}")
+
+
+def verify_cid(cid, data):
+    """Check content against its CID.
+
+    Returns True or False when the CID can be recomputed locally and None
+    when it uses a layout this module does not reproduce.
+    """
+    try:
+        version, codec, multihash = _parse(cid)
+    except (ValueError, IndexError):
+        return None
+
+    if multihash[:2] != bytes([_SHA2_256, 32]):
+        return None
+    if codec == _RAW:
+        return _multihash(data) == multihash
+    if codec == _DAG_PB and version == 0:
+        builder = CIDBuilder()
+        builder.update(data)
+        return builder.multihash() == multihash
+    return None
@@ -1,12 +1,95 @@
 import os
 
 class Config:
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///coinnect.db'
+    # Any SQLAlchemy URL; relative SQLite paths are resolved against the instance folder
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///coinnect.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Optional second engine for @read_only GET routes, e.g. a replica, or for SQLite
+    # 'sqlite:///coinnect.db' again so readers get their own connections (made query_only)
+    DATABASE_READ_URL = os.environ.get('DATABASE_READ_URL', '')
+
+    # Connection pool, per engine (ignored for in-memory SQLite)
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))  # seconds to wait for a free connection
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', -1))  # seconds before a connection is replaced, -1 = never
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'false').lower() == 'true'
+
+    # PRAGMAs run on every new SQLite connection; set one to an empty string to keep SQLite's default.
+    # WAL lets readers run alongside the single writer instead of queueing behind it.
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')  # NORMAL is durable enough under WAL
+    SQLITE_BUSY_TIMEOUT = os.environ.get('SQLITE_BUSY_TIMEOUT', '5000')  # ms to wait on a locked database
+    SQLITE_CACHE_SIZE = os.environ.get('SQLITE_CACHE_SIZE', '-65536')  # negative = KiB, so 64 MiB per connection
+    SQLITE_MMAP_SIZE = os.environ.get('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))  # bytes
+    SQLITE_FOREIGN_KEYS = os.environ.get('SQLITE_FOREIGN_KEYS', '')
     
     # Filebase configuration
     FILEBASE_ACCESS_KEY = os.environ.get('FILEBASE_ACCESS_KEY', '')
     FILEBASE_SECRET_KEY = os.environ.get('FILEBASE_SECRET_KEY', '')
     
+    # IPFS RPC endpoint - set to a local stand-in (tools/ipfs_standin.py) for offline testing
+    IPFS_API_URL = os.environ.get('IPFS_API_URL', 'https://api.filebase.io/v1/ipfs')
+
     # IPFS Gateway URL - for viewing files
-    IPFS_GATEWAY_URL = 'https://ipfs.filebase.io/ipfs/'
+    IPFS_GATEWAY_URL = os.environ.get('IPFS_GATEWAY_URL', 'https://ipfs.filebase.io/ipfs/')
+
+    # IPFS outbox publisher - transactions are published in the background
+    IPFS_OUTBOX_BATCH_SIZE = int(os.environ.get('IPFS_OUTBOX_BATCH_SIZE', 50))
+    IPFS_OUTBOX_CONCURRENCY = int(os.environ.get('IPFS_OUTBOX_CONCURRENCY', 4))
+    IPFS_OUTBOX_POLL_INTERVAL = float(os.environ.get('IPFS_OUTBOX_POLL_INTERVAL', 2.0))  # seconds
+    IPFS_OUTBOX_MAX_ATTEMPTS = int(os.environ.get('IPFS_OUTBOX_MAX_ATTEMPTS', 5))
+    IPFS_OUTBOX_CLAIM_TIMEOUT = int(os.environ.get('IPFS_OUTBOX_CLAIM_TIMEOUT', 300))  # seconds before a stuck claim is retried
+    IPFS_PUBLISHER_AUTOSTART = os.environ.get('IPFS_PUBLISHER_AUTOSTART', 'true').lower() == 'true'  # false: run 'flask publish-outbox' separately
+
+    # 'transaction' publishes and pins one document per transaction; 'merkle' anchors a window
+    # of transactions under one root document holding the leaves, with a proof per transaction
+    IPFS_ANCHOR_MODE = os.environ.get('IPFS_ANCHOR_MODE', 'transaction')
+    IPFS_ANCHOR_INTERVAL = float(os.environ.get('IPFS_ANCHOR_INTERVAL', 60))  # seconds per anchoring window
+    IPFS_ANCHOR_MAX_LEAVES = int(os.environ.get('IPFS_ANCHOR_MAX_LEAVES', 1024))
+
+    # Content-addressed cache for IPFS reads (disk tier defaults to instance/ipfs_cache)
+    IPFS_CACHE_MEMORY_BYTES = int(os.environ.get('IPFS_CACHE_MEMORY_BYTES', 32 * 1024 * 1024))
+    IPFS_CACHE_DIR = os.environ.get('IPFS_CACHE_DIR')
+    IPFS_CACHE_DISK_BYTES = int(os.environ.get('IPFS_CACHE_DISK_BYTES', 512 * 1024 * 1024))
+
+    # Pooled HTTP session used for every Filebase call; a request waiting on Filebase holds one connection,
+    # so give it as many as the server has worker threads
+    IPFS_POOL_SIZE = int(os.environ.get('IPFS_POOL_SIZE', 10))
+    IPFS_CONNECT_TIMEOUT = float(os.environ.get('IPFS_CONNECT_TIMEOUT', 3.05))  # seconds
+    IPFS_READ_TIMEOUT = float(os.environ.get('IPFS_READ_TIMEOUT', 30))  # seconds
+    IPFS_MAX_RETRIES = int(os.environ.get('IPFS_MAX_RETRIES', 3))  # only for idempotent calls (cat, pin/add)
+    IPFS_RETRY_BACKOFF = float(os.environ.get('IPFS_RETRY_BACKOFF', 0.25))  # seconds, doubled per attempt with jitter
+
+    # File uploads (/ipfs/upload) are spooled to disk (defaults to instance/ipfs_uploads), then
+    # streamed to Filebase by a few background threads
+    IPFS_UPLOAD_DIR = os.environ.get('IPFS_UPLOAD_DIR')
+    IPFS_UPLOAD_MAX_BYTES = int(os.environ.get('IPFS_UPLOAD_MAX_BYTES', 100 * 1024 * 1024))
+    IPFS_UPLOAD_CONCURRENCY = int(os.environ.get('IPFS_UPLOAD_CONCURRENCY', 2))
+    IPFS_UPLOAD_MAX_PENDING = int(os.environ.get('IPFS_UPLOAD_MAX_PENDING', 32))  # queued or running per worker, before 503s
+    IPFS_UPLOAD_STATUS_TTL = int(os.environ.get('IPFS_UPLOAD_STATUS_TTL', 3600))  # seconds a finished status is kept
+    IPFS_UPLOAD_STALE_AFTER = int(os.environ.get('IPFS_UPLOAD_STALE_AFTER', 3600))  # seconds without progress before failing
+
+    # Seconds before the in-memory /match_skills index is rebuilt from the database in the background
+    MATCH_INDEX_MAX_AGE = int(os.environ.get('MATCH_INDEX_MAX_AGE', 60))
+
+    # Seconds before the /recommendations co-occurrence model is rebuilt in the background
+    RECOMMENDER_MAX_AGE = int(os.environ.get('RECOMMENDER_MAX_AGE', 300))
+    RECOMMENDER_RELATED_K = int(os.environ.get('RECOMMENDER_RELATED_K', 20))  # related skills kept per skill
+
+    # Bytes of response bodies kept by ETag for /users, /user/<id> and /match_skills, per worker
+    RESPONSE_CACHE_BYTES = int(os.environ.get('RESPONSE_CACHE_BYTES', 32 * 1024 * 1024))
+
+    # Idempotency-Key responses of write endpoints are kept this many seconds, then purged by a
+    # request at most every IDEMPOTENCY_PURGE_INTERVAL seconds (or by 'flask purge-idempotency-keys')
+    IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', 24 * 3600))
+    IDEMPOTENCY_PURGE_INTERVAL = int(os.environ.get('IDEMPOTENCY_PURGE_INTERVAL', 300))
+
+    # Seconds between full rebuilds of the incrementally maintained dashboard statistics
+    STATS_REBUILD_INTERVAL = int(os.environ.get('STATS_REBUILD_INTERVAL', 3600))
+
+    # Request instrumentation: Server-Timing headers and Prometheus histograms at /metrics
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+    METRICS_SAMPLE_RATE = float(os.environ.get('METRICS_SAMPLE_RATE', 1.0))  # fraction of requests timed
+    METRICS_SERVER_TIMING = os.environ.get('METRICS_SERVER_TIMING', 'true').lower() == 'true'
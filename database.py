@@ -0,0 +1,118 @@
+"""Engine configuration: pool options, SQLite pragmas and the read-only engine.
+
+Pool and pragma settings come from Config (environment driven). Pragmas
+are applied to every new SQLite connection. When DATABASE_READ_URL is
+set, a second engine is created for it, and routes decorated with
+@read_only run their session queries there: another SQLite connection
+(made query_only) or a replica. Flushes always go to the primary engine.
+"""
+import contextvars
+import functools
+import os
+
+import sqlalchemy as sa
+from flask import current_app
+from flask_sqlalchemy.session import Session
+
+_use_read_engine = contextvars.ContextVar('use_read_engine', default=False)
+
+
+def _is_sqlite(url):
+    return url.get_backend_name() == 'sqlite'
+
+
+def _is_memory(url):
+    return _is_sqlite(url) and url.database in (None, '', ':memory:')
+
+
+def engine_options(uri, config):
+    """Pool options for an engine, leaving out what the URL's pool does not take"""
+    url = sa.engine.make_url(uri)
+    if _is_memory(url):
+        return {}  # Single connection per thread; no pool to size
+    options = {
+        'pool_size': config.DB_POOL_SIZE,
+        'max_overflow': config.DB_MAX_OVERFLOW,
+        'pool_timeout': config.DB_POOL_TIMEOUT,
+        'pool_pre_ping': config.DB_POOL_PRE_PING
+    }
+    if config.DB_POOL_RECYCLE > 0:
+        options['pool_recycle'] = config.DB_POOL_RECYCLE
+    return options
+
+
+def sqlite_pragmas(config):
+    """PRAGMA name -> value for new SQLite connections; empty settings are left at SQLite's default"""
+    pragmas = {
+        'journal_mode': config.SQLITE_JOURNAL_MODE,
+        'synchronous': config.SQLITE_SYNCHRONOUS,
+        'busy_timeout': config.SQLITE_BUSY_TIMEOUT,
+        'cache_size': config.SQLITE_CACHE_SIZE,
+        'mmap_size': config.SQLITE_MMAP_SIZE,
+        'foreign_keys': config.SQLITE_FOREIGN_KEYS
+    }
+    return {name: value for name, value in pragmas.items() if value not in (None, '')}
+
+
+def _apply_pragmas(engine, pragmas):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name} = {value}')
+        finally:
+            cursor.close()
+
+    sa.event.listen(engine, 'connect', on_connect)
+
+
+def _sqlite_path(url, instance_path):
+    # Relative SQLite paths live in the instance folder, as Flask-SQLAlchemy does for the primary URI
+    if _is_sqlite(url) and not _is_memory(url) and not url.query.get('uri') and not os.path.isabs(url.database):
+        return url.set(database=os.path.join(instance_path, url.database))
+    return url
+
+
+def init_app(app, db, config):
+    """Apply pragmas to the primary engine and create the read-only engine if configured"""
+    pragmas = sqlite_pragmas(config)
+    with app.app_context():
+        primary = db.engine
+    if _is_sqlite(primary.url) and pragmas:
+        if _is_memory(primary.url):
+            pragmas = {name: value for name, value in pragmas.items() if name != 'journal_mode'}
+        _apply_pragmas(primary, pragmas)
+
+    read_engine = None
+    if config.DATABASE_READ_URL:
+        url = _sqlite_path(sa.engine.make_url(config.DATABASE_READ_URL), app.instance_path)
+        read_engine = sa.create_engine(url, **engine_options(url, config))
+        if _is_sqlite(url):
+            # Only the primary connection may change the journal mode; readers just refuse writes
+            read_pragmas = {name: value for name, value in pragmas.items() if name != 'journal_mode'}
+            _apply_pragmas(read_engine, dict(read_pragmas, query_only='ON'))
+    app.extensions['read_engine'] = read_engine
+    return read_engine
+
+
+def read_only(view):
+    """Run a view's session queries on the read-only engine, when there is one"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        token = _use_read_engine.set(True)
+        try:
+            return view(*args, **kwargs)
+        finally:
+            _use_read_engine.reset(token)
+    return wrapper
+
+
+class RoutingSession(Session):
+    """Session that reads from the read-only engine inside @read_only views"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and _use_read_engine.get() and not self._flushing:
+            read_engine = current_app.extensions.get('read_engine')
+            if read_engine is not None:
+                return read_engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
@@ -0,0 +1,94 @@
+from models import db, User, Skill, Transaction
+
+# Rules registered with @fraud_rule, evaluated in registration order
+FRAUD_RULES = []
+
+
+def fraud_rule(func):
+    """Register a rule.
+
+    A rule receives one user row (user_id, name, trust_score, skill_count,
+    transaction_count) and returns None or a dict of findings that must
+    include a 'reason'.
+    """
+    FRAUD_RULES.append(func)
+    return func
+
+
+@fraud_rule
+def many_skills_without_transactions(row):
+    # If user claims more than 5 skills but has no transactions
+    if row['skill_count'] > 5 and row['transaction_count'] == 0:
+        return {
+            'skill_count': row['skill_count'],
+            'transaction_count': row['transaction_count'],
+            'reason': 'Many skills claimed but no transaction history'
+        }
+
+
+@fraud_rule
+def low_trust_score(row):
+    # If user has very low trust score
+    if row['trust_score'] is not None and row['trust_score'] < 3.0:
+        return {
+            'trust_score': row['trust_score'],
+            'reason': 'Low trust score'
+        }
+
+
+def user_activity_statement(after_id, limit):
+    """Skill and transaction counts for one keyset page of users in a single query"""
+    page = db.select(User.id, User.name, User.trust_score).where(
+        User.id > after_id
+    ).order_by(User.id).limit(limit).cte('page')
+    page_ids = db.select(page.c.id)
+
+    # Grouped counts restricted to the page, each served by an index
+    skill_counts = db.select(
+        Skill.user_id, db.func.count().label('skill_count')
+    ).where(Skill.is_offered == True, Skill.user_id.in_(page_ids)).group_by(Skill.user_id).subquery()
+    transaction_counts = db.select(
+        Transaction.offerer_id, db.func.count().label('transaction_count')
+    ).where(Transaction.offerer_id.in_(page_ids)).group_by(Transaction.offerer_id).subquery()
+
+    return db.select(
+        page.c.id.label('user_id'),
+        page.c.name,
+        page.c.trust_score,
+        db.func.coalesce(skill_counts.c.skill_count, 0).label('skill_count'),
+        db.func.coalesce(transaction_counts.c.transaction_count, 0).label('transaction_count')
+    ).outerjoin(
+        skill_counts, skill_counts.c.user_id == page.c.id
+    ).outerjoin(
+        transaction_counts, transaction_counts.c.offerer_id == page.c.id
+    ).order_by(page.c.id)
+
+
+def user_activity_page(after_id, limit):
+    return [row._asdict() for row in db.session.execute(user_activity_statement(after_id, limit))]
+
+
+def evaluate(rows, rules=None):
+    """Apply the rules to activity rows and return the findings"""
+    findings = []
+    for row in rows:
+        for rule in rules or FRAUD_RULES:
+            finding = rule(row)
+            if finding:
+                findings.append(dict({'user_id': row['user_id'], 'name': row['name']}, **finding))
+    return findings
+
+
+def check_page(after_id=0, limit=1000):
+    """Findings for one page plus the cursor for the next page (None at the end)"""
+    rows = user_activity_page(after_id, limit)
+    next_after_id = rows[-1]['user_id'] if len(rows) == limit else None
+    return evaluate(rows), next_after_id
+
+
+def iter_findings(page_size=5000):
+    """Sweep every user page by page, yielding findings as they are found"""
+    after_id = 0
+    while after_id is not None:
+        findings, after_id = check_page(after_id, page_size)
+        yield from findings
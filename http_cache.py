@@ -0,0 +1,313 @@
+"""Conditional GET support: version ETags, a shared response cache and CID headers.
+
+Every commit that changes what the user endpoints show bumps, in the same
+transaction, a counter per affected user in user_version: the user's own
+row, their skills and the transactions they are a party to. ETags of read
+endpoints hash the request with the counters of the users in the payload,
+so a write only moves the ETags of the users it touched, and writes that
+change nothing shown (an ipfs_hash written back by the publisher) move
+none. Writes no user can be found for (bulk DML without a user id,
+renaming or deleting a skill that appears in other users' histories)
+bump a per-table counter in table_version instead, which every ETag
+built on that table includes.
+
+A matching If-None-Match gets a 304 after reading the counters alone, and
+other requests with a known ETag are served from a process-wide LRU of
+response bodies without running the view.
+
+Responses addressed by a CID never change, so they get the CID as their
+ETag and an immutable Cache-Control instead.
+"""
+import functools
+import hashlib
+import threading
+from collections import OrderedDict
+
+from flask import current_app, request
+from sqlalchemy import event, inspect
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter, BooleanClauseList
+
+from models import db, TableVersion, UserVersion
+
+TRACKED_TABLES = frozenset(('user', 'skill', 'transaction'))
+
+# Columns the user endpoints show, and the columns naming the users a row is shown to
+SHOWN_COLUMNS = {
+    'user': frozenset(('name', 'email', 'trust_score', 'skillcoins_balance')),
+    'skill': frozenset(('skill_name', 'is_offered', 'availability', 'user_id')),
+    'transaction': frozenset(('offerer_id', 'requester_id', 'skill_id', 'amount_paid', 'transaction_date')),
+}
+OWNER_COLUMNS = {'user': ('id',), 'skill': ('user_id',), 'transaction': ('offerer_id', 'requester_id')}
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'no-cache'  # Clients may keep the body but must check the ETag
+
+_TOUCHED = 'touched_tables'
+_TOUCHED_USERS = 'touched_users'
+
+
+def _touch(session, table):
+    if table is not None and table.name in TRACKED_TABLES:
+        session.info.setdefault(_TOUCHED, set()).add(table.name)
+
+
+def _touch_users(session, user_ids):
+    session.info.setdefault(_TOUCHED_USERS, set()).update(user_ids)
+
+
+def _touch_instance(session, instance, changed=None):
+    """Record the users an inserted/deleted (changed=None) or updated row is shown to"""
+    table = getattr(instance, '__table__', None)
+    if table is None or table.name not in TRACKED_TABLES:
+        return
+    if changed is not None and not changed & SHOWN_COLUMNS[table.name]:
+        return
+
+    state = inspect(instance)
+    owners = set()
+    for column in OWNER_COLUMNS[table.name]:
+        history = state.attrs[column].history
+        # Old values too: a skill moved to another user leaves the first one's profile
+        owners.update(value for value in (*history.added, *history.unchanged, *history.deleted) if value is not None)
+    _touch_users(session, owners)
+
+    # Histories show the skill name of every transaction, including other users' skills
+    if table.name == 'skill' and (instance in session.deleted or (changed and 'skill_name' in changed)):
+        _touch(session, table)
+
+
+def _after_flush(session, flush_context):
+    # Still the pre-flush state here: new, dirty and deleted are what was just written
+    for instance in session.new | session.deleted:
+        _touch_instance(session, instance)
+    for instance in session.dirty:
+        if session.is_modified(instance, include_collections=False):
+            state = inspect(instance)
+            _touch_instance(session, instance, {attr.key for attr in state.attrs if attr.history.has_changes()})
+
+
+def _pinned_values(where, table, column, parameters):
+    """Values a WHERE clause pins column to (column = x or column IN (...), ANDed at the top), or None"""
+    if where is None:
+        return None
+    terms = where.clauses if isinstance(where, BooleanClauseList) and where.operator is operators.and_ else [where]
+    for term in terms:
+        if not isinstance(term, BinaryExpression) or not isinstance(term.right, BindParameter):
+            continue
+        left = term.left
+        if getattr(left, 'name', None) != column or getattr(getattr(left, 'table', None), 'name', None) != table.name:
+            continue
+        bind = term.right
+        if term.operator is operators.in_op and bind.expanding and bind.value is not None:
+            return list(bind.value)
+        if term.operator is operators.eq:
+            if bind.value is not None:
+                return [bind.value]
+            # bindparam() filled from executemany parameters
+            if parameters and all(bind.key in row for row in parameters):
+                return [row[bind.key] for row in parameters]
+    return None
+
+
+def _statement_owners(orm_execute_state, table):
+    """Users the rows of a DML statement are shown to, or None when the statement does not say"""
+    parameters = orm_execute_state.parameters
+    if isinstance(parameters, dict):
+        parameters = [parameters]
+    if table.name == 'skill' and not orm_execute_state.is_insert:
+        return None  # May rename or remove a skill shown in other users' histories
+
+    owners = set()
+    for column in OWNER_COLUMNS[table.name]:
+        if orm_execute_state.is_insert:
+            if not parameters or not all(row.get(column) is not None for row in parameters):
+                return None
+            values = [row[column] for row in parameters]
+        else:
+            values = _pinned_values(orm_execute_state.statement.whereclause, table, column, parameters)
+            if values is None:
+                return None
+        owners.update(values)
+    return owners
+
+
+def _do_orm_execute(orm_execute_state):
+    # Bulk and Core DML run through session.execute() without a flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, 'table', None)
+        if table is None or table.name not in TRACKED_TABLES:
+            return
+        owners = _statement_owners(orm_execute_state, table)
+        if owners is None:
+            _touch(orm_execute_state.session, table)
+        else:
+            _touch_users(orm_execute_state.session, owners)
+
+
+def _before_commit(session):
+    session.flush()  # Objects still pending are only flushed after this hook
+    users = session.info.pop(_TOUCHED_USERS, None)
+    if users:
+        _bump(session, UserVersion.__table__, 'user_id', sorted(users))
+    tables = session.info.pop(_TOUCHED, None)
+    if tables:
+        _bump(session, TableVersion.__table__, 'table_name', sorted(tables))
+
+
+def _after_soft_rollback(session, previous_transaction):
+    session.info.pop(_TOUCHED, None)
+    session.info.pop(_TOUCHED_USERS, None)
+
+
+def _bump(session, table, key, names):
+    dialect = session.get_bind(TableVersion).dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        statement = insert(table).values([{key: name, 'version': 1} for name in names])
+        session.execute(statement.on_conflict_do_update(
+            index_elements=[key], set_={'version': table.c.version + 1}
+        ))
+        return
+
+    for name in names:
+        result = session.execute(table.update().where(table.c[key] == name).values(version=table.c.version + 1))
+        if result.rowcount == 0:
+            session.execute(table.insert().values({key: name, 'version': 1}))
+
+
+def track_table_versions(session_class):
+    """Bump user_version and table_version for what each commit of session_class changed"""
+    event.listen(session_class, 'after_flush', _after_flush)
+    event.listen(session_class, 'do_orm_execute', _do_orm_execute)
+    event.listen(session_class, 'before_commit', _before_commit)
+    event.listen(session_class, 'after_soft_rollback', _after_soft_rollback)
+
+
+def table_versions(tables):
+    """{table name: version}; tables never written since tracking began are at 0"""
+    if not tables:
+        return {}
+    rows = db.session.execute(
+        db.select(TableVersion.table_name, TableVersion.version).where(TableVersion.table_name.in_(tables))
+    )
+    versions = dict.fromkeys(tables, 0)
+    versions.update(rows.all())
+    return versions
+
+
+def user_versions(user_ids):
+    """{user id: version}; users never written since tracking began are at 0"""
+    if not user_ids:
+        return {}
+    rows = db.session.execute(
+        db.select(UserVersion.user_id, UserVersion.version).where(UserVersion.user_id.in_(user_ids))
+    )
+    versions = dict.fromkeys(user_ids, 0)
+    versions.update(rows.all())
+    return versions
+
+
+def immutable(response, etag):
+    """Mark a response for CID-addressed content as cacheable forever"""
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+
+def revalidate(response, etag):
+    """Tag a response that clients may keep but must check with If-None-Match"""
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = REVALIDATE_CACHE_CONTROL
+    return response
+
+
+def not_modified(etag, immutable_content=False):
+    """Empty 304 for a client that already holds the response with this ETag"""
+    response = current_app.response_class(status=304)
+    response.set_etag(etag, weak=not immutable_content)
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if immutable_content else REVALIDATE_CACHE_CONTROL
+    return response
+
+
+class ResponseCache:
+    """Response bodies by ETag, least recently used evicted past max_bytes.
+
+    An ETag already names one version of one response, so entries never go
+    stale: a write moves the ETag on and the old entry ages out.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # etag -> (body, headers)
+        self._used = 0
+
+    def get(self, etag):
+        with self._lock:
+            entry = self._entries.get(etag)
+            if entry is not None:
+                self._entries.move_to_end(etag)
+            return entry
+
+    def put(self, etag, body, headers):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(etag, None)
+            if previous is not None:
+                self._used -= len(previous[0])
+            self._entries[etag] = (body, headers)
+            self._used += len(body)
+            while self._used > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._used -= len(evicted)
+
+    def _etag(self, tables, generation, users):
+        user_ids = users() if users is not None else []
+        if user_ids is None:
+            return None
+        key = repr((request.path, sorted(request.args.items(multi=True)), sorted(table_versions(tables).items()),
+                    sorted(user_versions(user_ids).items()), generation() if generation is not None else None))
+        return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+    def versioned(self, *tables, generation=None, users=None):
+        """Decorate a GET view whose payload depends only on these tables.
+
+        users, if given, is called for the ids of the users the payload
+        shows; their versions go into the ETag, and the tables' counters
+        only cover writes not attributed to a user. It may return None for
+        a request that is not worth caching (a streamed export). generation,
+        if given, is called for a token of process-local state the payload
+        comes from as well (e.g. an in-memory index).
+        """
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                try:
+                    etag = self._etag(tables, generation, users)
+                except SQLAlchemyError:
+                    # No version tables yet (migrations not run): serve without caching
+                    db.session.rollback()
+                    return view(*args, **kwargs)
+                if etag is None:
+                    return view(*args, **kwargs)
+
+                if request.if_none_match.contains_weak(etag):
+                    return not_modified(etag)
+                entry = self.get(etag)
+                if entry is not None:
+                    body, headers = entry
+                    return current_app.response_class(body, status=200, headers=headers)
+
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                revalidate(response, etag)
+                if not response.is_streamed:
+                    self.put(etag, response.get_data(), list(response.headers.items()))
+                return response
+            return wrapper
+        return decorator
@@ -0,0 +1,140 @@
+"""Idempotency-Key support for write endpoints.
+
+A client sends the same Idempotency-Key header with every retry of one
+request. The first time a key is seen, its row is flushed into the
+session before the view runs, so it commits in the same database
+transaction as the view's writes or not at all; the response is stored
+on it once the view returns. A retry finds the row by primary key and
+gets that response back without the view running, so coins never move
+twice. When the view commits nothing (a validation error or a rollback),
+the key is not kept and a retry runs the view again.
+
+A key is bound to a fingerprint of its request, so reusing it for another
+request gets a 422. A retry that arrives while the first request is still
+running, or after its writes committed but before its response was
+stored, gets a 409. Keys expire after ttl seconds; expired rows are
+purged at most every purge_interval seconds by a later request, or by
+`flask purge-idempotency-keys`.
+"""
+import datetime
+import functools
+import hashlib
+import threading
+import time
+
+from flask import current_app, jsonify, request
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from models import db, IdempotencyKey, utcnow
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+def _fingerprint():
+    digest = hashlib.sha256(f'{request.method} {request.path}\n'.encode())
+    digest.update(request.get_data(cache=True))  # Cached, so the view can still read the body
+    return digest.hexdigest()
+
+
+def purge_expired(ttl):
+    """Delete keys older than ttl seconds and return how many were removed"""
+    cutoff = utcnow() - datetime.timedelta(seconds=ttl)
+    result = db.session.execute(db.delete(IdempotencyKey).where(IdempotencyKey.created_at < cutoff))
+    db.session.commit()
+    return result.rowcount
+
+
+class IdempotencyKeys:
+    """Stores the response of each keyed write request and replays it to retries"""
+
+    def __init__(self, ttl=86400, purge_interval=300):
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self._lock = threading.Lock()
+        self._next_purge = 0.0
+
+    def _expired(self, entry):
+        return entry.created_at < utcnow() - datetime.timedelta(seconds=self.ttl)
+
+    def _replay(self, entry, fingerprint):
+        if entry is None or entry.status_code is None:
+            return jsonify({'error': f'A request with this {HEADER} is still in progress'}), 409
+        if entry.request_hash != fingerprint:
+            return jsonify({'error': f'This {HEADER} was already used for a different request'}), 422
+        response = current_app.response_class(entry.response_body, status=entry.status_code, mimetype=entry.mimetype)
+        response.headers['Idempotent-Replayed'] = 'true'
+        return response
+
+    def _claim(self, key, fingerprint, entry):
+        # An expired key is taken over in place; like a new one, the change only commits with the view
+        if entry is None:
+            entry = IdempotencyKey(key=key)
+            db.session.add(entry)
+        entry.request_hash = fingerprint
+        entry.status_code = None
+        entry.response_body = None
+        entry.mimetype = None
+        entry.created_at = utcnow()
+        db.session.flush()
+
+    def _record(self, key, fingerprint, response):
+        # Anything the view left uncommitted is dropped, and with it a key that never committed
+        db.session.rollback()
+        if response.is_streamed:
+            return
+        db.session.execute(
+            db.update(IdempotencyKey)
+            .where(IdempotencyKey.key == key, IdempotencyKey.request_hash == fingerprint,
+                   IdempotencyKey.status_code.is_(None))
+            .values(status_code=response.status_code, response_body=response.get_data(), mimetype=response.mimetype)
+        )
+        db.session.commit()
+
+    def _maybe_purge(self):
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_purge:
+                return
+            self._next_purge = now + self.purge_interval
+        try:
+            purge_expired(self.ttl)
+        except SQLAlchemyError:
+            db.session.rollback()
+            current_app.logger.exception('Purging expired idempotency keys failed')
+
+    def idempotent(self, view):
+        """Decorate a write view so retries with the same Idempotency-Key get the first response"""
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get(HEADER)
+            if key is None or request.method in ('GET', 'HEAD', 'OPTIONS'):
+                return view(*args, **kwargs)
+            if not key or len(key) > MAX_KEY_LENGTH:
+                return jsonify({'error': f'{HEADER} must be 1 to {MAX_KEY_LENGTH} characters'}), 400
+
+            fingerprint = _fingerprint()
+            try:
+                entry = db.session.get(IdempotencyKey, key)
+                if entry is not None and not self._expired(entry):
+                    return self._replay(entry, fingerprint)
+                try:
+                    self._claim(key, fingerprint, entry)
+                except IntegrityError:
+                    # A concurrent request with this key committed first
+                    db.session.rollback()
+                    return self._replay(db.session.get(IdempotencyKey, key), fingerprint)
+            except SQLAlchemyError as e:
+                db.session.rollback()
+                return jsonify({'error': str(e)}), 500
+
+            response = current_app.make_response(view(*args, **kwargs))
+            try:
+                self._record(key, fingerprint, response)
+            except SQLAlchemyError:
+                # The view's own outcome stands; a retry gets a 409 until the key expires
+                db.session.rollback()
+                current_app.logger.exception('Storing the response for an idempotency key failed')
+            self._maybe_purge()
+            return response
+        return wrapper
@@ -0,0 +1,175 @@
+import os
+import threading
+from collections import OrderedDict
+
+from cid import verify_cid
+
+
+class CIDCache:
+    """Two-tier cache for IPFS content keyed by CID.
+
+    Content behind a CID never changes, so entries never go stale; they are
+    only evicted to stay within the memory and disk budgets. Content is
+    checked against its CID before it is stored. The lock only guards the
+    indexes and counters; files are read and written outside it, and a disk
+    that fails is skipped rather than failing the read that filled the cache.
+    """
+
+    def __init__(self, memory_bytes=32 * 1024 * 1024, disk_dir=None, disk_bytes=512 * 1024 * 1024):
+        self.memory_bytes = memory_bytes
+        self.disk_dir = disk_dir
+        self.disk_bytes = disk_bytes
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # cid -> bytes, least recently used first
+        self._memory_used = 0
+        self._disk = OrderedDict()  # cid -> size, least recently used first
+        self._disk_used = 0
+        self._counters = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'fills': 0,
+            'rejected': 0,
+            'evictions': 0,
+            'disk_errors': 0
+        }
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._load_disk_index()
+
+    def _load_disk_index(self):
+        # Rebuild the disk LRU from modification times left by earlier runs
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            path = os.path.join(self.disk_dir, name)
+            if name.endswith('.tmp') or not os.path.isfile(path):
+                continue
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self._disk[name] = size
+            self._disk_used += size
+
+    def _disk_path(self, cid):
+        return os.path.join(self.disk_dir, cid)
+
+    def get(self, cid):
+        """Return the cached bytes for a CID, or None on a miss"""
+        with self._lock:
+            data = self._memory.get(cid)
+            if data is not None:
+                self._memory.move_to_end(cid)
+                self._counters['memory_hits'] += 1
+                return data
+            on_disk = cid in self._disk
+
+        if on_disk:
+            data = self._read_disk(cid)
+
+        with self._lock:
+            if data is None:
+                if on_disk and cid in self._disk:
+                    # Gone or unreadable: forget it, a later put writes it again
+                    self._disk_used -= self._disk.pop(cid)
+                self._counters['misses'] += 1
+                return None
+            if cid in self._disk:
+                self._disk.move_to_end(cid)
+            self._counters['disk_hits'] += 1
+            self._remember(cid, data)
+        return data
+
+    def _read_disk(self, cid):
+        path = self._disk_path(cid)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        try:
+            os.utime(path)  # Keeps the LRU order across restarts
+        except OSError:
+            pass
+        return data
+
+    def put(self, cid, data):
+        """Store content for a CID after checking it; returns True if cached"""
+        if not verify_cid(cid, data):
+            with self._lock:
+                self._counters['rejected'] += 1
+            return False
+
+        with self._lock:
+            self._remember(cid, data)
+            self._counters['fills'] += 1
+            write = self.disk_dir and cid not in self._disk and len(data) <= self.disk_bytes
+
+        if write:
+            try:
+                self._write_disk(cid, data)
+            except OSError:
+                # A full or failing disk only costs the disk tier
+                with self._lock:
+                    self._counters['disk_errors'] += 1
+            else:
+                self._add_disk_entry(cid, len(data))
+        return True
+
+    def _remember(self, cid, data):
+        if len(data) > self.memory_bytes or cid in self._memory:
+            return
+        self._memory[cid] = data
+        self._memory_used += len(data)
+        while self._memory_used > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_used -= len(evicted)
+            self._counters['evictions'] += 1
+
+    def _write_disk(self, cid, data):
+        path = self._disk_path(cid)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)  # Readers never see a partial file
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def _add_disk_entry(self, cid, size):
+        evicted = []
+        with self._lock:
+            if cid in self._disk:
+                return  # A concurrent put of the same content got there first
+            self._disk[cid] = size
+            self._disk_used += size
+            while self._disk_used > self.disk_bytes:
+                name, evicted_size = self._disk.popitem(last=False)
+                self._disk_used -= evicted_size
+                self._counters['evictions'] += 1
+                evicted.append(name)
+
+        for name in evicted:
+            try:
+                os.remove(self._disk_path(name))
+            except OSError:
+                pass
+
+    def stats(self):
+        """Hit/miss counters and current tier sizes"""
+        with self._lock:
+            lookups = self._counters['memory_hits'] + self._counters['disk_hits'] + self._counters['misses']
+            hits = lookups - self._counters['misses']
+            return dict(
+                self._counters,
+                hit_ratio=(hits / lookups) if lookups else 0.0,
+                memory_entries=len(self._memory),
+                memory_bytes=self._memory_used,
+                disk_entries=len(self._disk),
+                disk_bytes=self._disk_used
+            )
@@ -0,0 +1,232 @@
+import datetime
+import json
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from models import db, Transaction, IPFSOutbox, AnchorBatch
+import merkle
+
+
+def _utcnow():
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+class IPFSPublisher:
+    """Background worker that drains the IPFS outbox.
+
+    Transactions are committed together with an outbox entry holding the
+    document to publish. The publisher claims pending entries in batches,
+    adds and pins them on Filebase with bounded concurrency and writes the
+    resulting hash back to the transaction.
+
+    In 'merkle' anchor mode the publisher instead collects the entries of
+    one window (anchor_interval seconds, at most anchor_max_leaves) into a
+    Merkle tree and publishes a single root document holding the leaves.
+    Each transaction keeps the root CID and its inclusion proof.
+    """
+
+    def __init__(self, app, ipfs_service, batch_size=50, concurrency=4,
+                 poll_interval=2.0, max_attempts=5, claim_timeout=300, autostart=True,
+                 anchor_mode='transaction', anchor_interval=60.0, anchor_max_leaves=1024):
+        if anchor_mode not in ('transaction', 'merkle'):
+            raise ValueError(f'Unknown IPFS anchor mode: {anchor_mode}')
+        self.app = app
+        self.ipfs_service = ipfs_service
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.claim_timeout = claim_timeout
+        self.autostart = autostart
+        self.anchor_mode = anchor_mode
+        self.anchor_interval = anchor_interval
+        self.anchor_max_leaves = anchor_max_leaves
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pool = None
+
+    def start(self):
+        """Start the background thread if it is not running yet"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='ipfs-publisher', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        """Ask the background thread to finish its current batch and exit"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+        if self._pool:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    def notify(self):
+        """Wake the publisher right away, starting it on first use.
+
+        With autostart off, entries wait for a dedicated worker running
+        start() or `flask publish-outbox`.
+        """
+        if self.autostart:
+            self.start()
+        if self.anchor_mode == 'transaction':
+            self._wake.set()  # Merkle batches wait for the end of their window
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                claimed = self.publish_pending()
+            except Exception:
+                self.app.logger.exception('IPFS outbox publishing failed')
+                claimed = 0
+
+            # Keep going while there is a backlog, otherwise sleep until woken
+            if claimed < self._batch_limit():
+                self._wake.wait(self.anchor_interval if self.anchor_mode == 'merkle' else self.poll_interval)
+                self._wake.clear()
+
+    def _batch_limit(self):
+        return self.anchor_max_leaves if self.anchor_mode == 'merkle' else self.batch_size
+
+    def publish_pending(self):
+        """Publish one batch of outbox entries and return how many were claimed"""
+        with self.app.app_context():
+            batch = self._claim_batch(self._batch_limit())
+            if not batch:
+                return 0
+
+            if self.anchor_mode == 'merkle':
+                self._anchor(batch)
+                return len(batch)
+
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.concurrency,
+                                                thread_name_prefix='ipfs-publish')
+            documents = [json.loads(entry.payload) for entry in batch]
+            results = list(self._pool.map(self._publish_one, documents))
+
+            self._record_results(batch, results)
+            return len(batch)
+
+    def drain(self):
+        """Publish until no claimable entries are left, returns the total claimed"""
+        total = 0
+        while True:
+            claimed = self.publish_pending()
+            total += claimed
+            if claimed < self._batch_limit():
+                return total
+
+    def _claimable(self, now):
+        stale = now - datetime.timedelta(seconds=self.claim_timeout)
+        return db.or_(
+            IPFSOutbox.status == 'pending',
+            db.and_(IPFSOutbox.status == 'publishing', IPFSOutbox.claimed_at < stale)
+        )
+
+    def _claim_batch(self, limit):
+        now = _utcnow()
+        token = str(uuid.uuid4())
+
+        candidate_ids = [row.id for row in db.session.query(IPFSOutbox.id)
+                         .filter(self._claimable(now))
+                         .order_by(IPFSOutbox.id)
+                         .limit(limit)]
+        if not candidate_ids:
+            return []
+
+        # Conditional update so several workers can share one outbox safely
+        IPFSOutbox.query.filter(
+            IPFSOutbox.id.in_(candidate_ids),
+            self._claimable(now)
+        ).update({
+            'status': 'publishing',
+            'claim_token': token,
+            'claimed_at': now,
+            'attempts': IPFSOutbox.attempts + 1
+        }, synchronize_session=False)
+        db.session.commit()
+
+        return IPFSOutbox.query.filter_by(claim_token=token).order_by(IPFSOutbox.id).all()
+
+    def _publish_one(self, document):
+        # Runs on the pool threads, so no database access in here
+        ipfs_hash = self.ipfs_service.add_json_to_ipfs(document)
+        if isinstance(ipfs_hash, dict) and 'error' in ipfs_hash:
+            return None, ipfs_hash['error']
+        if not ipfs_hash:
+            return None, 'Filebase returned no hash'
+
+        pin_result = self.ipfs_service.pin_hash(ipfs_hash)
+        if isinstance(pin_result, dict) and 'error' in pin_result:
+            return None, pin_result['error']
+
+        return ipfs_hash, None
+
+    def _finish_entries(self, batch, results):
+        """Update entry states from (hash, error) results, returns {transaction_id: hash}"""
+        now = _utcnow()
+        published = {}
+
+        for entry, (ipfs_hash, error) in zip(batch, results):
+            entry.claim_token = None
+            if error:
+                entry.last_error = error
+                entry.status = 'failed' if entry.attempts >= self.max_attempts else 'pending'
+                continue
+            entry.status = 'published'
+            entry.last_error = None
+            entry.published_at = now
+            published[entry.transaction_id] = ipfs_hash
+        return published
+
+    def _record_results(self, batch, results):
+        published = self._finish_entries(batch, results)
+
+        for transaction in Transaction.query.filter(Transaction.id.in_(list(published))):
+            transaction.ipfs_hash = published[transaction.id]
+
+        db.session.commit()
+
+    def _anchor(self, batch):
+        """Publish one Merkle root document for a batch and store a proof per transaction"""
+        documents = [json.loads(entry.payload) for entry in batch]
+        leaves = [merkle.leaf_hash(document) for document in documents]
+        levels = merkle.build(leaves)
+        root_hash = merkle.root(levels)
+
+        # No timestamp in here: a retried window yields the same CID
+        root_document = {
+            'type': 'coinnect-anchor',
+            'version': 1,
+            'root': root_hash,
+            'leaves': [
+                {'transaction_id': entry.transaction_id, 'leaf': leaf, 'document': document}
+                for entry, leaf, document in zip(batch, leaves, documents)
+            ]
+        }
+        root_cid, error = self._publish_one(root_document)
+        if error:
+            self._finish_entries(batch, [(None, error)] * len(batch))
+            db.session.commit()
+            return
+
+        if not AnchorBatch.query.filter_by(root_cid=root_cid).first():
+            db.session.add(AnchorBatch(root_hash=root_hash, root_cid=root_cid, leaf_count=len(leaves)))
+
+        positions = {entry.transaction_id: index for index, entry in enumerate(batch)}
+        self._finish_entries(batch, [(root_cid, None)] * len(batch))
+        for transaction in Transaction.query.filter(Transaction.id.in_(list(positions))):
+            index = positions[transaction.id]
+            transaction.anchor_cid = root_cid
+            transaction.anchor_leaf_index = index
+            transaction.anchor_proof = json.dumps(merkle.proof(levels, index))
+
+        db.session.commit()
@@ -1,12 +1,80 @@
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import os
 import base64
+import random
+import threading
+import time
+import uuid
+
+from cid import CHUNK_SIZE, canonical_json
+
+# Responses worth retrying for idempotent calls
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class _MultipartFileBody:
+    """multipart/form-data body holding one file, read from disk a block at a time.
+
+    requests streams any body with read() and a length instead of loading
+    it, so only one block is held in memory. progress, if given, is called
+    with the file bytes sent so far; seek(0) starts over for a retry.
+    """
+
+    def __init__(self, file, size, filename, progress=None, block_size=CHUNK_SIZE):
+        boundary = uuid.uuid4().hex
+        filename = filename.replace('"', '').replace('\r', '').replace('\n', '')
+        self.content_type = f'multipart/form-data; boundary={boundary}'
+        self._head = (f'--{boundary}\r\n'
+                      f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+                      'Content-Type: application/octet-stream\r\n\r\n').encode()
+        self._tail = f'\r\n--{boundary}--\r\n'.encode()
+        self._file = file
+        self._size = size
+        self._progress = progress
+        self._block_size = block_size
+        self.seek(0)
+
+    def __len__(self):
+        return len(self._head) + self._size + len(self._tail)
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=0):
+        if (offset, whence) != (0, 0):
+            raise OSError('A streamed upload can only be rewound to the start')
+        self._file.seek(0)
+        self._position = 0
+        self._sent = 0
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self._block_size
+        head_left = len(self._head) - self._position
+        if head_left > 0:
+            data = self._head[self._position:self._position + min(size, head_left)]
+        elif self._sent < self._size:
+            data = self._file.read(min(size, self._block_size, self._size - self._sent))
+            if not data:
+                raise OSError('File shrank while it was being uploaded')
+            self._sent += len(data)
+            if self._progress is not None:
+                self._progress(self._sent)
+        else:
+            offset = self._position - len(self._head) - self._size
+            data = self._tail[offset:offset + size]
+        self._position += len(data)
+        return data
+
 
 class IPFSService:
-    def __init__(self):
-        # Filebase IPFS endpoint
-        self.base_url = "https://api.filebase.io/v1/ipfs"
+    def __init__(self, cache=None, pool_size=10, connect_timeout=3.05, read_timeout=30,
+                 max_retries=3, backoff_factor=0.25, backoff_max=5.0,
+                 base_url="https://api.filebase.io/v1/ipfs"):
+        # Filebase IPFS endpoint (or a compatible one, e.g. tools/ipfs_standin.py)
+        self.base_url = base_url.rstrip('/')
         
         # Your Filebase access key and secret key
         # These should be stored in environment variables in production
@@ -16,35 +84,104 @@ class IPFSService:
         # Set up basic authentication
         self.auth = self._get_basic_auth()
         
+        # Optional CIDCache - content behind a CID never changes
+        self.cache = cache
+        
+        # One pooled keep-alive session instead of a new TCP+TLS connection per call
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.session = requests.Session()
+        self.session.headers['Authorization'] = self.auth
+        self._adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', self._adapter)
+        self.session.mount('http://', self._adapter)
+        
+        self._stats_lock = threading.Lock()
+        self._stats = {'requests': 0, 'retries': 0, 'errors': 0}
+        
     def _get_basic_auth(self):
         # Create basic auth header from access and secret keys
         auth_string = f"{self.access_key}:{self.secret_key}"
         encoded_auth = base64.b64encode(auth_string.encode()).decode()
         return f"Basic {encoded_auth}"
     
+    def _request(self, method, path, idempotent=False, **kwargs):
+        """Send a request on the pooled session, retrying idempotent calls with jittered backoff"""
+        attempts = self.max_retries + 1 if idempotent else 1
+        body = kwargs.get('data')
+        for attempt in range(attempts):
+            if attempt and hasattr(body, 'seek'):
+                body.seek(0)  # A streamed body starts over on a retry
+            self._count('requests')
+            try:
+                response = self.session.request(method, f"{self.base_url}{path}", timeout=self.timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self._count('errors')
+                if attempt == attempts - 1:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUS_CODES or attempt == attempts - 1:
+                    return response
+            
+            self._count('retries')
+            # Full jitter keeps retrying workers from hitting Filebase in lockstep
+            time.sleep(random.uniform(0, min(self.backoff_max, self.backoff_factor * 2 ** attempt)))
+    
+    def _count(self, key):
+        with self._stats_lock:
+            self._stats[key] += 1
+    
+    def pool_stats(self):
+        """Connection pool usage and request/retry counters"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        
+        pools = []
+        for key in self._adapter.poolmanager.pools.keys():
+            pool = self._adapter.poolmanager.pools.get(key)
+            if pool is None:
+                continue
+            pools.append({
+                'host': pool.host,
+                'connections_opened': pool.num_connections,
+                'requests_sent': pool.num_requests,
+                'idle_connections': pool.pool.qsize() if pool.pool else 0,
+                'max_size': pool.pool.maxsize if pool.pool else 0
+            })
+        stats['pools'] = pools
+        stats['timeout'] = {'connect': self.timeout[0], 'read': self.timeout[1]}
+        return stats
+    
     def add_json_to_ipfs(self, json_data):
         """Add JSON data to IPFS via Filebase"""
         try:
-            # Convert Python dict to JSON string
-            json_str = json.dumps(json_data)
+            # Canonical bytes, so the CID can be known locally (cid.document_cid) before uploading
+            content = canonical_json(json_data)
             
             # Set up the request headers
             headers = {
-                'Authorization': self.auth,
                 'Content-Type': 'application/json'
             }
             
             # Make the API request to add the content to IPFS
-            response = requests.post(
-                f"{self.base_url}/add", 
-                data=json_str,
+            response = self._request(
+                'POST', "/add",
+                data=content,
                 headers=headers
             )
             
             if response.status_code == 200:
                 result = response.json()
+                ipfs_hash = result.get('Hash')
+                
+                # We already hold the content, so later reads need no round trip
+                if self.cache is not None and ipfs_hash:
+                    self.cache.put(ipfs_hash, content)
+                
                 # Return the IPFS hash (CID)
-                return result.get('Hash')
+                return ipfs_hash
             else:
                 return {"error": f"Failed to add to IPFS: {response.status_code} - {response.text}"}
         
@@ -54,25 +191,27 @@ class IPFSService:
     def get_json_from_ipfs(self, ipfs_hash):
         """Get JSON data from IPFS via Filebase"""
         try:
-            # Set up the request headers
-            headers = {
-                'Authorization': self.auth
-            }
+            content = self.cache.get(ipfs_hash) if self.cache is not None else None
             
-            # Make the API request to get the content from IPFS
-            response = requests.get(
-                f"{self.base_url}/cat?arg={ipfs_hash}", 
-                headers=headers
-            )
+            if content is None:
+                # Make the API request to get the content from IPFS
+                response = self._request(
+                    'GET', f"/cat?arg={ipfs_hash}",
+                    idempotent=True
+                )
+                
+                if response.status_code != 200:
+                    return {"error": f"Failed to get from IPFS: {response.status_code} - {response.text}"}
+                
+                content = response.content
+                if self.cache is not None:
+                    self.cache.put(ipfs_hash, content)
             
-            if response.status_code == 200:
-                # Parse the JSON response
-                try:
-                    return json.loads(response.text)
-                except json.JSONDecodeError:
-                    return {"error": "Could not decode JSON from IPFS response"}
-            else:
-                return {"error": f"Failed to get from IPFS: {response.status_code} - {response.text}"}
+            # Parse the JSON response
+            try:
+                return json.loads(content)
+            except json.JSONDecodeError:
+                return {"error": "Could not decode JSON from IPFS response"}
         
         except Exception as e:
             return {"error": f"Exception when getting from IPFS: {str(e)}"}
@@ -80,13 +219,9 @@ class IPFSService:
     def pin_hash(self, ipfs_hash):
         """Pin an IPFS hash to ensure it persists in Filebase storage"""
         try:
-            headers = {
-                'Authorization': self.auth
-            }
-            
-            response = requests.post(
-                f"{self.base_url}/pin/add?arg={ipfs_hash}", 
-                headers=headers
+            response = self._request(
+                'POST', f"/pin/add?arg={ipfs_hash}",
+                idempotent=True
             )
             
             if response.status_code == 200:
@@ -98,24 +233,33 @@ class IPFSService:
         except Exception as e:
             return {"error": f"Exception when pinning hash: {str(e)}"}
     
-    def upload_file_to_ipfs(self, file_path):
-        """Upload a file to IPFS via Filebase"""
+    def is_pinned(self, ipfs_hash):
+        """Whether Filebase already has a recursive pin for this hash"""
+        try:
+            # Not idempotent on purpose: "not pinned" comes back as a 500, which must not be retried
+            response = self._request(
+                'POST', f"/pin/ls?arg={ipfs_hash}&type=recursive"
+            )
+            return response.status_code == 200 and ipfs_hash in response.json().get('Keys', {})
+        except Exception:
+            return False
+    
+    def upload_file_to_ipfs(self, file_path, progress=None, filename=None):
+        """Upload a file to IPFS via Filebase, streamed from disk one block at a time"""
         try:
             # Check if file exists
             if not os.path.isfile(file_path):
                 return {"error": "File not found"}
             
-            headers = {
-                'Authorization': self.auth
-            }
-            
-            # Open the file in binary mode and send it
+            # Adding the same bytes again gives the same CID, so a failed upload is retried from the start
             with open(file_path, 'rb') as file:
-                files = {'file': file}
-                response = requests.post(
-                    f"{self.base_url}/add", 
-                    files=files,
-                    headers=headers
+                body = _MultipartFileBody(file, os.fstat(file.fileno()).st_size,
+                                          filename or os.path.basename(file_path), progress)
+                response = self._request(
+                    'POST', "/add",
+                    idempotent=True,
+                    data=body,
+                    headers={'Content-Type': body.content_type}
                 )
             
             if response.status_code == 200:
@@ -0,0 +1,298 @@
+"""Background IPFS uploads for files too large to send from a request thread.
+
+The request that receives a file spools it to disk one block at a time and
+computes its CID in the same pass (cid.CIDBuilder), so memory stays at one
+block whatever the file size. The file is then queued on a small thread
+pool of that worker, which skips it if Filebase already holds a pin, or
+else streams it to Filebase (IPFSService.upload_file_to_ipfs) and pins it.
+
+Every upload has a status row in the ipfs_upload table, so any worker can
+answer a status poll and see what the others uploaded. Content already
+uploaded is not sent again, and neither is content another upload is still
+handling: while an upload is active its row holds the CID in a unique
+column, so two workers cannot queue the same content at once. Finished
+statuses are kept for status_ttl seconds; an active upload that made no
+progress for stale_after seconds (its worker stopped) is marked failed.
+"""
+import datetime
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from cid import CHUNK_SIZE, CIDBuilder
+from models import db, IPFSUpload, utcnow
+
+ACTIVE_STATES = ('queued', 'uploading', 'pinning')
+FORM_OVERHEAD = 64 * 1024  # Room for the multipart boundaries and part headers around an uploaded file
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class UploadQueueFull(Exception):
+    pass
+
+
+def spool(stream, directory, max_bytes, block_size=CHUNK_SIZE):
+    """Copy a stream to a temporary file in directory, hashing it on the way; returns (path, cid, size)"""
+    os.makedirs(directory, exist_ok=True)
+    builder = CIDBuilder()
+    fd, path = tempfile.mkstemp(dir=directory, suffix='.upload')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            while True:
+                block = stream.read(block_size)
+                if not block:
+                    break
+                if builder.size + len(block) > max_bytes:
+                    raise UploadTooLarge(f'File is larger than {max_bytes} bytes')
+                builder.update(block)
+                file.write(block)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, builder.cid(), builder.size
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _timestamp(value):
+    # Stored as naive UTC; statuses report seconds since the epoch
+    return value.replace(tzinfo=datetime.timezone.utc).timestamp() if value is not None else None
+
+
+def _status(upload):
+    return {
+        'id': upload.id,
+        'filename': upload.filename,
+        'cid': upload.cid,
+        'size': upload.size,
+        'bytes_sent': upload.bytes_sent,
+        'state': upload.state,
+        'deduplicated': upload.deduplicated,
+        'pin_result': json.loads(upload.pin_result) if upload.pin_result is not None else None,
+        'error': upload.error,
+        'created_at': _timestamp(upload.created_at),
+        'finished_at': _timestamp(upload.finished_at)
+    }
+
+
+class FileUploader:
+    """Uploads spooled files to IPFS with bounded concurrency, tracking each one's status in the database"""
+
+    def __init__(self, app, ipfs_service, concurrency=2, max_pending=32, status_ttl=3600, stale_after=3600,
+                 progress_interval=1.0, prune_interval=60):
+        self.app = app
+        self.ipfs_service = ipfs_service
+        self.concurrency = concurrency
+        self.max_pending = max_pending
+        self.status_ttl = status_ttl
+        self.stale_after = stale_after
+        self.progress_interval = progress_interval
+        self.prune_interval = prune_interval
+
+        self._lock = threading.Lock()
+        self._pending = 0  # Uploads this worker has queued or is running
+        self._pool = None
+        self._next_prune = 0.0
+
+    def submit(self, path, cid, size, filename=''):
+        """Queue a spooled file for upload and return its status; the file is removed once handled
+
+        Content already uploaded gets a status that is done at once. Content another upload is still
+        handling, on any worker, is not queued again: that upload's status is returned, marked deduplicated.
+        """
+        try:
+            self._maybe_prune()
+            if IPFSUpload.query.filter_by(cid=cid, state='done').first() is not None:
+                upload = IPFSUpload(id=uuid.uuid4().hex, filename=filename, cid=cid, size=size, state='done',
+                                    deduplicated=True, finished_at=utcnow())
+                db.session.add(upload)
+                db.session.commit()
+                _remove(path)
+                return _status(upload)
+
+            active = self._active_upload(cid)
+            if active is not None:
+                _remove(path)
+                return dict(_status(active), deduplicated=True)
+
+            with self._lock:
+                if self._pending >= self.max_pending:
+                    raise UploadQueueFull(f'{self.max_pending} uploads are already in progress')
+                self._pending += 1
+
+            upload = IPFSUpload(id=uuid.uuid4().hex, filename=filename, cid=cid, active_cid=cid, size=size)
+            db.session.add(upload)
+            try:
+                db.session.commit()
+            except IntegrityError:
+                # Another request queued the same content first
+                db.session.rollback()
+                self._release()
+                _remove(path)
+                active = IPFSUpload.query.filter_by(cid=cid).order_by(IPFSUpload.created_at.desc()).first()
+                return dict(_status(active), deduplicated=True)
+            except BaseException:
+                self._release()
+                raise
+        except BaseException:
+            _remove(path)
+            raise
+
+        status = _status(upload)
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='ipfs-upload')
+            self._pool.submit(self._upload, upload.id, path)
+        return status
+
+    def status(self, upload_id):
+        """Status of one upload, or None if unknown or expired"""
+        upload = db.session.get(IPFSUpload, upload_id)
+        return _status(upload) if upload is not None else None
+
+    def uploads(self, active_only=False):
+        """Statuses of known uploads, oldest first"""
+        self._maybe_prune()
+        query = IPFSUpload.query
+        if active_only:
+            query = query.filter(IPFSUpload.state.in_(ACTIVE_STATES))
+        return [_status(upload) for upload in query.order_by(IPFSUpload.created_at, IPFSUpload.id)]
+
+    def stats(self):
+        """Uploads per state, limits and the number of CIDs known to be pinned"""
+        states = dict(db.session.execute(
+            db.select(IPFSUpload.state, db.func.count()).group_by(IPFSUpload.state)
+        ).all())
+        known_pinned = db.session.scalar(
+            db.select(db.func.count(db.distinct(IPFSUpload.cid))).where(IPFSUpload.state == 'done')
+        )
+        return {
+            'states': states,
+            'concurrency': self.concurrency,
+            'max_pending': self.max_pending,
+            'known_pinned': known_pinned
+        }
+
+    def stop(self, wait=True):
+        """Shut down the upload threads, letting queued uploads finish if wait is true"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait)
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+
+    def _active_upload(self, cid):
+        """The upload still handling this CID, after failing it if its worker stopped making progress"""
+        upload = IPFSUpload.query.filter_by(active_cid=cid).first()
+        if upload is None:
+            return None
+        if upload.updated_at >= utcnow() - datetime.timedelta(seconds=self.stale_after):
+            return upload
+        self._abandon(IPFSUpload.id == upload.id)
+        db.session.commit()
+        return None
+
+    def _abandon(self, condition):
+        db.session.execute(db.update(IPFSUpload).where(condition, IPFSUpload.state.in_(ACTIVE_STATES)).values(
+            state='failed', error=f'No progress for {self.stale_after} seconds', active_cid=None,
+            finished_at=utcnow()
+        ))
+
+    def _maybe_prune(self):
+        # Finished statuses are kept long enough for clients polling them to see the outcome
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_prune:
+                return
+            self._next_prune = now + self.prune_interval
+        try:
+            cutoff = utcnow()
+            db.session.execute(db.delete(IPFSUpload).where(
+                IPFSUpload.finished_at < cutoff - datetime.timedelta(seconds=self.status_ttl)
+            ))
+            self._abandon(IPFSUpload.updated_at < cutoff - datetime.timedelta(seconds=self.stale_after))
+            db.session.commit()
+        except SQLAlchemyError:
+            db.session.rollback()
+            self.app.logger.exception('Pruning IPFS upload statuses failed')
+
+    def _update(self, upload_id, **changes):
+        changes['updated_at'] = utcnow()
+        if changes.get('state') in ('done', 'failed'):
+            changes['finished_at'] = changes['updated_at']
+            changes['active_cid'] = None
+        if 'pin_result' in changes:
+            changes['pin_result'] = json.dumps(changes['pin_result'])
+        db.session.execute(db.update(IPFSUpload).where(IPFSUpload.id == upload_id).values(**changes))
+        db.session.commit()
+
+    def _progress(self, upload_id):
+        # Progress is written at most every progress_interval seconds; it also shows the upload is alive
+        last = [0.0]
+
+        def report(sent):
+            now = time.monotonic()
+            if now - last[0] >= self.progress_interval:
+                last[0] = now
+                self._update(upload_id, bytes_sent=sent)
+        return report
+
+    def _upload(self, upload_id, path):
+        with self.app.app_context():
+            try:
+                claimed = db.session.execute(db.update(IPFSUpload).where(
+                    IPFSUpload.id == upload_id, IPFSUpload.state == 'queued'
+                ).values(state='uploading', updated_at=utcnow()))
+                db.session.commit()
+                if claimed.rowcount == 0:
+                    return  # Failed as abandoned while it waited in the queue
+                upload = db.session.get(IPFSUpload, upload_id)
+                cid, filename, size = upload.cid, upload.filename, upload.size
+
+                if self.ipfs_service.is_pinned(cid):
+                    self._update(upload_id, state='done', deduplicated=True)
+                    return
+
+                ipfs_hash = self.ipfs_service.upload_file_to_ipfs(path, progress=self._progress(upload_id),
+                                                                  filename=filename)
+                if isinstance(ipfs_hash, dict) and 'error' in ipfs_hash:
+                    self._update(upload_id, state='failed', error=ipfs_hash['error'])
+                    return
+                if ipfs_hash != cid:
+                    self.app.logger.warning('Filebase returned %s for a file computed locally as %s', ipfs_hash, cid)
+
+                self._update(upload_id, state='pinning', cid=ipfs_hash, bytes_sent=size)
+                pin_result = self.ipfs_service.pin_hash(ipfs_hash)
+                if isinstance(pin_result, dict) and 'error' in pin_result:
+                    self._update(upload_id, state='failed', error=pin_result['error'])
+                else:
+                    self._update(upload_id, state='done', pin_result=pin_result)
+            except Exception as e:
+                db.session.rollback()
+                self.app.logger.exception('IPFS file upload failed')
+                try:
+                    self._update(upload_id, state='failed', error=str(e))
+                except SQLAlchemyError:
+                    db.session.rollback()
+                    self.app.logger.exception('Recording a failed IPFS file upload failed')
+            finally:
+                _remove(path)
+                self._release()
+                db.session.remove()
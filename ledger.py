@@ -0,0 +1,92 @@
+from models import db, User, LedgerEntry
+
+
+class InsufficientFunds(Exception):
+    """The requester's balance does not cover the transfer"""
+
+
+def _debit(user_id, amount):
+    # Conditional UPDATE (balance >= amount): the check and the write happen
+    # atomically in the database, so concurrent transfers cannot overdraw
+    return db.session.execute(
+        db.update(User)
+        .where(User.id == user_id, User.skillcoins_balance >= amount)
+        .values(skillcoins_balance=User.skillcoins_balance - amount)
+        .execution_options(synchronize_session=False)
+    ).rowcount == 1
+
+
+def _credit(user_id, amount):
+    db.session.execute(
+        db.update(User)
+        .where(User.id == user_id)
+        .values(skillcoins_balance=User.skillcoins_balance + amount)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _entries(transaction_id, requester_id, offerer_id, amount):
+    return [
+        {'transaction_id': transaction_id, 'user_id': requester_id, 'amount': -amount},
+        {'transaction_id': transaction_id, 'user_id': offerer_id, 'amount': amount},
+    ]
+
+
+def transfer(transaction_id, requester_id, offerer_id, amount):
+    """Move SkillCoins from requester to offerer inside the current database transaction.
+
+    Raises InsufficientFunds when the requester cannot cover the amount.
+    Both legs are recorded in the ledger in the same transaction; nothing
+    is committed here.
+    """
+    if not _debit(requester_id, amount):
+        raise InsufficientFunds('Insufficient SkillCoins balance')
+    _credit(offerer_id, amount)
+    db.session.execute(db.insert(LedgerEntry), _entries(transaction_id, requester_id, offerer_id, amount))
+
+
+def apply_transfers(transfers):
+    """Apply (requester_id, offerer_id, amount) transfers in order, returns one bool per transfer.
+
+    Transfers run one after another so a credit earlier in the list can
+    fund a debit later on. A transfer the requester cannot cover is
+    skipped (its debit matched no row, so nothing changed) and the rest
+    carry on. Ledger entries are written by record_transfers() once the
+    transactions have ids.
+    """
+    applied = []
+    for requester_id, offerer_id, amount in transfers:
+        ok = _debit(requester_id, amount)
+        if ok:
+            _credit(offerer_id, amount)
+        applied.append(ok)
+    return applied
+
+
+def record_transfers(transfers):
+    """Bulk insert the ledger entries for (transaction_id, requester_id, offerer_id, amount) rows"""
+    rows = [entry for transfer in transfers for entry in _entries(*transfer)]
+    if rows:
+        db.session.execute(db.insert(LedgerEntry), rows)
+
+
+def adjust_trust(user_id, delta):
+    """Increment a trust score in the database rather than writing back a value read earlier"""
+    db.session.execute(
+        db.update(User)
+        .where(User.id == user_id)
+        .values(trust_score=User.trust_score + delta)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def adjust_trust_many(deltas):
+    """Apply {user_id: delta} trust increments in one executemany"""
+    if not deltas:
+        return
+    table = User.__table__
+    db.session.execute(
+        table.update().where(table.c.id == db.bindparam('user_id'))
+        .values(trust_score=table.c.trust_score + db.bindparam('delta')),
+        [{'user_id': user_id, 'delta': delta} for user_id, delta in deltas.items()]
+    )
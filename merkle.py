@@ -0,0 +1,68 @@
+"""Binary SHA-256 Merkle trees over JSON documents.
+
+Leaves and inner nodes are hashed with different prefixes so a leaf can
+never be passed off as an inner node. A level with an odd number of nodes
+promotes its last node unchanged instead of duplicating it, so no two
+different leaf lists share a root.
+"""
+import hashlib
+
+from cid import canonical_json
+
+_LEAF_PREFIX = b'\x00'
+_NODE_PREFIX = b'\x01'
+
+
+def leaf_hash(document):
+    """Hex digest of a leaf document"""
+    return hashlib.sha256(_LEAF_PREFIX + canonical_json(document)).hexdigest()
+
+
+def _node_hash(left, right):
+    return hashlib.sha256(_NODE_PREFIX + bytes.fromhex(left) + bytes.fromhex(right)).hexdigest()
+
+
+def build(leaves):
+    """All levels of the tree for a list of leaf hashes, leaves first and the root last"""
+    if not leaves:
+        raise ValueError('A Merkle tree needs at least one leaf')
+    levels = [list(leaves)]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        parent = [_node_hash(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            parent.append(level[-1])
+        levels.append(parent)
+    return levels
+
+
+def root(levels):
+    return levels[-1][0]
+
+
+def proof(levels, index):
+    """Sibling hashes from a leaf up to the root, as [side, hash] pairs.
+
+    side is 'L' when the sibling sits to the left of the running hash.
+    """
+    path = []
+    for level in levels[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            path.append(['L' if sibling < index else 'R', level[sibling]])
+        index //= 2
+    return path
+
+
+def root_from_proof(leaf, path):
+    current = leaf
+    for side, sibling in path:
+        current = _node_hash(sibling, current) if side == 'L' else _node_hash(current, sibling)
+    return current
+
+
+def verify(leaf, path, expected_root):
+    try:
+        return root_from_proof(leaf, path) == expected_root
+    except (TypeError, ValueError):
+        return False
@@ -0,0 +1,203 @@
+"""Per-request instrumentation and Prometheus-style metrics.
+
+Flask request hooks time every sampled request. SQLAlchemy engine events
+add up query count and SQL time, and a wrapper around IPFSService
+requests adds up Filebase time. The split is reported per request in a
+Server-Timing header and aggregated into histograms served at /metrics.
+Time that is neither SQL nor IPFS (view code, JSON serialisation) shows
+up as 'app'.
+
+Only a sample_rate fraction of requests is measured; the request counter
+itself always counts every request.
+"""
+import bisect
+import random
+import threading
+import time
+
+from flask import request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a tuple of label values"""
+
+    def __init__(self, name, help_text, label_names, buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}  # labels -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, labels, value):
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[position] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for labels, values in sorted(series.items()):
+            label_text = _labels(self.label_names, labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), values):
+                cumulative += count
+                le = _labels(self.label_names + ('le',), labels + (_number(bound),))
+                lines.append(f'{self.name}_bucket{le} {cumulative}')
+            lines.append(f'{self.name}_sum{label_text} {_number(values[-1])}')
+            lines.append(f'{self.name}_count{label_text} {cumulative}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            lines.append(f'{self.name}{_labels(self.label_names, labels)} {_number(value)}')
+        return lines
+
+
+def _number(value):
+    if isinstance(value, str):
+        return value
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in values)
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(names, escaped)) + '}'
+
+
+class _RequestRecord:
+    __slots__ = ('started', 'sql_count', 'sql_time', 'ipfs_count', 'ipfs_time')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.ipfs_count = 0
+        self.ipfs_time = 0.0
+
+
+class Instrumentation:
+    """Collects request, SQL and IPFS timings for one Flask app"""
+
+    def __init__(self, sample_rate=1.0, server_timing=True):
+        self.sample_rate = sample_rate
+        self.server_timing = server_timing
+        self._current = threading.local()  # The sampled request handled by this thread, if any
+
+        route_labels = ('route', 'method', 'status')
+        self.requests_total = Counter('coinnect_requests_total', 'Requests handled, sampled or not', route_labels)
+        self.request_duration = Histogram('coinnect_request_duration_seconds',
+                                          'Wall time of sampled requests', route_labels)
+        self.request_sql_queries = Histogram('coinnect_request_sql_queries', 'SQL statements per sampled request',
+                                             ('route',), COUNT_BUCKETS)
+        self.request_sql_duration = Histogram('coinnect_request_sql_seconds', 'SQL time per sampled request', ('route',))
+        self.request_ipfs_duration = Histogram('coinnect_request_ipfs_seconds', 'IPFS time per sampled request',
+                                               ('route',))
+        self.ipfs_calls = Histogram('coinnect_ipfs_call_duration_seconds',
+                                    'Duration of every IPFS API call, including background publishing',
+                                    ('operation', 'status'))
+
+    def init_app(self, app):
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        # Listening on the Engine class covers every engine the app creates
+        event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def instrument_ipfs(self, ipfs_service):
+        """Time every HTTP call made through IPFSService._request"""
+        send = ipfs_service._request
+
+        def timed_request(method, path, *args, **kwargs):
+            started = time.perf_counter()
+            status = 'error'
+            try:
+                response = send(method, path, *args, **kwargs)
+                status = str(response.status_code)
+                return response
+            finally:
+                elapsed = time.perf_counter() - started
+                self.ipfs_calls.observe((path.split('?', 1)[0].lstrip('/'), status), elapsed)
+                record = getattr(self._current, 'record', None)
+                if record is not None:
+                    record.ipfs_count += 1
+                    record.ipfs_time += elapsed
+
+        ipfs_service._request = timed_request
+
+    def _before_request(self):
+        self._current.record = _RequestRecord() if random.random() < self.sample_rate else None
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if getattr(self._current, 'record', None) is not None:
+            conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        record = getattr(self._current, 'record', None)
+        if record is not None and conn.info.get('query_started'):
+            record.sql_count += 1
+            record.sql_time += time.perf_counter() - conn.info['query_started'].pop()
+
+    def _after_request(self, response):
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        self.requests_total.inc((route, request.method, str(response.status_code)))
+
+        record = getattr(self._current, 'record', None)
+        if record is None:
+            return response
+
+        total = time.perf_counter() - record.started
+        self.request_duration.observe((route, request.method, str(response.status_code)), total)
+        self.request_sql_queries.observe((route,), record.sql_count)
+        self.request_sql_duration.observe((route,), record.sql_time)
+        self.request_ipfs_duration.observe((route,), record.ipfs_time)
+
+        if self.server_timing:
+            app_time = max(total - record.sql_time - record.ipfs_time, 0.0)
+            response.headers.add('Server-Timing', ', '.join([
+                f'db;dur={record.sql_time * 1000:.2f};desc="{record.sql_count} queries"',
+                f'ipfs;dur={record.ipfs_time * 1000:.2f};desc="{record.ipfs_count} calls"',
+                f'app;dur={app_time * 1000:.2f}',
+                f'total;dur={total * 1000:.2f}'
+            ]))
+        return response
+
+    def _teardown_request(self, exc):
+        self._current.record = None
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in (self.requests_total, self.request_duration, self.request_sql_queries,
+                       self.request_sql_duration, self.request_ipfs_duration, self.ipfs_calls):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,100 @@
+"""initial schema
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-18 03:07:20.886710
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases created by db.create_all() already have some of these tables
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'user' not in existing:
+        op.create_table('user',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('email', sa.String(length=100), nullable=False),
+        sa.Column('trust_score', sa.Float(), nullable=True),
+        sa.Column('skillcoins_balance', sa.Float(), nullable=True),
+        sa.Column('ipfs_profile_hash', sa.String(length=100), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('email')
+        )
+    if 'skill' not in existing:
+        op.create_table('skill',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('skill_name', sa.String(length=100), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('is_offered', sa.Boolean(), nullable=True),
+        sa.Column('availability', sa.String(length=100), nullable=True),
+        sa.Column('ipfs_hash', sa.String(length=100), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+    if 'transaction' not in existing:
+        op.create_table('transaction',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('offerer_id', sa.Integer(), nullable=False),
+        sa.Column('requester_id', sa.Integer(), nullable=False),
+        sa.Column('skill_id', sa.Integer(), nullable=False),
+        sa.Column('amount_paid', sa.Float(), nullable=True),
+        sa.Column('transaction_date', sa.DateTime(), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=True),
+        sa.Column('ipfs_hash', sa.String(length=100), nullable=True),
+        sa.ForeignKeyConstraint(['offerer_id'], ['user.id'], ),
+        sa.ForeignKeyConstraint(['requester_id'], ['user.id'], ),
+        sa.ForeignKeyConstraint(['skill_id'], ['skill.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+    if 'ipfs_outbox' not in existing:
+        op.create_table('ipfs_outbox',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('transaction_id', sa.Integer(), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=True),
+        sa.Column('claim_token', sa.String(length=36), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('claimed_at', sa.DateTime(), nullable=True),
+        sa.Column('published_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['transaction_id'], ['transaction.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('transaction_id')
+        )
+        with op.batch_alter_table('ipfs_outbox', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_ipfs_outbox_status'), ['status'], unique=False)
+
+    if 'trust_score' not in existing:
+        op.create_table('trust_score',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('score', sa.Float(), nullable=True),
+        sa.Column('feedback', sa.Text(), nullable=True),
+        sa.Column('transaction_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['transaction_id'], ['transaction.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+
+
+def downgrade():
+    op.drop_table('trust_score')
+    with op.batch_alter_table('ipfs_outbox', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_ipfs_outbox_status'))
+
+    op.drop_table('ipfs_outbox')
+    op.drop_table('transaction')
+    op.drop_table('skill')
+    op.drop_table('user')
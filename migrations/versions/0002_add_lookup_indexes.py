@@ -0,0 +1,51 @@
+"""add lookup indexes
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 03:07:37.001955
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # if_not_exists: db.create_all() already builds these on fresh databases
+    with op.batch_alter_table('ipfs_outbox', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_ipfs_outbox_claim_token'), ['claim_token'], unique=False, if_not_exists=True)
+
+    with op.batch_alter_table('skill', schema=None) as batch_op:
+        batch_op.create_index('ix_skill_offered_name', ['is_offered', 'skill_name', 'user_id'], unique=False, if_not_exists=True)
+        batch_op.create_index('ix_skill_user_offered', ['user_id', 'is_offered'], unique=False, if_not_exists=True)
+
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_transaction_ipfs_hash'), ['ipfs_hash'], unique=False, if_not_exists=True)
+        batch_op.create_index('ix_transaction_offerer_date', ['offerer_id', 'transaction_date'], unique=False, if_not_exists=True)
+        batch_op.create_index('ix_transaction_requester_date', ['requester_id', 'transaction_date'], unique=False, if_not_exists=True)
+
+    with op.batch_alter_table('trust_score', schema=None) as batch_op:
+        batch_op.create_index('ix_trust_score_transaction_user', ['transaction_id', 'user_id'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    with op.batch_alter_table('trust_score', schema=None) as batch_op:
+        batch_op.drop_index('ix_trust_score_transaction_user')
+
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.drop_index('ix_transaction_requester_date')
+        batch_op.drop_index('ix_transaction_offerer_date')
+        batch_op.drop_index(batch_op.f('ix_transaction_ipfs_hash'))
+
+    with op.batch_alter_table('skill', schema=None) as batch_op:
+        batch_op.drop_index('ix_skill_user_offered')
+        batch_op.drop_index('ix_skill_offered_name')
+
+    with op.batch_alter_table('ipfs_outbox', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_ipfs_outbox_claim_token'))
@@ -0,0 +1,62 @@
+"""add dashboard statistics tables
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 03:11:14.058666
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases created by db.create_all() may already have these tables
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'skill_stat' not in existing:
+        op.create_table('skill_stat',
+        sa.Column('skill_name', sa.String(length=100), nullable=False),
+        sa.Column('offered_count', sa.Integer(), nullable=True),
+        sa.Column('requested_count', sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint('skill_name')
+        )
+        with op.batch_alter_table('skill_stat', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_skill_stat_offered_count'), ['offered_count'], unique=False)
+            batch_op.create_index(batch_op.f('ix_skill_stat_requested_count'), ['requested_count'], unique=False)
+
+    if 'stat_counter' not in existing:
+        op.create_table('stat_counter',
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('value', sa.Integer(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('name')
+        )
+    if 'user_activity_stat' not in existing:
+        op.create_table('user_activity_stat',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('transaction_count', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('user_id')
+        )
+        with op.batch_alter_table('user_activity_stat', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_user_activity_stat_transaction_count'), ['transaction_count'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('user_activity_stat', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_user_activity_stat_transaction_count'))
+
+    op.drop_table('user_activity_stat')
+    op.drop_table('stat_counter')
+    with op.batch_alter_table('skill_stat', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_skill_stat_requested_count'))
+        batch_op.drop_index(batch_op.f('ix_skill_stat_offered_count'))
+
+    op.drop_table('skill_stat')
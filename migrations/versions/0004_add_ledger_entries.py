@@ -0,0 +1,44 @@
+"""add ledger entries
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 03:13:31.383171
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases created by db.create_all() may already have these tables
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'ledger_entry' not in existing:
+        op.create_table('ledger_entry',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('transaction_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('amount', sa.Float(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['transaction_id'], ['transaction.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        with op.batch_alter_table('ledger_entry', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_ledger_entry_transaction_id'), ['transaction_id'], unique=False)
+            batch_op.create_index('ix_ledger_entry_user', ['user_id', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('ledger_entry', schema=None) as batch_op:
+        batch_op.drop_index('ix_ledger_entry_user')
+        batch_op.drop_index(batch_op.f('ix_ledger_entry_transaction_id'))
+
+    op.drop_table('ledger_entry')
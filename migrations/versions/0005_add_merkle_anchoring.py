@@ -0,0 +1,51 @@
+"""add merkle anchoring
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 03:19:26.944060
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases created by db.create_all() may already have these
+    inspector = sa.inspect(op.get_bind())
+    existing = set(inspector.get_table_names())
+
+    if 'anchor_batch' not in existing:
+        op.create_table('anchor_batch',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('root_hash', sa.String(length=64), nullable=False),
+        sa.Column('root_cid', sa.String(length=100), nullable=False),
+        sa.Column('leaf_count', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('root_cid')
+        )
+
+    columns = {column['name'] for column in inspector.get_columns('transaction')}
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        if 'anchor_cid' not in columns:
+            batch_op.add_column(sa.Column('anchor_cid', sa.String(length=100), nullable=True))
+            batch_op.add_column(sa.Column('anchor_leaf_index', sa.Integer(), nullable=True))
+            batch_op.add_column(sa.Column('anchor_proof', sa.Text(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_transaction_anchor_cid'), ['anchor_cid'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_transaction_anchor_cid'))
+        batch_op.drop_column('anchor_proof')
+        batch_op.drop_column('anchor_leaf_index')
+        batch_op.drop_column('anchor_cid')
+
+    op.drop_table('anchor_batch')
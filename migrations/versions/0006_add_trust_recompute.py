@@ -0,0 +1,50 @@
+"""add trust recompute
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 03:42:42.656647
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases created by db.create_all() may already have these
+    inspector = sa.inspect(op.get_bind())
+    existing = set(inspector.get_table_names())
+
+    if 'trust_checkpoint' not in existing:
+        op.create_table('trust_checkpoint',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('mode', sa.String(length=20), nullable=False),
+        sa.Column('last_rating_id', sa.Integer(), nullable=False),
+        sa.Column('last_transaction_id', sa.Integer(), nullable=False),
+        sa.Column('users_checked', sa.Integer(), nullable=True),
+        sa.Column('users_diverged', sa.Integer(), nullable=True),
+        sa.Column('users_updated', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+
+    columns = {column['name'] for column in inspector.get_columns('trust_score')}
+    with op.batch_alter_table('trust_score', schema=None) as batch_op:
+        # Existing ratings keep a null created_at; the recompute orders them by their transaction's date
+        if 'created_at' not in columns:
+            batch_op.add_column(sa.Column('created_at', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_trust_score_user', ['user_id', 'id'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    with op.batch_alter_table('trust_score', schema=None) as batch_op:
+        batch_op.drop_index('ix_trust_score_user')
+        batch_op.drop_column('created_at')
+
+    op.drop_table('trust_checkpoint')
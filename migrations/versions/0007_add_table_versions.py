@@ -0,0 +1,31 @@
+"""add table versions
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 04:21:09.318274
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases created by db.create_all() may already have this
+    inspector = sa.inspect(op.get_bind())
+    if 'table_version' not in inspector.get_table_names():
+        op.create_table('table_version',
+        sa.Column('table_name', sa.String(length=50), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('table_name')
+        )
+
+
+def downgrade():
+    op.drop_table('table_version')
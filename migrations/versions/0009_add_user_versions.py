@@ -0,0 +1,31 @@
+"""add user versions
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 08:03:51.227460
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases created by db.create_all() may already have this
+    inspector = sa.inspect(op.get_bind())
+    if 'user_version' not in inspector.get_table_names():
+        op.create_table('user_version',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('user_id')
+        )
+
+
+def downgrade():
+    op.drop_table('user_version')
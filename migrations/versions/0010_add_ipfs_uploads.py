@@ -0,0 +1,52 @@
+"""add ipfs uploads
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18 09:12:40.518302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases created by db.create_all() may already have this
+    inspector = sa.inspect(op.get_bind())
+    if 'ipfs_upload' not in inspector.get_table_names():
+        op.create_table('ipfs_upload',
+        sa.Column('id', sa.String(length=32), nullable=False),
+        sa.Column('filename', sa.String(length=255), nullable=False),
+        sa.Column('cid', sa.String(length=100), nullable=False),
+        sa.Column('active_cid', sa.String(length=100), nullable=True),
+        sa.Column('size', sa.BigInteger(), nullable=False),
+        sa.Column('bytes_sent', sa.BigInteger(), nullable=False),
+        sa.Column('state', sa.String(length=20), nullable=False),
+        sa.Column('deduplicated', sa.Boolean(), nullable=False),
+        sa.Column('pin_result', sa.Text(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('active_cid')
+        )
+        with op.batch_alter_table('ipfs_upload', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_ipfs_upload_cid'), ['cid'], unique=False)
+            batch_op.create_index(batch_op.f('ix_ipfs_upload_finished_at'), ['finished_at'], unique=False)
+            batch_op.create_index(batch_op.f('ix_ipfs_upload_state'), ['state'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('ipfs_upload', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_ipfs_upload_state'))
+        batch_op.drop_index(batch_op.f('ix_ipfs_upload_finished_at'))
+        batch_op.drop_index(batch_op.f('ix_ipfs_upload_cid'))
+
+    op.drop_table('ipfs_upload')
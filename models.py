@@ -1,6 +1,15 @@
+import datetime
+
 from flask_sqlalchemy import SQLAlchemy
 
-db = SQLAlchemy()
+from database import RoutingSession
+
+# Sessions read from the read-only engine inside @read_only views
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+def utcnow():
+    """Naive UTC like CURRENT_TIMESTAMP, but with microseconds so same-second events keep their order"""
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
 
 class User(db.Model):
     __tablename__ = 'user'
@@ -18,6 +27,12 @@ class User(db.Model):
 
 class Skill(db.Model):
     __tablename__ = 'skill'
+    __table_args__ = (
+        # Match, recommendation and dashboard lookups by name for one side of the market
+        db.Index('ix_skill_offered_name', 'is_offered', 'skill_name', 'user_id'),
+        # Per-user skill lists and counts
+        db.Index('ix_skill_user_offered', 'user_id', 'is_offered'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     skill_name = db.Column(db.String(100), nullable=False)
@@ -28,21 +43,152 @@ class Skill(db.Model):
 
 class Transaction(db.Model):
     __tablename__ = 'transaction'
+    __table_args__ = (
+        # Per-user history and counts, newest first
+        db.Index('ix_transaction_offerer_date', 'offerer_id', 'transaction_date'),
+        db.Index('ix_transaction_requester_date', 'requester_id', 'transaction_date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     offerer_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     requester_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     skill_id = db.Column(db.Integer, db.ForeignKey('skill.id'), nullable=False)
     amount_paid = db.Column(db.Float)
-    transaction_date = db.Column(db.DateTime, default=db.func.current_timestamp())
+    transaction_date = db.Column(db.DateTime, default=utcnow)
     status = db.Column(db.String(20), default='completed')  # pending, completed, cancelled
-    ipfs_hash = db.Column(db.String(100), nullable=True)  # Store IPFS hash here
+    ipfs_hash = db.Column(db.String(100), nullable=True, index=True)  # Store IPFS hash here
+    
+    # Set instead of ipfs_hash when the transaction is anchored in a Merkle batch
+    anchor_cid = db.Column(db.String(100), nullable=True, index=True)  # CID of the batch root document
+    anchor_leaf_index = db.Column(db.Integer, nullable=True)
+    anchor_proof = db.Column(db.Text, nullable=True)  # JSON list of [side, sibling hash] up to the root
 
 class TrustScore(db.Model):
     __tablename__ = 'trust_score'
+    __table_args__ = (
+        # One rating per party per transaction is checked on every rating
+        db.Index('ix_trust_score_transaction_user', 'transaction_id', 'user_id'),
+        # A user's rating history, replayed by the trust recompute
+        db.Index('ix_trust_score_user', 'user_id', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     score = db.Column(db.Float, default=5.0)
     feedback = db.Column(db.Text, nullable=True)
     transaction_id = db.Column(db.Integer, db.ForeignKey('transaction.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=utcnow)  # Null for ratings made before it existed
+
+class IPFSOutbox(db.Model):
+    __tablename__ = 'ipfs_outbox'
+
+    id = db.Column(db.Integer, primary_key=True)
+    transaction_id = db.Column(db.Integer, db.ForeignKey('transaction.id'), unique=True, nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON document to publish
+    status = db.Column(db.String(20), default='pending', index=True)  # pending, publishing, published, failed
+    attempts = db.Column(db.Integer, default=0)
+    claim_token = db.Column(db.String(36), nullable=True, index=True)  # Set while a publisher owns the entry
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    published_at = db.Column(db.DateTime, nullable=True)
+
+class StatCounter(db.Model):
+    __tablename__ = 'stat_counter'
+
+    name = db.Column(db.String(50), primary_key=True)  # users, skills, transactions, last_rebuild
+    value = db.Column(db.Integer, default=0)
+    updated_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+
+class SkillStat(db.Model):
+    __tablename__ = 'skill_stat'
+
+    skill_name = db.Column(db.String(100), primary_key=True)
+    offered_count = db.Column(db.Integer, default=0, index=True)
+    requested_count = db.Column(db.Integer, default=0, index=True)
+
+class UserActivityStat(db.Model):
+    __tablename__ = 'user_activity_stat'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    transaction_count = db.Column(db.Integer, default=0, index=True)  # As offerer or requester
+
+class LedgerEntry(db.Model):
+    __tablename__ = 'ledger_entry'
+    __table_args__ = (
+        # A user's statement, oldest first
+        db.Index('ix_ledger_entry_user', 'user_id', 'id'),
+    )
+
+    # Append-only: one debit and one credit row per transfer, never updated
+    id = db.Column(db.Integer, primary_key=True)
+    transaction_id = db.Column(db.Integer, db.ForeignKey('transaction.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    amount = db.Column(db.Float, nullable=False)  # Negative for debits
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+
+class AnchorBatch(db.Model):
+    __tablename__ = 'anchor_batch'
+
+    # One Merkle root published to IPFS for a window of transactions
+    id = db.Column(db.Integer, primary_key=True)
+    root_hash = db.Column(db.String(64), nullable=False)
+    root_cid = db.Column(db.String(100), unique=True, nullable=False)
+    leaf_count = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+
+class TrustCheckpoint(db.Model):
+    __tablename__ = 'trust_checkpoint'
+
+    # One row per trust recompute run; incremental runs start after the latest one
+    id = db.Column(db.Integer, primary_key=True)
+    mode = db.Column(db.String(20), nullable=False)  # full, incremental
+    last_rating_id = db.Column(db.Integer, nullable=False)  # Highest TrustScore.id replayed
+    last_transaction_id = db.Column(db.Integer, nullable=False)  # Highest Transaction.id replayed
+    users_checked = db.Column(db.Integer, default=0)
+    users_diverged = db.Column(db.Integer, default=0)
+    users_updated = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+
+class TableVersion(db.Model):
+    __tablename__ = 'table_version'
+
+    # Bumped in the same transaction as writes to a tracked table that no single user's rows account for
+    table_name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class UserVersion(db.Model):
+    __tablename__ = 'user_version'
+
+    # Bumped in the same transaction as every write that changes what the user endpoints show for one user
+    user_id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class IdempotencyKey(db.Model):
+    __tablename__ = 'idempotency_key'
+
+    # Committed with the writes of the request that sent the key, then holds that request's response
+    key = db.Column(db.String(255), primary_key=True)
+    request_hash = db.Column(db.String(64), nullable=False)  # SHA-256 of method, path and body
+    status_code = db.Column(db.Integer, nullable=True)  # Null until the response is stored
+    response_body = db.Column(db.LargeBinary, nullable=True)
+    mimetype = db.Column(db.String(100), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=utcnow, index=True)  # Keys expire by age
+
+class IPFSUpload(db.Model):
+    __tablename__ = 'ipfs_upload'
+
+    # Status of a background file upload, readable from any worker; the file itself stays with the worker uploading it
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex, the id in /ipfs/uploads/<id>
+    filename = db.Column(db.String(255), nullable=False, default='')
+    cid = db.Column(db.String(100), nullable=False, index=True)
+    active_cid = db.Column(db.String(100), nullable=True, unique=True)  # The CID while queued or running: one upload per content
+    size = db.Column(db.BigInteger, nullable=False)
+    bytes_sent = db.Column(db.BigInteger, nullable=False, default=0)
+    state = db.Column(db.String(20), nullable=False, default='queued', index=True)  # queued, uploading, pinning, done, failed
+    deduplicated = db.Column(db.Boolean, nullable=False, default=False)
+    pin_result = db.Column(db.Text, nullable=True)  # JSON response of the pin request
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=utcnow)  # Last progress; a stale active upload was abandoned
+    finished_at = db.Column(db.DateTime, nullable=True, index=True)  # Finished statuses expire by age
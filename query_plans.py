@@ -0,0 +1,103 @@
+"""EXPLAIN QUERY PLAN checks for the queries issued by app.py.
+
+Each pattern mirrors a query made by one of the routes. A pattern fails
+when SQLite plans a full table scan for it, unless the pattern is marked
+as an intentional scan (whole-table aggregates, for example).
+"""
+import re
+
+from models import db, User, Skill, Transaction, TrustScore, IPFSOutbox, SkillStat, UserActivityStat, AnchorBatch
+import search_index
+import fraud
+import transaction_history
+
+# SCAN walks a whole table (or a whole index); SEARCH and FTS lookups do not
+_FULL_SCAN = re.compile(r'^SCAN (\w+)\b(?! VIRTUAL TABLE)')
+
+
+def query_patterns():
+    """(name, statement, reason a scan is acceptable or None)"""
+    select = db.select
+    return [
+        ('register: email uniqueness check',
+         select(User).filter_by(email='alice@example.com'), None),
+        ('users: keyset page',
+         select(User).where(User.id > 0).order_by(User.id).limit(100), None),
+        ('users: batched skills for a page',
+         select(Skill).where(Skill.user_id.in_([1, 2, 3])), None),
+        ('ipfs/user: skills of a user',
+         select(Skill).filter_by(user_id=1), None),
+        ('match_skills: offerers of a skill',
+         select(Skill).filter_by(skill_name='Python Programming', is_offered=True), None),
+        ('search_skills: trigram index lookup',
+         search_index._SEARCH_SQL.bindparams(query='"design"', is_offered=True, limit=50), None),
+        ('search_skills: trust-ordered listing',
+         select(Skill.id, User.id).join(User, User.id == Skill.user_id)
+         .filter(Skill.is_offered == True).order_by(User.trust_score.desc()).limit(50), None),
+        ('verify: transaction by IPFS hash',
+         select(Transaction).filter_by(ipfs_hash='QmT78zSuBmuS4z925WZfrqQ1qHaJ56DQaTfyMUF7F8ff5o'), None),
+        ('verify: anchor batch by root CID',
+         select(AnchorBatch).filter_by(root_cid='QmT78zSuBmuS4z925WZfrqQ1qHaJ56DQaTfyMUF7F8ff5o'), None),
+        ('user profile: skills by side',
+         select(Skill).filter_by(user_id=1, is_offered=True), None),
+        ('user profile: first history page',
+         transaction_history.history_statement(1, limit=51), None),
+        ('user transactions: history page after a cursor',
+         transaction_history.history_statement(1, ('2024-01-01 00:00:00.000000', 10), 51), None),
+        ('skill: offered skill count',
+         select(db.func.count()).select_from(Skill).filter_by(user_id=1, is_offered=True), None),
+        ('check_fraud: grouped activity page',
+         fraud.user_activity_statement(0, 1000), None),
+        ('rate_transaction: existing rating',
+         select(TrustScore).filter_by(transaction_id=1, user_id=1), None),
+        ('recommendations: requested skills',
+         select(Skill).filter_by(user_id=1, is_offered=False), None),
+        ('dashboard: popular skills',
+         select(SkillStat.skill_name, SkillStat.offered_count).where(SkillStat.offered_count > 0)
+         .order_by(SkillStat.offered_count.desc(), SkillStat.skill_name).limit(5), None),
+        ('dashboard: most active users',
+         select(User.id, User.name, UserActivityStat.transaction_count)
+         .join(User, User.id == UserActivityStat.user_id).where(UserActivityStat.transaction_count > 0)
+         .order_by(UserActivityStat.transaction_count.desc(), UserActivityStat.user_id).limit(5), None),
+        ('stats rebuild: per-skill tallies',
+         select(Skill.skill_name, db.func.count()).group_by(Skill.skill_name),
+         'periodic full rebuild of the dashboard statistics'),
+        ('outbox: transaction entry',
+         select(IPFSOutbox).filter_by(transaction_id=1), None),
+        ('outbox: claimed batch',
+         select(IPFSOutbox).filter_by(claim_token='token'), None),
+    ]
+
+
+def explain(statement):
+    """Return the EXPLAIN QUERY PLAN detail lines for a statement"""
+    compiled = statement.compile(dialect=db.engine.dialect, compile_kwargs={'render_postcompile': True})
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    with db.engine.connect() as conn:
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params).all()
+    return [row[-1] for row in rows]
+
+
+def _is_full_scan(line):
+    # Only base tables count; scanning a materialised CTE or subquery is bounded
+    match = _FULL_SCAN.match(line)
+    return bool(match) and match.group(1) in db.metadata.tables
+
+
+def check_query_plans():
+    """Explain every pattern; returns (results, number of failures)"""
+    results = []
+    failures = 0
+    for name, statement, allowed_scan in query_patterns():
+        plan = explain(statement)
+        scans = [line for line in plan if _is_full_scan(line)]
+        failed = bool(scans) and allowed_scan is None
+        failures += failed
+        results.append({
+            'name': name,
+            'plan': plan,
+            'full_scans': scans,
+            'allowed_scan': allowed_scan,
+            'ok': not failed
+        })
+    return results, failures
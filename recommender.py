@@ -0,0 +1,204 @@
+import threading
+import time
+
+import numpy as np
+from scipy import sparse
+
+from models import db, User, Skill
+
+
+class RecommendationModel:
+    """Immutable arrays built from every offered skill.
+
+    Skill names and users are numbered densely. The offerers of skill s are
+    offerer_users[offerer_ptr[s]:offerer_ptr[s + 1]], highest trust first,
+    with the matching availability in offerer_availability. related[s]
+    holds up to k skills most often offered by the same users as s, best
+    first, padded with -1, and related_counts the number of shared users.
+    """
+
+    def __init__(self, skill_names, user_ids, user_names, user_trust, offerer_ptr, offerer_users,
+                 offerer_availability, related, related_counts):
+        self.skill_names = skill_names
+        self.skill_index = {name: index for index, name in enumerate(skill_names)}
+        self.user_ids = user_ids
+        self.user_index = {int(user_id): index for index, user_id in enumerate(user_ids)}
+        self.user_names = user_names
+        self.user_trust = user_trust
+        self.offerer_ptr = offerer_ptr
+        self.offerer_users = offerer_users
+        self.offerer_availability = offerer_availability
+        self.related = related
+        self.related_counts = related_counts
+
+    @classmethod
+    def build(cls, rows, related_k):
+        """Model from (skill_name, availability, user_id, user_name, trust_score) rows"""
+        if not rows:
+            empty = np.zeros(0, dtype=np.int64)
+            return cls([], empty, [], np.zeros(0), np.zeros(1, dtype=np.int64), empty, [],
+                       np.zeros((0, related_k), dtype=np.int64), np.zeros((0, related_k)))
+
+        skill_names, availability, user_ids, user_names, trust = zip(*rows)
+        names, skill_of_entry = np.unique(np.array(skill_names, dtype=object), return_inverse=True)
+        ids, first_entry, user_of_entry = np.unique(np.array(user_ids, dtype=np.int64), return_index=True,
+                                                    return_inverse=True)
+        user_trust = np.array([trust[entry] or 0.0 for entry in first_entry], dtype=np.float64)
+
+        # Offerers grouped by skill, highest trust first, then lowest user id
+        order = np.lexsort((ids[user_of_entry], -user_trust[user_of_entry], skill_of_entry))
+        offerer_ptr = np.zeros(len(names) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(skill_of_entry, minlength=len(names)), out=offerer_ptr[1:])
+
+        # Skill-by-user incidence; a user offering a skill twice still counts once
+        incidence = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float64), (skill_of_entry, user_of_entry)), shape=(len(names), len(ids))
+        )
+        incidence.data[:] = 1.0
+        co_occurrence = (incidence @ incidence.T).tocoo()
+        off_diagonal = co_occurrence.row != co_occurrence.col
+        related, related_counts = cls._top_k(
+            co_occurrence.row[off_diagonal], co_occurrence.col[off_diagonal], co_occurrence.data[off_diagonal],
+            len(names), related_k
+        )
+
+        return cls(list(names), ids, [user_names[entry] for entry in first_entry], user_trust, offerer_ptr,
+                   user_of_entry[order], [availability[entry] for entry in order], related, related_counts)
+
+    @staticmethod
+    def _top_k(rows, columns, counts, size, k):
+        # Sort each row's entries by count, best first, and keep the first k
+        order = np.lexsort((columns, -counts, rows))
+        rows, columns, counts = rows[order], columns[order], counts[order]
+        row_start = np.searchsorted(rows, np.arange(size))
+        rank = np.arange(len(rows)) - row_start[rows]
+        keep = rank < k
+
+        related = np.full((size, k), -1, dtype=np.int64)
+        related_counts = np.zeros((size, k), dtype=np.float64)
+        related[rows[keep], rank[keep]] = columns[keep]
+        related_counts[rows[keep], rank[keep]] = counts[keep]
+        return related, related_counts
+
+    def offerers(self, skill):
+        """User indices of a skill's offerers, highest trust first"""
+        return self.offerer_users[self.offerer_ptr[skill]:self.offerer_ptr[skill + 1]]
+
+    def recommend(self, user_id, requested_names, limit=5):
+        requested = np.array(sorted({self.skill_index[name] for name in requested_names if name in self.skill_index}),
+                             dtype=np.int64)
+        if not len(requested):
+            return [], []
+        own = self.user_index.get(user_id, -1)
+
+        # Best offerers of each requested skill, merged by trust; each user once.
+        # limit + 1 per skill leaves limit after dropping the user themselves.
+        positions = self.offerer_ptr[requested][:, None] + np.arange(limit + 1)
+        present = positions < self.offerer_ptr[requested + 1][:, None]
+        skills = np.broadcast_to(requested[:, None], positions.shape)[present]
+        positions = positions[present]
+        users = self.offerer_users[positions]
+        not_own = users != own
+        skills, positions, users = skills[not_own], positions[not_own], users[not_own]
+        order = np.lexsort((self.user_ids[users], -self.user_trust[users]))
+        candidates = zip(skills[order], users[order], positions[order])
+        user_matches = []
+        for skill, user, position in candidates:
+            if len(user_matches) >= limit:
+                break
+            if user_matches and user_matches[-1]['user_id'] == self.user_ids[user]:
+                continue  # Same user through another requested skill; equal keys sort together
+            user_matches.append({
+                'user_id': int(self.user_ids[user]),
+                'name': self.user_names[user],
+                'skill': self.skill_names[skill],
+                'trust_score': float(self.user_trust[user]),
+                'availability': self.offerer_availability[position]
+            })
+
+        # Skills related to any requested skill, scored by shared offerers
+        related = self.related[requested].ravel()
+        counts = self.related_counts[requested].ravel()
+        usable = (related >= 0) & ~np.isin(related, requested)
+        skills, inverse = np.unique(related[usable], return_inverse=True)
+        scores = np.bincount(inverse, weights=counts[usable], minlength=len(skills))
+        best = skills[np.lexsort((skills, -scores))]
+
+        # Credit each one to its most trusted offerer who also offers a requested skill
+        relevant = np.zeros(len(self.user_ids), dtype=bool)
+        for skill in requested:
+            relevant[self.offerers(skill)] = True
+        if own >= 0:
+            relevant[own] = False
+
+        skill_recommendations = []
+        for skill in best:
+            users = self.offerers(skill)
+            users = users[relevant[users]]
+            if not len(users):
+                continue
+            user = users[0]
+            skill_recommendations.append({
+                'skill_name': self.skill_names[skill],
+                'offered_by': self.user_names[user],
+                'user_id': int(self.user_ids[user]),
+                'trust_score': float(self.user_trust[user])
+            })
+            if len(skill_recommendations) >= limit:
+                break
+        return skill_recommendations, user_matches
+
+
+class SkillRecommender:
+    """Co-occurrence recommendations served from a periodically rebuilt model.
+
+    The first lookup builds the model; after max_age seconds the next
+    lookup starts a rebuild on a daemon thread and keeps answering from the
+    old model until the new one is swapped in.
+    """
+
+    def __init__(self, app, max_age=300, related_k=20):
+        self.app = app
+        self.max_age = max_age
+        self.related_k = related_k
+        self._model = None
+        self._built_at = None
+        self._refresh_lock = threading.Lock()
+
+    def refresh(self):
+        """Rebuild the model from the database in one query"""
+        with self._refresh_lock:
+            rows = db.session.query(
+                Skill.skill_name, Skill.availability, User.id, User.name, User.trust_score
+            ).join(User, User.id == Skill.user_id).filter(Skill.is_offered == True).all()
+            model = RecommendationModel.build(rows, self.related_k)
+            self._model, self._built_at = model, time.monotonic()
+            return model
+
+    def refresh_in_background(self):
+        """Start a rebuild on a daemon thread unless one is already running"""
+        if self._refresh_lock.locked():
+            return
+
+        def run():
+            with self.app.app_context():
+                try:
+                    self.refresh()
+                except Exception:
+                    self.app.logger.exception('Recommendation model rebuild failed')
+                finally:
+                    db.session.remove()
+
+        threading.Thread(target=run, name='recommender-refresh', daemon=True).start()
+
+    def model(self):
+        model = self._model
+        if model is None:
+            return self.refresh()
+        if time.monotonic() - self._built_at > self.max_age:
+            self.refresh_in_background()
+        return model
+
+    def recommend(self, user_id, requested_names, limit=5):
+        """(skill recommendations, user matches) for a user's requested skills"""
+        return self.model().recommend(user_id, requested_names, limit)
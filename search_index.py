@@ -0,0 +1,135 @@
+from contextlib import contextmanager
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from models import db, User, Skill
+
+# The trigram tokenizer can only match terms of at least three characters
+MIN_TRIGRAM_LENGTH = 3
+
+_INSERT_TRIGGER = """CREATE TRIGGER IF NOT EXISTS skill_fts_insert AFTER INSERT ON skill BEGIN
+        INSERT INTO skill_fts(rowid, skill_name) VALUES (new.id, new.skill_name);
+    END"""
+
+_SCHEMA = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS skill_fts USING fts5(
+        skill_name, content='skill', content_rowid='id', tokenize='trigram'
+    )""",
+    # Keep the index in sync with every insert, update and delete on skill
+    _INSERT_TRIGGER,
+    """CREATE TRIGGER IF NOT EXISTS skill_fts_delete AFTER DELETE ON skill BEGIN
+        INSERT INTO skill_fts(skill_fts, rowid, skill_name) VALUES ('delete', old.id, old.skill_name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS skill_fts_update AFTER UPDATE OF skill_name ON skill BEGIN
+        INSERT INTO skill_fts(skill_fts, rowid, skill_name) VALUES ('delete', old.id, old.skill_name);
+        INSERT INTO skill_fts(rowid, skill_name) VALUES (new.id, new.skill_name);
+    END""",
+]
+
+_SEARCH_SQL = text("""
+    SELECT skill.id, skill.skill_name, skill.availability,
+           "user".id AS user_id, "user".name AS user_name, "user".trust_score
+    FROM skill_fts
+    JOIN skill ON skill.id = skill_fts.rowid
+    JOIN "user" ON "user".id = skill.user_id
+    WHERE skill_fts MATCH :query AND skill.is_offered = :is_offered
+    ORDER BY skill_fts.rank, "user".trust_score DESC
+    LIMIT :limit
+""")
+
+# Engine URL -> whether the FTS index is usable there
+_available = {}
+
+
+def init_search_index(engine):
+    """Create the trigram index and its triggers; returns False where FTS5 is unavailable"""
+    if engine.dialect.name != 'sqlite':
+        _available[str(engine.url)] = False
+        return False
+
+    try:
+        with engine.begin() as conn:
+            existed = conn.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'skill_fts'"
+            )).first()
+            for statement in _SCHEMA:
+                conn.execute(text(statement))
+            if not existed:
+                # Index the rows that were there before the index
+                conn.execute(text("INSERT INTO skill_fts(skill_fts) VALUES ('rebuild')"))
+    except OperationalError:
+        _available[str(engine.url)] = False
+        return False
+
+    _available[str(engine.url)] = True
+    return True
+
+
+def search_index_available(engine):
+    key = str(engine.url)
+    if key not in _available:
+        init_search_index(engine)
+    return _available[key]
+
+
+@contextmanager
+def deferred_insert_indexing():
+    """Index the skills inserted inside the block with one INSERT ... SELECT.
+
+    Firing the insert trigger once per row is several times slower than
+    indexing a bulk insert in one statement. The trigger is dropped and
+    recreated inside a savepoint of the caller's transaction, which must
+    already have written: pysqlite only opens a transaction before DML, and
+    a DROP TRIGGER outside one would take effect for every connection at
+    once. SQLite lets only one connection write at a time, so no other
+    insert can slip past the missing trigger, and the trigger is back
+    whether the block succeeds or fails.
+    """
+    if not search_index_available(db.engine):
+        yield
+        return
+
+    if not db.session.connection().connection.dbapi_connection.in_transaction:
+        raise RuntimeError('deferred_insert_indexing needs a transaction that has already written')
+
+    with db.session.begin_nested():
+        db.session.execute(text("DROP TRIGGER IF EXISTS skill_fts_insert"))
+        last_id = db.session.execute(text("SELECT coalesce(max(id), 0) FROM skill")).scalar()
+        try:
+            yield
+            db.session.execute(text(
+                "INSERT INTO skill_fts(rowid, skill_name) SELECT id, skill_name FROM skill WHERE id > :last_id"
+            ), {'last_id': last_id})
+        finally:
+            db.session.execute(text(_INSERT_TRIGGER))
+
+
+def _fts_query(term):
+    # Quote the term so FTS5 treats it as one phrase rather than query syntax
+    return '"' + term.replace('"', '""') + '"'
+
+
+def search_skills(term, is_offered, limit):
+    """Top skills matching a substring, with the owning user joined in.
+
+    Full matches are ranked by relevance; without a term (or with one too
+    short for trigrams) the most trusted users come first.
+    """
+    if term and len(term) >= MIN_TRIGRAM_LENGTH and search_index_available(db.engine):
+        rows = db.session.execute(_SEARCH_SQL, {
+            'query': _fts_query(term),
+            'is_offered': is_offered,
+            'limit': limit
+        })
+        return [row._asdict() for row in rows]
+
+    query = db.session.query(
+        Skill.id, Skill.skill_name, Skill.availability,
+        User.id.label('user_id'), User.name.label('user_name'), User.trust_score
+    ).join(User, User.id == Skill.user_id).filter(Skill.is_offered == is_offered)
+
+    if term:
+        query = query.filter(Skill.skill_name.like(f'%{term}%'))
+
+    return [row._asdict() for row in query.order_by(User.trust_score.desc()).limit(limit)]
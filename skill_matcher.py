@@ -0,0 +1,210 @@
+import bisect
+import threading
+import time
+import uuid
+
+from models import db, User, Skill
+
+
+class SkillMatchIndex:
+    """Process-local index of offered skills, kept sorted by trust score.
+
+    Each skill name maps to a sorted list of (-trust_score, user_id,
+    skill_id) keys, so the best k offerers of a skill are the first k
+    entries. Routes update the index after they commit; a full rebuild
+    every max_age seconds picks up changes made by other workers.
+
+    The first lookup waits for one build. Later rebuilds run one at a
+    time on a daemon thread while the old index keeps serving; updates
+    made while a rebuild reads the database are replayed onto its result
+    before it is swapped in, so they are not lost.
+    """
+
+    def __init__(self, app, max_age=60):
+        self.app = app
+        self.max_age = max_age
+        self._lock = threading.RLock()
+        self._rebuild_lock = threading.Lock()  # One rebuild at a time
+        self._built_at = None
+        self._stale = False
+        self._rebuilding = False
+        self._journal = None  # Updates made during a rebuild, as (method name, args)
+        self._instance = uuid.uuid4().hex  # Tells this index's generations from other processes'
+        self._generation = 0  # Bumped on every change, for response ETags
+        self._reset()
+
+    def _reset(self):
+        self._by_skill = {}  # skill_name -> sorted [(-trust, user_id, skill_id)]
+        self._skills = {}  # skill_id -> (skill_name, user_id, availability)
+        self._users = {}  # user_id -> [name, trust_score, set of offered skill ids]
+
+    def warm(self):
+        """Rebuild the index from the database in one query"""
+        with self._rebuild_lock:
+            self._rebuild()
+
+    def _rebuild(self):
+        with self._lock:
+            self._journal = []
+        try:
+            rows = db.session.query(
+                Skill.id, Skill.skill_name, Skill.availability,
+                User.id, User.name, User.trust_score
+            ).join(User, User.id == Skill.user_id).filter(Skill.is_offered == True).all()
+
+            # Build off to the side so lookups keep being served meanwhile
+            built = SkillMatchIndex(self.app, self.max_age)
+            for skill_id, skill_name, availability, user_id, user_name, trust_score in rows:
+                built._insert(skill_id, skill_name, availability, user_id, user_name, trust_score, sort=False)
+            for entries in built._by_skill.values():
+                entries.sort()
+
+            with self._lock:
+                # Updates are absolute (put, remove, set trust), so replaying one the query already saw is harmless
+                for operation, args in self._journal:
+                    getattr(built, operation)(*args)
+                self._by_skill, self._skills, self._users = built._by_skill, built._skills, built._users
+                self._built_at = time.monotonic()
+                self._stale = False
+                self._generation += 1
+        finally:
+            with self._lock:
+                self._journal = None
+
+    def warm_in_background(self):
+        """Start a rebuild on a daemon thread unless one is already running"""
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+
+        def run():
+            with self.app.app_context():
+                try:
+                    self.warm()
+                except Exception:
+                    self.app.logger.exception('Skill match index rebuild failed')
+                finally:
+                    db.session.remove()
+                    with self._lock:
+                        self._rebuilding = False
+
+        threading.Thread(target=run, name='skill-match-rebuild', daemon=True).start()
+
+    def invalidate(self):
+        """Rebuild soon, for bulk changes not worth applying one by one"""
+        with self._lock:
+            self._stale = True
+
+    def _ensure_fresh(self):
+        if self._built_at is None:
+            # Nothing to serve yet: concurrent first lookups wait for a single build
+            with self._rebuild_lock:
+                if self._built_at is None:
+                    self._rebuild()
+        elif self._stale or time.monotonic() - self._built_at > self.max_age:
+            self.warm_in_background()
+
+    def generation(self):
+        """Token that changes whenever lookups could return something different.
+
+        Every process (and every restart) counts from 0, so the counter is
+        paired with an id of this instance: equal tokens mean the same index
+        state, never two workers that happen to be at the same count.
+        """
+        self._ensure_fresh()
+        with self._lock:
+            return f'{self._instance}:{self._generation}'
+
+    @staticmethod
+    def _key(trust_score, user_id, skill_id):
+        return (-(trust_score or 0.0), user_id, skill_id)
+
+    def _insert(self, skill_id, skill_name, availability, user_id, user_name, trust_score, sort=True):
+        user = self._users.setdefault(user_id, [user_name, trust_score, set()])
+        user[2].add(skill_id)
+        self._skills[skill_id] = (skill_name, user_id, availability)
+
+        key = self._key(user[1], user_id, skill_id)
+        entries = self._by_skill.setdefault(skill_name, [])
+        if sort:
+            bisect.insort(entries, key)
+        else:
+            entries.append(key)
+
+    def _remove(self, skill_id):
+        skill = self._skills.pop(skill_id, None)
+        if skill is None:
+            return
+        skill_name, user_id, _ = skill
+        user = self._users[user_id]
+        user[2].discard(skill_id)
+
+        entries = self._by_skill[skill_name]
+        self._discard(entries, self._key(user[1], user_id, skill_id))
+        if not entries:
+            del self._by_skill[skill_name]
+        if not user[2]:
+            del self._users[user_id]
+
+    @staticmethod
+    def _discard(entries, key):
+        position = bisect.bisect_left(entries, key)
+        if position < len(entries) and entries[position] == key:
+            del entries[position]
+
+    def _put(self, skill_id, skill_name, availability, is_offered, user_id, user_name, trust_score):
+        self._remove(skill_id)
+        if is_offered:
+            self._insert(skill_id, skill_name, availability, user_id, user_name, trust_score)
+
+    def _set_trust(self, user_id, trust_score):
+        user = self._users.get(user_id)
+        if user is None:
+            return
+        for skill_id in user[2]:
+            entries = self._by_skill[self._skills[skill_id][0]]
+            self._discard(entries, self._key(user[1], user_id, skill_id))
+            bisect.insort(entries, self._key(trust_score, user_id, skill_id))
+        user[1] = trust_score
+
+    def _apply(self, operation, *args):
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append((operation, args))
+            if self._built_at is None:
+                return  # Not warmed yet, the first lookup loads everything
+            getattr(self, operation)(*args)
+            self._generation += 1
+
+    def put_skill(self, skill, user):
+        """Add or refresh a skill after it was created or edited"""
+        self._apply('_put', skill.id, skill.skill_name, skill.availability, skill.is_offered,
+                    user.id, user.name, user.trust_score)
+
+    def remove_skill(self, skill_id):
+        """Drop a deleted skill"""
+        self._apply('_remove', skill_id)
+
+    def update_trust(self, user_id, trust_score):
+        """Re-sort a user's skills after their trust score changed"""
+        self._apply('_set_trust', user_id, trust_score)
+
+    def match(self, skill_name, limit=None, min_trust=None):
+        """Offerers of a skill, highest trust first"""
+        self._ensure_fresh()
+        with self._lock:
+            matches = []
+            for neg_trust, user_id, skill_id in self._by_skill.get(skill_name, ()):
+                if min_trust is not None and -neg_trust < min_trust:
+                    break  # Sorted by trust, so nothing further qualifies
+                if limit is not None and len(matches) >= limit:
+                    break
+                user = self._users[user_id]
+                matches.append({
+                    'user_id': user_id,
+                    'name': user[0],
+                    'trust_score': user[1],
+                    'availability': self._skills[skill_id][2]
+                })
+            return matches
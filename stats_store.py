@@ -0,0 +1,200 @@
+import datetime
+import threading
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import db, User, Skill, Transaction, StatCounter, SkillStat, UserActivityStat
+
+TOP_N = 5
+
+_rebuild_lock = threading.Lock()
+
+
+def _upsert_add(model, keys, increments):
+    """Add to counter columns of a row, creating it on first use"""
+    table = model.__table__
+    values = dict(keys, **increments)
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        statement = insert(table).values(**values)
+        update = {column: table.c[column] + statement.excluded[column] for column in increments}
+        if 'updated_at' in table.c:
+            update['updated_at'] = db.func.current_timestamp()
+        db.session.execute(statement.on_conflict_do_update(index_elements=list(keys), set_=update))
+        return
+
+    condition = [table.c[column] == value for column, value in keys.items()]
+    result = db.session.execute(table.update().where(*condition).values(
+        {column: table.c[column] + amount for column, amount in increments.items()}
+    ))
+    if result.rowcount == 0:
+        db.session.execute(table.insert().values(**values))
+
+
+def _upsert_add_many(model, key, column, amounts):
+    """Add {key value: amount} to a counter column of many rows in one executemany, creating missing rows"""
+    if not amounts:
+        return
+    table = model.__table__
+    rows = [{key: value, column: amount} for value, amount in amounts.items()]
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        statement = insert(table)
+        update = {column: table.c[column] + statement.excluded[column]}
+        if 'updated_at' in table.c:
+            update['updated_at'] = db.func.current_timestamp()
+        db.session.execute(statement.on_conflict_do_update(index_elements=[key], set_=update), rows)
+        return
+
+    existing = set(db.session.execute(
+        db.select(table.c[key]).where(table.c[key].in_(list(amounts)))
+    ).scalars())
+    updates = [{'key_value': row[key], 'amount': row[column]} for row in rows if row[key] in existing]
+    if updates:
+        db.session.execute(
+            table.update().where(table.c[key] == db.bindparam('key_value'))
+            .values({column: table.c[column] + db.bindparam('amount')}),
+            updates
+        )
+    inserts = [row for row in rows if row[key] not in existing]
+    if inserts:
+        db.session.execute(table.insert(), inserts)
+
+
+def _count(name, amount):
+    _upsert_add(StatCounter, {'name': name}, {'value': amount})
+
+
+# Incremental updates: call these in the same database transaction as the write
+
+def record_users_created(count=1):
+    _count('users', count)
+
+
+def record_skill_added(skill_name, is_offered, count=1):
+    _count('skills', count)
+    column = 'offered_count' if is_offered else 'requested_count'
+    _upsert_add(SkillStat, {'skill_name': skill_name}, {column: count})
+
+
+def record_skill_removed(skill_name, is_offered):
+    record_skill_added(skill_name, is_offered, count=-1)
+
+
+def record_skill_changed(old_name, old_offered, new_name, new_offered):
+    if (old_name, bool(old_offered)) == (new_name, bool(new_offered)):
+        return
+    record_skill_removed(old_name, old_offered)
+    record_skill_added(new_name, new_offered)
+
+
+def record_transaction(offerer_id, requester_id, count=1):
+    _count('transactions', count)
+    for user_id in {offerer_id, requester_id}:
+        _upsert_add(UserActivityStat, {'user_id': user_id}, {'transaction_count': count})
+
+
+def record_transactions(pairs):
+    """record_transaction() for a batch of (offerer_id, requester_id) pairs"""
+    per_user = {}
+    for offerer_id, requester_id in pairs:
+        for user_id in {offerer_id, requester_id}:
+            per_user[user_id] = per_user.get(user_id, 0) + 1
+    if not per_user:
+        return
+    _count('transactions', len(pairs))
+    _upsert_add_many(UserActivityStat, 'user_id', 'transaction_count', per_user)
+
+
+def rebuild():
+    """Recompute every statistic from the source tables to correct drift"""
+    with _rebuild_lock:
+        db.session.execute(SkillStat.__table__.delete())
+        db.session.execute(SkillStat.__table__.insert().from_select(
+            ['skill_name', 'offered_count', 'requested_count'],
+            db.select(
+                Skill.skill_name,
+                db.func.sum(db.case((Skill.is_offered == True, 1), else_=0)),
+                db.func.sum(db.case((Skill.is_offered == True, 0), else_=1))
+            ).group_by(Skill.skill_name)
+        ))
+
+        # A transaction counts once per participant, even when both sides are the same user
+        participants = db.union(
+            db.select(Transaction.id, Transaction.offerer_id.label('user_id')),
+            db.select(Transaction.id, Transaction.requester_id.label('user_id'))
+        ).subquery()
+        db.session.execute(UserActivityStat.__table__.delete())
+        db.session.execute(UserActivityStat.__table__.insert().from_select(
+            ['user_id', 'transaction_count'],
+            db.select(participants.c.user_id, db.func.count()).group_by(participants.c.user_id)
+        ))
+
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        db.session.execute(StatCounter.__table__.delete())
+        db.session.execute(StatCounter.__table__.insert(), [
+            {'name': 'users', 'value': User.query.count(), 'updated_at': now},
+            {'name': 'skills', 'value': Skill.query.count(), 'updated_at': now},
+            {'name': 'transactions', 'value': Transaction.query.count(), 'updated_at': now},
+            {'name': 'last_rebuild', 'value': 0, 'updated_at': now},
+        ])
+        db.session.commit()
+
+
+def rebuild_in_background(app):
+    """Start a rebuild on a daemon thread unless one is already running"""
+    if _rebuild_lock.locked():
+        return
+
+    def run():
+        with app.app_context():
+            try:
+                rebuild()
+            except Exception:
+                db.session.rollback()
+                app.logger.exception('Dashboard statistics rebuild failed')
+
+    threading.Thread(target=run, name='stats-rebuild', daemon=True).start()
+
+
+def dashboard_stats(app, rebuild_interval):
+    """Precomputed totals and top lists, rebuilding when missing or stale"""
+    counters = {row.name: row for row in StatCounter.query.all()}
+    if 'last_rebuild' not in counters:
+        rebuild()
+        counters = {row.name: row for row in StatCounter.query.all()}
+    else:
+        age = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None) - counters['last_rebuild'].updated_at
+        if age.total_seconds() > rebuild_interval:
+            rebuild_in_background(app)
+
+    popular_skills = db.session.query(SkillStat.skill_name, SkillStat.offered_count).filter(
+        SkillStat.offered_count > 0
+    ).order_by(SkillStat.offered_count.desc(), SkillStat.skill_name).limit(TOP_N).all()
+
+    sought_skills = db.session.query(SkillStat.skill_name, SkillStat.requested_count).filter(
+        SkillStat.requested_count > 0
+    ).order_by(SkillStat.requested_count.desc(), SkillStat.skill_name).limit(TOP_N).all()
+
+    active_users = db.session.query(
+        User.id, User.name, UserActivityStat.transaction_count
+    ).join(User, User.id == UserActivityStat.user_id).filter(
+        UserActivityStat.transaction_count > 0
+    ).order_by(
+        UserActivityStat.transaction_count.desc(), UserActivityStat.user_id
+    ).limit(TOP_N).all()
+
+    return {
+        'user_count': counters['users'].value if 'users' in counters else 0,
+        'skill_count': counters['skills'].value if 'skills' in counters else 0,
+        'transaction_count': counters['transactions'].value if 'transactions' in counters else 0,
+        'popular_skills': popular_skills,
+        'sought_skills': sought_skills,
+        'active_users': active_users,
+        'updated_at': max(row.updated_at for row in counters.values()),
+        'rebuilt_at': counters['last_rebuild'].updated_at
+    }
@@ -0,0 +1,68 @@
+"""Throughput check for the bulk user import.
+
+Generates N users with a few skills each as NDJSON, imports them into a
+throwaway SQLite database with bulk_import.import_users() and prints the
+rate. The target is at least 10k users per second.
+
+Usage: python tools/bench_bulk_import.py [--users 50000] [--skills 3] [--chunk-size 5000]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SKILL_NAMES = ['Python Programming', 'Web Design', 'Spanish', 'Guitar', 'Photography',
+               'Cooking', 'Data Analysis', 'Public Speaking', 'Yoga', 'Carpentry']
+
+
+def generate(count, skills_per_user, seed=0):
+    rng = random.Random(seed)
+    for i in range(count):
+        yield json.dumps({
+            'name': f'User {i}',
+            'email': f'user{i}@example.com',
+            'skills': [{'name': name, 'is_offered': rng.random() < 0.5}
+                       for name in rng.sample(SKILL_NAMES, skills_per_user)]
+        })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=50000)
+    parser.add_argument('--skills', type=int, default=3, help='skills per user')
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    parser.add_argument('--target', type=float, default=10000, help='users per second')
+    args = parser.parse_args()
+
+    os.environ['IPFS_PUBLISHER_AUTOSTART'] = 'false'
+    sys.path.insert(0, ROOT)
+    import config
+    database_path = os.path.join(tempfile.mkdtemp(prefix='coinnect-bench-'), 'bench.db')
+    config.Config.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + database_path
+    import app
+    import bulk_import
+    import search_index
+    from models import db
+
+    lines = list(generate(args.users, args.skills))
+    with app.app.app_context():
+        db.create_all()
+        search_index.init_search_index(db.engine)
+
+        started = time.perf_counter()
+        created, errors = bulk_import.import_users(bulk_import.parse_ndjson(lines), args.chunk_size)
+        elapsed = time.perf_counter() - started
+
+    rate = created / elapsed if elapsed else float('inf')
+    print(f'imported {created} users ({created * args.skills} skills) in {elapsed:.2f}s: '
+          f'{rate:,.0f} users/s, {len(errors)} error(s)')
+    if rate < args.target:
+        sys.exit(f'below the target of {args.target:,.0f} users/s')
+
+
+if __name__ == '__main__':
+    main()
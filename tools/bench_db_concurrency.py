@@ -0,0 +1,176 @@
+"""Read/write concurrency benchmark for the database engine settings.
+
+Runs reader and writer processes side by side against copies of one
+SQLite database, once per engine profile, and reports throughput, latency
+percentiles and failed requests for each side:
+
+  baseline   SQLite defaults: rollback journal, synchronous=FULL, no read engine
+  pragmas    the Config defaults: WAL, synchronous=NORMAL, mmap, larger cache, busy_timeout
+  read-pool  pragmas plus DATABASE_READ_URL, so @read_only routes use their own engine
+
+Readers fetch /user/<id> profiles and /users pages; writers post
+/create_transaction. Each process is one app instance, like a WSGI worker.
+Without --database a small database is generated with tools/generate_data.py.
+
+Usage: python tools/bench_db_concurrency.py [--database /tmp/coinnect.db] [--readers 4] [--writers 2]
+                                            [--duration 10] [--profiles baseline,pragmas,read-pool]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# journal_mode is persistent in the file, so it is set on each copy before the run
+PROFILES = {
+    'baseline': ('DELETE', {'SQLITE_JOURNAL_MODE': '', 'SQLITE_SYNCHRONOUS': '', 'SQLITE_BUSY_TIMEOUT': '',
+                            'SQLITE_CACHE_SIZE': '', 'SQLITE_MMAP_SIZE': '', 'DB_POOL_SIZE': '5'}),
+    'pragmas': ('WAL', {}),
+    'read-pool': ('WAL', {'DATABASE_READ_URL': 'same'}),
+}
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def _worker(role, database_path, env, ids, duration, seed, start, results):
+    os.environ.update(env, IPFS_PUBLISHER_AUTOSTART='false', METRICS_ENABLED='false',
+                      DATABASE_URL='sqlite:///' + database_path)
+    if os.environ.get('DATABASE_READ_URL') == 'same':
+        os.environ['DATABASE_READ_URL'] = os.environ['DATABASE_URL']
+    sys.path.insert(0, ROOT)
+    import app as appmod
+
+    client = appmod.app.test_client()
+    rng = random.Random(seed)
+    latencies, failures = [], {}
+    client.get(f'/user/{ids["users"][0]}')  # Open connections before the clock starts
+    start.wait()
+
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        if role == 'reader':
+            if rng.random() < 0.7:
+                response = client.get(f'/user/{rng.choice(ids["users"])}')
+            else:
+                response = client.get(f'/users?after_id={rng.choice(ids["users"])}&limit=50')
+        else:
+            (offerer_id, skill_id), (requester_id, _) = rng.sample(ids['offers'], 2)
+            response = client.post('/create_transaction', json={
+                'offerer_id': offerer_id, 'requester_id': requester_id, 'skill_id': skill_id, 'amount_paid': 1
+            })
+        elapsed = time.perf_counter() - started
+        if response.status_code == 200:
+            latencies.append(elapsed)
+        else:
+            error = (response.get_json(silent=True) or {}).get('error', '')
+            key = f'{response.status_code} {error[:60]}'
+            failures[key] = failures.get(key, 0) + 1
+    results.put((role, latencies, failures))
+
+
+def _sample_ids(database_path, seed):
+    rng = random.Random(seed)
+    conn = sqlite3.connect(database_path)
+    try:
+        users = [row[0] for row in conn.execute('SELECT id FROM user')]
+        offers = conn.execute('SELECT user_id, id FROM skill WHERE is_offered = 1').fetchall()
+    finally:
+        conn.close()
+    return {'users': rng.sample(users, min(len(users), 5000)), 'offers': rng.sample(offers, min(len(offers), 5000))}
+
+
+def _prepare_copy(source, directory, journal_mode):
+    path = os.path.join(directory, 'bench.db')
+    for suffix in ('', '-wal', '-shm', '-journal'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    shutil.copyfile(source, path)
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute(f'PRAGMA journal_mode = {journal_mode}')
+        # Writers should not stop on insufficient funds half way through the run
+        conn.execute('UPDATE user SET skillcoins_balance = 1000000000')
+        conn.commit()
+    finally:
+        conn.close()
+    return path
+
+
+def run_profile(name, source, directory, ids, readers, writers, duration):
+    journal_mode, env = PROFILES[name]
+    path = _prepare_copy(source, directory, journal_mode)
+    context = multiprocessing.get_context('spawn')
+    start = context.Event()
+    results = context.Queue()
+    processes = [
+        context.Process(target=_worker, args=(role, path, env, ids, duration, index, start, results))
+        for index, role in enumerate(['reader'] * readers + ['writer'] * writers)
+    ]
+    for process in processes:
+        process.start()
+    time.sleep(0.5)
+    start.set()
+
+    summary = {role: {'latencies': [], 'failures': {}} for role in ('reader', 'writer')}
+    for _ in processes:
+        role, latencies, failures = results.get()
+        summary[role]['latencies'].extend(latencies)
+        for key, count in failures.items():
+            summary[role]['failures'][key] = summary[role]['failures'].get(key, 0) + count
+    for process in processes:
+        process.join()
+
+    for role in summary.values():
+        latencies = sorted(role['latencies'])
+        role.update(count=len(latencies), rate=len(latencies) / duration, p50_ms=percentile(latencies, 0.5) * 1000,
+                    p95_ms=percentile(latencies, 0.95) * 1000, p99_ms=percentile(latencies, 0.99) * 1000,
+                    failed=sum(role['failures'].values()))
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', help='SQLite database to copy for each profile (generated if omitted)')
+    parser.add_argument('--readers', type=int, default=4, help='reader processes')
+    parser.add_argument('--writers', type=int, default=2, help='writer processes')
+    parser.add_argument('--duration', type=float, default=10, help='seconds per profile')
+    parser.add_argument('--profiles', default=','.join(PROFILES))
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='coinnect-dbbench-')
+    source = args.database
+    if source is None:
+        source = os.path.join(directory, 'source.db')
+        print('Generating a database...', file=sys.stderr)
+        subprocess.run([sys.executable, os.path.join(ROOT, 'tools', 'generate_data.py'), '--database', source,
+                        '--users', '5000', '--skills', '20000', '--transactions', '100000'], check=True)
+    ids = _sample_ids(source, args.seed)
+
+    print(f'{args.readers} reader and {args.writers} writer process(es), {args.duration:g}s per profile')
+    print(f"{'profile':10} {'side':7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'failed':>7}")
+    for name in args.profiles.split(','):
+        summary = run_profile(name, source, directory, ids, args.readers, args.writers, args.duration)
+        for role in ('reader', 'writer'):
+            stats = summary[role]
+            print(f"{name:10} {role + 's':7} {stats['rate']:8.1f} {stats['p50_ms']:8.2f} {stats['p95_ms']:8.2f} "
+                  f"{stats['p99_ms']:8.2f} {stats['failed']:7}")
+            for failure, count in sorted(stats['failures'].items(), key=lambda item: -item[1])[:3]:
+                print(f"{'':19}{count} x {failure}")
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
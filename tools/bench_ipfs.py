@@ -0,0 +1,214 @@
+"""IPFS client and view benchmark.
+
+Runs the Filebase call patterns of the IPFS views against the local
+stand-in (tools/ipfs_standin.py) with a fixed per-request latency:
+
+  publish   add a JSON document, then pin it (/ipfs/transaction, /ipfs/user, /ipfs/skill)
+  fetch     cat a document that is not cached yet (/verify/transaction)
+
+For each concurrency level the client path runs IPFSService from a pool of
+that many threads, as that many WSGI worker threads would, with a
+connection pool as large as the concurrency.
+
+--views adds a view-level run: app.py is served by a threaded WSGI server
+(werkzeug, one thread per request) on a temporary database, and that many
+concurrent GET /ipfs/user/<id> requests each publish a profile that is not
+on IPFS yet. The views are synchronous, so a request waiting on Filebase
+holds its worker thread and one pooled connection, nothing more.
+
+Reports throughput, latency percentiles, errors and the threads used (for
+views, the server-side threads at the peak).
+
+Usage: python tools/bench_ipfs.py [--latency 0.1] [--concurrency 10,50,200] [--operations 400]
+                                  [--patterns publish,fetch] [--views]
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'tools'))
+
+from ipfs_service import IPFSService  # noqa: E402
+from ipfs_standin import make_server  # noqa: E402
+
+APP_THREADS = 'app-request'
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def _document(pattern, number):
+    return {'pattern': pattern, 'number': number, 'padding': 'x' * 512}
+
+
+def _failed(result):
+    return isinstance(result, dict) and 'error' in result
+
+
+def run_client(base_url, pattern, concurrency, operations, cids):
+    service = IPFSService(pool_size=concurrency, base_url=base_url)
+
+    def operation(number):
+        started = time.perf_counter()
+        if pattern == 'publish':
+            ipfs_hash = service.add_json_to_ipfs(_document(pattern, number))
+            ok = not _failed(ipfs_hash) and not _failed(service.pin_hash(ipfs_hash))
+        else:
+            ok = not _failed(service.get_json_from_ipfs(cids[number % len(cids)]))
+        return time.perf_counter() - started, ok
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(operation, range(operations)))
+    elapsed = time.perf_counter() - started
+    service.session.close()
+    return results, elapsed, min(concurrency, operations)  # One worker thread per call in flight
+
+
+class ThreadPeak:
+    """Samples the live threads whose name starts with prefix, keeping the highest count seen"""
+
+    def __init__(self, prefix, interval=0.002):
+        self.prefix = prefix
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name='thread-peak', daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            live = sum(1 for thread in threading.enumerate() if thread.name.startswith(self.prefix))
+            self.peak = max(self.peak, live)
+
+
+def serve_app(ipfs_url, users, pool_size):
+    """Serve app.py on a threaded WSGI server with a temporary database of unpublished users"""
+    directory = tempfile.mkdtemp(prefix='bench-views-')
+    os.environ['IPFS_API_URL'] = ipfs_url
+    os.environ['IPFS_PUBLISHER_AUTOSTART'] = 'false'
+    os.environ['IPFS_POOL_SIZE'] = str(pool_size)
+    os.environ['IPFS_CACHE_DIR'] = os.path.join(directory, 'ipfs_cache')
+    os.environ['METRICS_ENABLED'] = 'false'
+    import config
+    config.Config.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(directory, 'views.db')
+    import app as app_module
+    from models import db, User
+    from werkzeug.serving import make_server as make_wsgi_server
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)  # No line per request
+    app = app_module.app
+    with app.app_context():
+        db.create_all()
+        db.session.execute(db.insert(User), [
+            {'name': f'Bench user {number}', 'email': f'bench{number}@example.com'}
+            for number in range(1, users + 1)
+        ])
+        db.session.commit()
+
+    server = make_wsgi_server('127.0.0.1', 0, app, threaded=True)
+    server.socket.listen(1024)  # Room for every connection of the highest level at once
+
+    def process_request(request, client_address):
+        # As ThreadingMixIn does, with the threads named so ThreadPeak can tell them from the stand-in's
+        threading.Thread(target=server.process_request_thread, args=(request, client_address),
+                         name=f'{APP_THREADS}-{client_address[1]}', daemon=True).start()
+
+    server.process_request = process_request
+    threading.Thread(target=server.serve_forever, name='app-server', daemon=True).start()
+    return server
+
+
+def run_views(base_url, concurrency, operations, first_user):
+    # Each request names a user whose profile has not been published yet
+    session = requests.Session()
+    session.mount('http://', HTTPAdapter(pool_maxsize=concurrency))
+
+    def operation(number):
+        started = time.perf_counter()
+        response = session.get(f'{base_url}/ipfs/user/{first_user + number}', timeout=120)
+        ok = response.status_code == 200 and 'ipfs_hash' in response.json()
+        return time.perf_counter() - started, ok
+
+    with ThreadPeak(APP_THREADS) as threads:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(operation, range(operations)))
+        elapsed = time.perf_counter() - started
+    session.close()
+    return results, elapsed, threads.peak
+
+
+def _seed_documents(base_url, count):
+    # Stored with the latency switched off by the caller, so fetches have something to cat
+    service = IPFSService(base_url=base_url)
+    return [service.add_json_to_ipfs(_document('fetch', number)) for number in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.1, help='seconds the stand-in adds to every request')
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--concurrency', default='10,50,200', help='comma-separated levels')
+    parser.add_argument('--operations', type=int, default=400, help='operations per run')
+    parser.add_argument('--patterns', default='publish,fetch')
+    parser.add_argument('--views', action='store_true', help='also time GET /ipfs/user/<id> through app.py')
+    args = parser.parse_args()
+    levels = [int(level) for level in args.concurrency.split(',')]
+
+    server = make_server(port=0)
+    threading.Thread(target=server.serve_forever, name='ipfs-standin', daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+    cids = _seed_documents(base_url, args.operations)
+    server.state.configure(latency=args.latency, jitter=args.jitter)
+
+    print(f'Stand-in latency {args.latency * 1000:g}ms (+{args.jitter * 1000:g}ms jitter), '
+          f'{args.operations} operations per run')
+    print(f"{'pattern':8} {'conc':>5} {'path':6} {'ops/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'errors':>7} {'threads':>8}")
+    runs = [(pattern, concurrency, path, run)
+            for pattern in args.patterns.split(',') for concurrency in levels
+            for path, run in (('client', run_client),)]
+    if args.views:
+        app_server = serve_app(base_url, args.operations * len(levels), max(levels))
+        app_url = f'http://127.0.0.1:{app_server.server_port}'
+        for number, concurrency in enumerate(levels):
+            first_user = number * args.operations + 1
+            runs.append(('view', concurrency, 'wsgi',
+                         lambda url, pattern, concurrency, operations, cids, first_user=first_user:
+                         run_views(app_url, concurrency, operations, first_user)))
+
+    for pattern, concurrency, path, run in runs:
+        results, elapsed, threads = run(base_url, pattern, concurrency, args.operations, cids)
+        latencies = sorted(latency for latency, ok in results if ok)
+        errors = sum(1 for _, ok in results if not ok)
+        print(f'{pattern:8} {concurrency:5} {path:6} {len(results) / elapsed:8.1f} '
+              f'{percentile(latencies, 0.5) * 1000:8.1f} {percentile(latencies, 0.95) * 1000:8.1f} '
+              f'{percentile(latencies, 0.99) * 1000:8.1f} {errors:7} {threads:8}')
+    if args.views:
+        app_server.shutdown()
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,371 @@
+"""Endpoint benchmark suite.
+
+Drives every route in app.py through the Flask test client against a copy
+of a database (build one with tools/generate_data.py), with IPFS calls
+served by the local stand-in from tools/ipfs_standin.py. For each endpoint
+it reports p50/p90/p99 latency, throughput and SQL queries per request.
+
+Results are written as JSON to instance/benchmarks/ so runs can be
+compared: --compare latest (or a file) prints the change per endpoint
+and flags regressions; --fail-on-regression turns them into exit code 1.
+
+Usage: python tools/benchmark.py --database /tmp/coinnect.db [--iterations 200] [--threads 1]
+                                 [--only dashboard,users_page] [--compare latest]
+"""
+import argparse
+import contextvars
+import datetime
+import glob
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_RESULTS_DIR = os.path.join(ROOT, 'instance', 'benchmarks')
+
+
+class BenchContext:
+    """Ids sampled from the database and state shared between scenarios"""
+
+    def __init__(self, db, models, seed):
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.run_id = datetime.datetime.now().strftime('%Y%m%d%H%M%S')
+        self.counter = 0
+        self.created_skills = []
+        self.ipfs_hashes = []
+
+        max_id = lambda model: db.session.query(db.func.max(model.id)).scalar() or 0
+        self.max_user = max_id(models.User)
+        self.max_skill = max_id(models.Skill)
+        self.max_transaction = max_id(models.Transaction)
+        self.offers = [tuple(row) for row in db.session.query(models.Skill.id, models.Skill.user_id)
+                       .filter(models.Skill.is_offered == True).order_by(db.func.random()).limit(10000)]
+        self.skill_names = [row[0] for row in db.session.query(models.Skill.skill_name)
+                            .order_by(db.func.random()).limit(1000)]
+        if not self.max_user or not self.offers:
+            raise SystemExit('The database needs users and offered skills; run tools/generate_data.py first')
+
+    def next_number(self):
+        with self.lock:
+            self.counter += 1
+            return self.counter
+
+    def user_id(self):
+        return self.rng.randint(1, self.max_user)
+
+    def transaction_id(self):
+        return self.rng.randint(1, max(self.max_transaction, 1))
+
+    def transfer(self):
+        skill_id, offerer_id = self.rng.choice(self.offers)
+        return {'offerer_id': offerer_id, 'requester_id': self.user_id(), 'skill_id': skill_id, 'amount_paid': 1}
+
+    def new_user(self):
+        number = self.next_number()
+        return {
+            'name': f'Bench User {number}',
+            'email': f'bench-{self.run_id}-{number}@example.com',
+            'skills': [{'name': self.rng.choice(self.skill_names), 'is_offered': True},
+                       {'name': self.rng.choice(self.skill_names), 'is_offered': False}]
+        }
+
+
+def _created_skill(ctx, pop):
+    with ctx.lock:
+        if not ctx.created_skills:
+            return ctx.rng.randint(1, ctx.max_skill)
+        return ctx.created_skills.pop() if pop else ctx.rng.choice(ctx.created_skills)
+
+
+def _remember(collection, key):
+    def record(ctx, response):
+        value = (response.get_json(silent=True) or {}).get(key)
+        if value:
+            with ctx.lock:
+                collection(ctx).append(value)
+    return record
+
+
+# (name, request builder, hook run on the response or None, iterations multiplier)
+# Scenarios run in this order, so later ones can use what earlier ones created.
+SCENARIOS = [
+    ('index', lambda ctx: ('GET', '/', {}), None, 1.0),
+    ('docs', lambda ctx: ('GET', '/docs', {}), None, 1.0),
+    ('register_form', lambda ctx: ('GET', '/register', {}), None, 1.0),
+    ('register', lambda ctx: ('POST', '/register', {'json': ctx.new_user()}), None, 1.0),
+    ('register_bulk', lambda ctx: ('POST', '/register/bulk', {
+        'data': '\n'.join(json.dumps(ctx.new_user()) for _ in range(100)),
+        'content_type': 'application/x-ndjson'}), None, 0.2),
+    ('users_page', lambda ctx: ('GET', f'/users?after_id={ctx.user_id()}&limit=100', {}), None, 1.0),
+    ('match_skills', lambda ctx: ('GET', f'/match_skills?skill_name={ctx.rng.choice(ctx.skill_names)}&limit=20', {}),
+     None, 1.0),
+    ('search_skills', lambda ctx: ('GET', f'/search_skills?name={ctx.rng.choice(ctx.skill_names)[:5]}', {}), None, 1.0),
+    ('user_profile', lambda ctx: ('GET', f'/user/{ctx.user_id()}', {}), None, 1.0),
+    ('recommendations', lambda ctx: ('GET', f'/recommendations/{ctx.user_id()}', {}), None, 1.0),
+    ('dashboard', lambda ctx: ('GET', '/dashboard', {}), None, 1.0),
+    ('check_fraud', lambda ctx: ('GET', f'/check_fraud?after_id={ctx.user_id()}&limit=1000', {}), None, 0.5),
+    ('create_transaction', lambda ctx: ('POST', '/create_transaction', {'json': ctx.transfer()}), None, 1.0),
+    ('create_transactions', lambda ctx: ('POST', '/create_transactions', {
+        'json': {'transactions': [ctx.transfer() for _ in range(100)]}}), None, 0.2),
+    ('rate_transaction', lambda ctx: ('POST', f'/rate_transaction/{ctx.transaction_id()}', {
+        'json': {'rating': ctx.rng.randint(1, 5), 'is_requester_rating': ctx.rng.random() < 0.5}}), None, 1.0),
+    ('skill_add', lambda ctx: ('POST', '/skill', {'json': {
+        'user_id': ctx.user_id(), 'skill_name': ctx.rng.choice(ctx.skill_names), 'is_offered': True}}),
+     _remember(lambda ctx: ctx.created_skills, 'skill_id'), 1.0),
+    ('skill_update', lambda ctx: ('PUT', f'/skill/{_created_skill(ctx, pop=False)}', {
+        'json': {'availability': ctx.rng.choice(['weekends', 'evenings'])}}), None, 1.0),
+    ('skill_delete', lambda ctx: ('DELETE', f'/skill/{_created_skill(ctx, pop=True)}', {}), None, 1.0),
+    ('ipfs_transaction', lambda ctx: ('GET', f'/ipfs/transaction/{ctx.transaction_id()}', {}),
+     _remember(lambda ctx: ctx.ipfs_hashes, 'ipfs_hash'), 1.0),
+    ('ipfs_user', lambda ctx: ('GET', f'/ipfs/user/{ctx.user_id()}', {}), None, 1.0),
+    ('ipfs_skill', lambda ctx: ('GET', f'/ipfs/skill/{ctx.rng.randint(1, ctx.max_skill)}', {}), None, 1.0),
+    ('ipfs_stats', lambda ctx: ('GET', '/ipfs/stats', {}), None, 1.0),
+    ('verify_transaction', lambda ctx: ('GET', '/verify/transaction/' + (
+        ctx.rng.choice(ctx.ipfs_hashes) if ctx.ipfs_hashes else 'QmUnknown'), {}), None, 1.0),
+    ('setup_db', lambda ctx: ('GET', '/setup_db', {}), None, 0.02),
+]
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+class QueryCount:
+    """Queries of one request, counted on the worker thread that handles it"""
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+
+def run_scenario(app, ctx, query_counter, builder, hook, iterations, warmup, threads, time_budget):
+    samples = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def worker(count, record, deadline):
+        client = app.test_client()
+        for _ in range(count):
+            if time.perf_counter() > deadline:
+                break  # Slow endpoint: report what was measured within the budget
+            method, path, kwargs = builder(ctx)
+            count = QueryCount()
+            query_counter.set(count)
+            started = time.perf_counter()
+            response = client.open(path, method=method, **kwargs)
+            elapsed = time.perf_counter() - started
+            queries = count.value
+            if hook:
+                hook(ctx, response)
+            if record:
+                with lock:
+                    samples.append((elapsed, queries))
+                    statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    worker(warmup, False, time.perf_counter() + time_budget)
+
+    shares = [iterations // threads + (1 if i < iterations % threads else 0) for i in range(threads)]
+    started = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(share, True, started + time_budget)) for share in shares if share]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    latencies = sorted(sample[0] * 1000 for sample in samples)
+    queries = [sample[1] for sample in samples]
+    return {
+        'requests': len(samples),
+        'truncated': len(samples) < iterations,
+        'status': {str(code): count for code, count in sorted(statuses.items())},
+        'server_errors': sum(count for code, count in statuses.items() if code >= 500),
+        'p50_ms': percentile(latencies, 0.50),
+        'p90_ms': percentile(latencies, 0.90),
+        'p99_ms': percentile(latencies, 0.99),
+        'mean_ms': sum(latencies) / len(latencies) if latencies else None,
+        'max_ms': latencies[-1] if latencies else None,
+        'throughput_rps': len(samples) / wall if wall else None,
+        'queries_mean': sum(queries) / len(queries) if queries else None,
+        'queries_max': max(queries) if queries else None,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _previous_result(results_dir, exclude=None):
+    paths = sorted(path for path in glob.glob(os.path.join(results_dir, '*.json')) if path != exclude)
+    return paths[-1] if paths else None
+
+
+def compare(current, baseline, threshold):
+    """Print per-endpoint changes against a baseline run; returns the regressed endpoint names"""
+    regressions = []
+    print(f"\nCompared with {baseline['meta'].get('label')} ({baseline['meta'].get('commit')}, "
+          f"{baseline['meta'].get('started_at')})")
+    print(f"{'endpoint':22} {'p50 ms':>18} {'p99 ms':>18} {'req/s':>18} {'queries':>12}")
+
+    def change(new, old):
+        if new is None or old is None:
+            return 'n/a'
+        if not old:
+            return f'{new:.1f}'
+        return f'{new:.1f} ({(new - old) / old * 100:+.0f}%)'
+
+    for name, result in current['endpoints'].items():
+        old = baseline['endpoints'].get(name)
+        if old is None:
+            print(f'{name:22} (new)')
+            continue
+        regressed = []
+        if result['p99_ms'] and old['p99_ms'] and result['p99_ms'] > old['p99_ms'] * (1 + threshold):
+            regressed.append('p99')
+        if result['p50_ms'] and old['p50_ms'] and result['p50_ms'] > old['p50_ms'] * (1 + threshold):
+            regressed.append('p50')
+        if result['queries_mean'] is not None and old['queries_mean'] is not None \
+                and result['queries_mean'] > old['queries_mean'] + 0.5:
+            regressed.append('queries')
+        flag = f"  REGRESSION: {', '.join(regressed)}" if regressed else ''
+        print(f"{name:22} {change(result['p50_ms'], old['p50_ms']):>18} {change(result['p99_ms'], old['p99_ms']):>18} "
+              f"{change(result['throughput_rps'], old['throughput_rps']):>18} "
+              f"{change(result['queries_mean'], old['queries_mean']):>12}{flag}")
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', required=True, help='SQLite database to benchmark (a copy is used)')
+    parser.add_argument('--in-place', action='store_true', help='run against the database itself, not a copy')
+    parser.add_argument('--iterations', type=int, default=200, help='measured requests per endpoint')
+    parser.add_argument('--warmup', type=int, default=5, help='unmeasured requests per endpoint first')
+    parser.add_argument('--threads', type=int, default=1, help='concurrent clients per endpoint')
+    parser.add_argument('--time-budget', type=float, default=30.0,
+                        help='seconds per endpoint (warmup and measurement each) before stopping early')
+    parser.add_argument('--only', help='comma separated endpoint names')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--label', default='run')
+    parser.add_argument('--results-dir', default=DEFAULT_RESULTS_DIR)
+    parser.add_argument('--compare', help="baseline result file, or 'latest' for the previous run")
+    parser.add_argument('--threshold', type=float, default=0.2, help='relative latency increase counted as a regression')
+    parser.add_argument('--fail-on-regression', action='store_true')
+    parser.add_argument('--ipfs-latency', type=float, default=0.0, help='stand-in latency per IPFS call (seconds)')
+    parser.add_argument('--ipfs-error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    database = args.database
+    if not args.in_place:
+        copy = os.path.join(tempfile.mkdtemp(prefix='coinnect-bench-'), os.path.basename(database))
+        shutil.copyfile(database, copy)
+        database = copy
+
+    sys.path.insert(0, ROOT)
+    sys.path.insert(0, os.path.join(ROOT, 'tools'))
+    from ipfs_standin import make_server
+    standin = make_server(port=0, latency=args.ipfs_latency, error_rate=args.ipfs_error_rate, seed=args.seed)
+    threading.Thread(target=standin.serve_forever, daemon=True).start()
+
+    os.environ['IPFS_API_URL'] = f'http://127.0.0.1:{standin.server_port}'
+    os.environ['IPFS_PUBLISHER_AUTOSTART'] = 'false'
+    os.environ.setdefault('IPFS_CACHE_DIR', os.path.join(os.path.dirname(database), 'ipfs_cache'))
+    import config
+    config.Config.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.abspath(database)
+    import app as app_module
+    import models
+    from models import db
+    from sqlalchemy import event
+
+    app = app_module.app
+    query_counter = contextvars.ContextVar('bench_query_count', default=None)
+
+    with app.app_context():
+        db.create_all()
+
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def count_query(conn, cursor, statement, parameters, context, executemany):
+            count = query_counter.get()
+            if count is not None:
+                count.value += 1
+
+        ctx = BenchContext(db, models, args.seed)
+        scale = {'users': ctx.max_user, 'skills': ctx.max_skill, 'transactions': ctx.max_transaction}
+
+    only = set(args.only.split(',')) if args.only else None
+    unknown = (only or set()) - {scenario[0] for scenario in SCENARIOS}
+    if unknown:
+        raise SystemExit(f"Unknown endpoint(s): {', '.join(sorted(unknown))}")
+
+    result = {
+        'meta': {
+            'label': args.label,
+            'commit': _git_commit(),
+            'started_at': datetime.datetime.now().isoformat(timespec='seconds'),
+            'database': os.path.abspath(args.database),
+            'scale': scale,
+            'iterations': args.iterations,
+            'threads': args.threads,
+            'ipfs': {'latency': args.ipfs_latency, 'error_rate': args.ipfs_error_rate},
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+        },
+        'endpoints': {}
+    }
+
+    print(f"Benchmarking {scale['users']:,} users / {scale['skills']:,} skills / "
+          f"{scale['transactions']:,} transactions, {args.iterations} requests x {args.threads} thread(s)")
+    print(f"{'endpoint':22} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'req/s':>9} {'queries':>8}  status")
+    for name, builder, hook, multiplier in SCENARIOS:
+        if only and name not in only:
+            continue
+        iterations = max(1, int(args.iterations * multiplier))
+        warmup = min(args.warmup, iterations)
+        stats = run_scenario(app, ctx, query_counter, builder, hook, iterations, warmup, args.threads,
+                             args.time_budget)
+        result['endpoints'][name] = stats
+        print(f"{name:22} {stats['p50_ms']:9.2f} {stats['p90_ms']:9.2f} {stats['p99_ms']:9.2f} "
+              f"{stats['throughput_rps']:9.1f} {stats['queries_mean']:8.1f}  {stats['status']}"
+              f"{'  (stopped at the time budget)' if stats['truncated'] else ''}")
+
+    standin.shutdown()
+
+    os.makedirs(args.results_dir, exist_ok=True)
+    stamp = datetime.datetime.now().strftime('%Y%m%dT%H%M%S')
+    path = os.path.join(args.results_dir, f'{stamp}-{args.label}.json')
+    with open(path, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f'\nResults written to {path}')
+
+    if args.compare:
+        baseline_path = _previous_result(args.results_dir, exclude=path) if args.compare == 'latest' else args.compare
+        if not baseline_path:
+            print('No earlier run to compare with')
+            return
+        with open(baseline_path) as f:
+            regressions = compare(result, json.load(f), args.threshold)
+        if regressions and args.fail_on_regression:
+            sys.exit(f"Regressions in: {', '.join(regressions)}")
+
+
+if __name__ == '__main__':
+    main()
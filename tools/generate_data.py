@@ -0,0 +1,197 @@
+"""Fill an empty database with synthetic Coinnect data at a chosen scale.
+
+Skill names follow a Zipf distribution over a vocabulary of real skills
+and their levels, so a few skills are offered by many users and most by
+few. The same skew applies to how active users are. Every transaction
+uses a skill its offerer really offers, and some transactions are rated.
+
+Secondary indexes are dropped during the load and rebuilt afterwards.
+Then the search index and the dashboard statistics are built.
+
+Usage: python tools/generate_data.py --database /tmp/coinnect-1m.db \\
+           --users 1000000 --skills 5000000 --transactions 20000000
+"""
+import argparse
+import datetime
+import itertools
+import os
+import random
+import sys
+import time
+from array import array
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BASE_SKILLS = [
+    'Python Programming', 'Web Development', 'Graphic Design', 'Data Analysis', 'Machine Learning',
+    'UI/UX Design', 'Photography', 'Video Editing', 'Copywriting', 'Translation', 'Spanish', 'French',
+    'German', 'Mandarin', 'Japanese', 'Guitar', 'Piano', 'Singing', 'Drawing', 'Painting', 'Cooking',
+    'Baking', 'Gardening', 'Carpentry', 'Plumbing', 'Electrical Repair', 'Car Maintenance', 'Yoga',
+    'Personal Training', 'Meditation', 'Public Speaking', 'Accounting', 'Tax Preparation', 'Marketing',
+    'SEO', 'Social Media', 'Project Management', 'Excel', 'SQL', 'JavaScript', 'React', 'Java', 'C++',
+    'Rust', 'Go', 'DevOps', 'Cloud Architecture', 'Cybersecurity', 'Mobile Development', 'Game Design',
+    '3D Modeling', 'Animation', 'Music Production', 'Podcasting', 'Tutoring Math', 'Tutoring Physics',
+    'Tutoring Chemistry', 'Essay Editing', 'Resume Writing', 'Interview Coaching', 'Career Advice',
+    'Knitting', 'Sewing', 'Pottery', 'Woodworking', 'Calligraphy', 'Chess', 'Dog Training',
+    'Pet Sitting', 'Babysitting', 'Home Cleaning', 'Moving Help', 'Bike Repair', 'Computer Repair',
+    'Legal Advice', 'Nutrition', 'First Aid', 'Swimming', 'Tennis', 'Running Coaching', 'Dance',
+]
+LEVELS = ['', 'Beginner ', 'Intermediate ', 'Advanced ', 'Professional ']
+AVAILABILITY = ['anytime', 'weekdays', 'weekends', 'evenings', 'mornings']
+FIRST_NAMES = ['Alice', 'Bob', 'Charlie', 'Dana', 'Eve', 'Farid', 'Grace', 'Hiro', 'Ines', 'Jamal',
+               'Kara', 'Liam', 'Mei', 'Nora', 'Omar', 'Priya', 'Quinn', 'Rosa', 'Sven', 'Tariq',
+               'Uma', 'Victor', 'Wen', 'Ximena', 'Yusuf', 'Zoe']
+LAST_NAMES = ['Smith', 'Garcia', 'Chen', 'Okafor', 'Novak', 'Silva', 'Kim', 'Patel', 'Müller',
+              'Rossi', 'Haddad', 'Nguyen', 'Kowalski', 'Ivanova', 'Tanaka', 'Johnson']
+
+
+def zipf_cum_weights(count, exponent):
+    """Cumulative Zipf weights for ranks 1..count, for random.choices(cum_weights=...)"""
+    return list(itertools.accumulate(1.0 / rank ** exponent for rank in range(1, count + 1)))
+
+
+def skill_vocabulary(rng):
+    names = [level + skill for skill in BASE_SKILLS for level in LEVELS]
+    rng.shuffle(names)  # Popularity rank independent of the list order above
+    return names
+
+
+def _chunks(total, size):
+    start = 0
+    while start < total:
+        yield start, min(size, total - start)
+        start += size
+
+
+def _progress(label, done, total, started):
+    rate = done / max(time.perf_counter() - started, 1e-9)
+    print(f'\r  {label}: {done:,}/{total:,} ({rate:,.0f} rows/s)', end='', file=sys.stderr, flush=True)
+    if done == total:
+        print(file=sys.stderr)
+
+
+def generate(conn, users, skills, transactions, rating_fraction, batch_size, seed, skill_exponent, activity_exponent):
+    from models import User, Skill, Transaction, TrustScore
+
+    rng = random.Random(seed)
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    vocabulary = skill_vocabulary(rng)
+    skill_weights = zipf_cum_weights(len(vocabulary), skill_exponent)
+    activity_weights = zipf_cum_weights(users, activity_exponent)
+    user_ids = range(1, users + 1)
+
+    started = time.perf_counter()
+    for start, size in _chunks(users, batch_size):
+        conn.execute(User.__table__.insert(), [{
+            'id': user_id,
+            'name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+            'email': f'user{user_id}@example.com',
+            'trust_score': round(min(10.0, max(0.0, rng.gauss(5.0, 1.5))), 2),
+            'skillcoins_balance': round(rng.lognormvariate(3.0, 1.0), 2)
+        } for user_id in range(start + 1, start + size + 1)])
+        _progress('users', start + size, users, started)
+
+    # Offered skills and their owners, kept to pick transaction skills from
+    offered_ids = array('i')
+    offered_owners = array('i')
+    started = time.perf_counter()
+    for start, size in _chunks(skills, batch_size):
+        owners = rng.choices(user_ids, cum_weights=activity_weights, k=size)
+        names = rng.choices(vocabulary, cum_weights=skill_weights, k=size)
+        rows = []
+        for skill_id, owner, name in zip(range(start + 1, start + size + 1), owners, names):
+            is_offered = rng.random() < 0.6
+            if is_offered:
+                offered_ids.append(skill_id)
+                offered_owners.append(owner)
+            rows.append({'id': skill_id, 'skill_name': name, 'user_id': owner,
+                         'is_offered': is_offered, 'availability': rng.choice(AVAILABILITY)})
+        conn.execute(Skill.__table__.insert(), rows)
+        _progress('skills', start + size, skills, started)
+
+    if transactions and not offered_ids:
+        raise SystemExit('No offered skills to build transactions from; raise --skills')
+
+    started = time.perf_counter()
+    span = 2 * 365 * 24 * 3600  # Two years of history
+    rating_id = 0
+    for start, size in _chunks(transactions, batch_size):
+        requesters = rng.choices(user_ids, cum_weights=activity_weights, k=size)
+        rows = []
+        ratings = []
+        for transaction_id, requester in zip(range(start + 1, start + size + 1), requesters):
+            position = rng.randrange(len(offered_ids))
+            offerer = offered_owners[position]
+            rows.append({
+                'id': transaction_id,
+                'offerer_id': offerer,
+                'requester_id': requester,
+                'skill_id': offered_ids[position],
+                'amount_paid': float(rng.randint(1, 20)),
+                'transaction_date': now - datetime.timedelta(seconds=rng.randrange(span)),
+                'status': 'completed'
+            })
+            if rng.random() < rating_fraction:
+                rating_id += 1
+                ratings.append({'id': rating_id, 'user_id': offerer, 'transaction_id': transaction_id,
+                                'score': float(rng.choices([1, 2, 3, 4, 5], weights=[1, 1, 3, 8, 12])[0])})
+        conn.execute(Transaction.__table__.insert(), rows)
+        if ratings:
+            conn.execute(TrustScore.__table__.insert(), ratings)
+        _progress('transactions', start + size, transactions, started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', required=True, help='SQLite file to create (or any SQLAlchemy URL)')
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--skills', type=int, default=50000)
+    parser.add_argument('--transactions', type=int, default=200000)
+    parser.add_argument('--rating-fraction', type=float, default=0.3, help='share of transactions with a rating')
+    parser.add_argument('--skill-exponent', type=float, default=1.1, help='Zipf exponent of skill popularity')
+    parser.add_argument('--activity-exponent', type=float, default=0.8, help='Zipf exponent of user activity')
+    parser.add_argument('--batch-size', type=int, default=50000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    url = args.database if '://' in args.database else 'sqlite:///' + os.path.abspath(args.database)
+    os.environ['IPFS_PUBLISHER_AUTOSTART'] = 'false'
+    sys.path.insert(0, ROOT)
+    import config
+    config.Config.SQLALCHEMY_DATABASE_URI = url
+    import app
+    import search_index
+    import stats_store
+    from models import db, User
+
+    with app.app.app_context():
+        db.create_all()
+        if User.query.count():
+            raise SystemExit(f'{url} already has users; generate into an empty database')
+
+        # Bulk load without secondary indexes and FTS triggers, then build them once
+        indexes = [index for table in db.metadata.sorted_tables for index in table.indexes]
+        started = time.perf_counter()
+        with db.engine.begin() as conn:
+            if db.engine.dialect.name == 'sqlite':
+                conn.exec_driver_sql('PRAGMA synchronous = OFF')
+                conn.exec_driver_sql('DROP TABLE IF EXISTS skill_fts')
+                for trigger in ('skill_fts_insert', 'skill_fts_delete', 'skill_fts_update'):
+                    conn.exec_driver_sql(f'DROP TRIGGER IF EXISTS {trigger}')
+            for index in indexes:
+                index.drop(conn)
+            generate(conn, args.users, args.skills, args.transactions, args.rating_fraction,
+                     args.batch_size, args.seed, args.skill_exponent, args.activity_exponent)
+            print('  building indexes', file=sys.stderr)
+            for index in indexes:
+                index.create(conn)
+
+        print('  building search index and statistics', file=sys.stderr)
+        search_index.init_search_index(db.engine)
+        stats_store.rebuild()
+        print(f'Generated {args.users:,} users, {args.skills:,} skills and {args.transactions:,} transactions '
+              f'into {url} in {time.perf_counter() - started:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
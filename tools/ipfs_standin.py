@@ -0,0 +1,239 @@
+"""Local stand-in for the Filebase IPFS RPC API.
+
+Implements the calls IPFSService makes (add, cat, pin/add and pin/ls) against an
+in-memory store, with CIDs computed the same way `ipfs add` does, so the
+app can run and be load-tested offline. Faults can be injected to see how
+the app behaves when Filebase is slow or flaky:
+
+  --latency / --jitter   fixed and random extra delay per request (seconds)
+  --error-rate           fraction of requests answered with --error-status
+  --throttle-rps         token bucket rate; requests over it get 429
+  --burst                token bucket size
+
+Point the app at it with IPFS_API_URL=http://127.0.0.1:5055 (the default
+port). GET /_standin/stats reports request counts; POST /_standin/config
+with a JSON body changes the fault settings of a running server.
+
+Usage: python tools/ipfs_standin.py [--port 5055] [--latency 0.05] [--error-rate 0.1] ...
+"""
+import argparse
+import email.parser
+import email.policy
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cid import compute_cid  # noqa: E402
+
+
+class StandinState:
+    """Stored blocks, pins, fault settings and counters shared by the handler threads"""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, error_status=503,
+                 throttle_rps=0.0, burst=None, seed=None):
+        self.lock = threading.Lock()
+        self.objects = {}
+        self.pins = set()
+        self.random = random.Random(seed)
+        self.counters = {}
+        self.configure(latency=latency, jitter=jitter, error_rate=error_rate, error_status=error_status,
+                       throttle_rps=throttle_rps, burst=burst)
+
+    def configure(self, **settings):
+        with self.lock:
+            for name, value in settings.items():
+                if name not in ('latency', 'jitter', 'error_rate', 'error_status', 'throttle_rps', 'burst'):
+                    raise ValueError(f'Unknown setting: {name}')
+                setattr(self, name, value)
+            if settings.get('burst') is None and ('throttle_rps' in settings or self.burst is None):
+                self.burst = max(1.0, self.throttle_rps)
+            self._tokens = self.burst
+            self._refilled_at = time.monotonic()
+
+    def settings(self):
+        return {name: getattr(self, name)
+                for name in ('latency', 'jitter', 'error_rate', 'error_status', 'throttle_rps', 'burst')}
+
+    def count(self, key):
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + 1
+
+    def delay(self):
+        with self.lock:
+            return self.latency + self.random.uniform(0, self.jitter) if self.jitter else self.latency
+
+    def fault(self):
+        """Status code to fail the request with, or None"""
+        with self.lock:
+            if self.throttle_rps:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.throttle_rps)
+                self._refilled_at = now
+                if self._tokens < 1:
+                    return 429
+                self._tokens -= 1
+            if self.error_rate and self.random.random() < self.error_rate:
+                return self.error_status
+        return None
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like Filebase
+    state = None
+
+    def setup(self):
+        super().setup()
+        # Headers and body go out in separate writes; without this, delayed ACKs add ~40ms per call
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type='application/json'):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status, message):
+        # Kubo's error shape
+        self._send(status, {'Message': message, 'Code': 0, 'Type': 'error'})
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _handle(self):
+        url = urlsplit(self.path)
+        path = url.path.rstrip('/')
+        args = parse_qs(url.query)
+        body = self._body()
+
+        if path == '/_standin/stats':
+            with self.state.lock:
+                stats = {'counters': dict(self.state.counters), 'objects': len(self.state.objects),
+                         'pins': len(self.state.pins), 'settings': self.state.settings()}
+            return self._send(200, stats)
+        if path == '/_standin/config':
+            try:
+                self.state.configure(**json.loads(body or b'{}'))
+            except (TypeError, ValueError) as e:
+                return self._error(400, str(e))
+            return self._send(200, self.state.settings())
+
+        # Accept both /add and prefixed paths such as /api/v0/add
+        operation = next((name for name in ('pin/add', 'pin/ls', 'add', 'cat') if path.endswith('/' + name)), None)
+        if operation is None:
+            return self._error(404, f'unknown command: {path}')
+        self.state.count(f'{operation} requests')
+
+        time.sleep(self.state.delay())
+        status = self.state.fault()
+        if status:
+            self.state.count(f'{operation} {status}')
+            return self._error(status, 'injected failure' if status != 429 else 'rate limit exceeded')
+
+        if operation == 'add':
+            return self._add(body)
+        if operation == 'cat':
+            return self._cat(args.get('arg', [''])[0])
+        if operation == 'pin/ls':
+            return self._pin_ls(args.get('arg', [''])[0])
+        return self._pin(args.get('arg', [''])[0])
+
+    def _add(self, body):
+        name = ''
+        content_type = self.headers.get('Content-Type', '')
+        if content_type.startswith('multipart/form-data'):
+            # Multipart upload from upload_file_to_ipfs: take the first file part
+            message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+                b'Content-Type: ' + content_type.encode() + b'\r\n\r\n' + body
+            )
+            part = next(message.iter_parts(), None)
+            if part is None:
+                return self._error(400, 'file argument is required')
+            name = part.get_filename() or ''
+            body = part.get_payload(decode=True) or b''
+
+        cid = compute_cid(body)
+        with self.state.lock:
+            self.state.objects[cid] = body
+        self._send(200, {'Name': name or cid, 'Hash': cid, 'Size': str(len(body))})
+
+    def _cat(self, cid):
+        with self.state.lock:
+            content = self.state.objects.get(cid)
+        if content is None:
+            return self._error(500, f'block was not found locally (offline): {cid}')
+        self._send(200, content, 'application/octet-stream')
+
+    def _pin_ls(self, cid):
+        with self.state.lock:
+            pinned = cid in self.state.pins
+        if not pinned:
+            return self._error(500, f"path '{cid}' is not pinned")
+        self._send(200, {'Keys': {cid: {'Type': 'recursive'}}})
+
+    def _pin(self, cid):
+        with self.state.lock:
+            known = cid in self.state.objects
+            if known:
+                self.state.pins.add(cid)
+        if not known:
+            return self._error(500, f'pin: block was not found locally (offline): {cid}')
+        self._send(200, {'Pins': [cid]})
+
+    do_GET = _handle
+    do_POST = _handle
+
+
+class StandinServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 drops connects under load tests, which then stall on SYN retries
+    request_queue_size = 1024
+
+
+def make_server(host='127.0.0.1', port=5055, **settings):
+    """Build a stand-in server; call serve_forever() on it (e.g. from a thread)"""
+    handler = type('Handler', (StandinHandler,), {'state': StandinState(**settings)})
+    server = StandinServer((host, port), handler)
+    server.state = handler.state
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every request')
+    parser.add_argument('--jitter', type=float, default=0.0, help='up to this many extra random seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests that fail')
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--throttle-rps', type=float, default=0.0, help='requests per second before 429s, 0 = off')
+    parser.add_argument('--burst', type=float, default=None, help='token bucket size, defaults to the rate')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, latency=args.latency, jitter=args.jitter,
+                         error_rate=args.error_rate, error_status=args.error_status,
+                         throttle_rps=args.throttle_rps, burst=args.burst, seed=args.seed)
+    print(f'IPFS stand-in listening on http://{args.host}:{server.server_port}')
+    print(f'Run the app with IPFS_API_URL=http://{args.host}:{server.server_port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
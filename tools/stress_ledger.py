@@ -0,0 +1,164 @@
+"""Concurrency stress test for the SkillCoin ledger.
+
+Starts several processes, each with several threads, that post random
+transfers to /create_transaction against a throwaway SQLite database, then
+checks the invariants the ledger must keep under contention:
+
+  * the total number of SkillCoins is unchanged
+  * no balance is negative
+  * every balance equals its starting value plus its ledger entries
+  * every committed transaction has exactly one debit and one credit
+
+Usage: python tools/stress_ledger.py [--processes 4] [--threads 4] [--transfers 200]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _load_app(database_path):
+    # Point the app at the scratch database before it creates its engine
+    os.environ['IPFS_PUBLISHER_AUTOSTART'] = 'false'
+    sys.path.insert(0, ROOT)
+    import config
+    config.Config.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + database_path
+    config.Config.SQLITE_BUSY_TIMEOUT = '30000'
+    import app
+    return app
+
+
+def _setup(database_path, users, balance):
+    app = _load_app(database_path)
+    from models import db, User, Skill
+    with app.app.app_context():
+        db.create_all()
+        db.session.add_all([
+            User(name=f'User {i}', email=f'user{i}@example.com', skillcoins_balance=balance)
+            for i in range(users)
+        ])
+        db.session.flush()
+        db.session.add_all([
+            Skill(user_id=user.id, skill_name=f'Skill {user.id}', is_offered=True)
+            for user in User.query.all()
+        ])
+        db.session.commit()
+        return [(skill.user_id, skill.id) for skill in Skill.query.all()]
+
+
+def _worker(database_path, offers, threads, transfers, seed, results):
+    app = _load_app(database_path)
+    outcomes = {}
+    lock = threading.Lock()
+
+    def run(thread_seed):
+        rng = random.Random(thread_seed)
+        client = app.app.test_client()
+        for _ in range(transfers):
+            (offerer_id, skill_id), (requester_id, _) = rng.sample(offers, 2)
+            response = client.post('/create_transaction', json={
+                'offerer_id': offerer_id,
+                'requester_id': requester_id,
+                'skill_id': skill_id,
+                'amount_paid': rng.randint(1, 5)
+            })
+            key = response.status_code
+            if key != 200:
+                key = f'{key} {response.get_json().get("error")}'
+            with lock:
+                outcomes[key] = outcomes.get(key, 0) + 1
+
+    pool = [threading.Thread(target=run, args=(seed * 1000 + i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    results.put(outcomes)
+
+
+def _check(database_path, users, balance):
+    app = _load_app(database_path)
+    from models import db, User, Transaction, LedgerEntry
+    failures = []
+    with app.app.app_context():
+        balances = dict(db.session.query(User.id, User.skillcoins_balance))
+        ledger = dict(db.session.query(LedgerEntry.user_id, db.func.sum(LedgerEntry.amount))
+                      .group_by(LedgerEntry.user_id))
+
+        total = sum(balances.values())
+        if abs(total - users * balance) > 1e-6:
+            failures.append(f'total balance {total} != {users * balance}')
+
+        for user_id, value in balances.items():
+            if value < 0:
+                failures.append(f'user {user_id} has a negative balance {value}')
+            expected = balance + (ledger.get(user_id) or 0)
+            if abs(value - expected) > 1e-6:
+                failures.append(f'user {user_id} balance {value} != ledger total {expected}')
+
+        legs = db.session.query(
+            Transaction.id,
+            db.func.count(LedgerEntry.id),
+            db.func.coalesce(db.func.sum(LedgerEntry.amount), 0)
+        ).outerjoin(LedgerEntry, LedgerEntry.transaction_id == Transaction.id).group_by(Transaction.id).all()
+        for transaction_id, count, net in legs:
+            if count != 2 or abs(net) > 1e-6:
+                failures.append(f'transaction {transaction_id} has {count} ledger entries netting {net}')
+
+        return len(legs), failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--transfers', type=int, default=200, help='transfers per thread')
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--balance', type=float, default=20.0)
+    args = parser.parse_args()
+
+    database_path = os.path.join(tempfile.mkdtemp(prefix='coinnect-stress-'), 'stress.db')
+    context = multiprocessing.get_context('spawn')
+
+    # Each step runs in a fresh process so no engine is shared across processes
+    with context.Pool(1) as pool:
+        offers = pool.apply(_setup, (database_path, args.users, args.balance))
+
+    results = context.Queue()
+    workers = [
+        context.Process(target=_worker, args=(database_path, offers, args.threads, args.transfers, seed, results))
+        for seed in range(args.processes)
+    ]
+    for worker in workers:
+        worker.start()
+    outcomes = {}
+    for _ in workers:
+        for key, count in results.get().items():
+            outcomes[key] = outcomes.get(key, 0) + count
+    for worker in workers:
+        worker.join()
+
+    with context.Pool(1) as pool:
+        committed, failures = pool.apply(_check, (database_path, args.users, args.balance))
+
+    print(f'database: {database_path}')
+    for key, count in sorted(outcomes.items(), key=str):
+        print(f'  {key}: {count}')
+    print(f'committed transactions: {committed}')
+
+    if outcomes.get(200, 0) != committed:
+        failures.append(f'{outcomes.get(200, 0)} successful responses but {committed} transactions stored')
+    for failure in failures:
+        print('FAIL', failure)
+    if failures:
+        sys.exit(1)
+    print('ledger invariants hold')
+
+
+if __name__ == '__main__':
+    main()
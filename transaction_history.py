@@ -0,0 +1,117 @@
+"""Keyset-paginated transaction history of one user, newest first.
+
+Pages are ordered by (transaction_date, id) descending and fetched in one
+statement: the given and received sides are each read from their own
+(user, date) index, limited, merged and limited again, with the skill name
+joined in. A cursor is the (transaction_date, id) of the last row of the
+previous page, encoded as an opaque token.
+
+On SQLite, dates are compared as stored rather than as datetimes: SQLite
+keeps them as text, and rows written by CURRENT_TIMESTAMP lack the
+microseconds SQLAlchemy adds to bound datetimes, so a datetime cursor would
+not compare equal to the row it came from. Other backends have a real
+datetime type, so there the column is compared as a datetime and the
+cursor carries it as an ISO 8601 string.
+"""
+import base64
+import datetime
+import json
+
+from models import db, Skill, Transaction
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(stored_date, transaction_id):
+    if isinstance(stored_date, datetime.datetime):
+        stored_date = stored_date.isoformat()
+    raw = json.dumps([stored_date, transaction_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """(stored date, id) from a cursor token; raises InvalidCursor"""
+    try:
+        stored_date, transaction_id = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except (TypeError, ValueError):
+        raise InvalidCursor('Invalid history cursor')
+    if not isinstance(stored_date, str) or not isinstance(transaction_id, int):
+        raise InvalidCursor('Invalid history cursor')
+    try:
+        datetime.datetime.fromisoformat(stored_date)
+    except ValueError:
+        raise InvalidCursor('Invalid history cursor')
+    return stored_date, transaction_id
+
+
+def _dates_as_text():
+    return db.session.get_bind().dialect.name == 'sqlite'
+
+
+def _stored_date(as_text):
+    # On SQLite the column without DateTime conversion, for cursors and comparisons
+    if as_text:
+        return db.type_coerce(Transaction.transaction_date, db.String)
+    return Transaction.transaction_date
+
+
+def _side(user_column, user_id, kind, cursor, limit, exclude_column=None, as_text=True):
+    stored_date = _stored_date(as_text)
+    statement = db.select(
+        Transaction.id,
+        stored_date.label('stored_date'),
+        Transaction.skill_id,
+        Transaction.amount_paid,
+        db.literal(kind).label('type')
+    ).where(user_column == user_id)
+    if exclude_column is not None:
+        # A self-transaction is listed once, as given
+        statement = statement.where(exclude_column != user_id)
+    if cursor is not None:
+        statement = statement.where(db.tuple_(stored_date, Transaction.id) < db.tuple_(*cursor))
+    return statement.order_by(stored_date.desc(), Transaction.id.desc()).limit(limit).subquery()
+
+
+def history_statement(user_id, cursor=None, limit=50, dates_as_text=True):
+    """Up to limit history rows after cursor, skill name joined in; dates_as_text is for SQLite"""
+    if cursor is not None and not dates_as_text:
+        cursor = (datetime.datetime.fromisoformat(cursor[0]), cursor[1])
+    given = _side(Transaction.offerer_id, user_id, 'given', cursor, limit, as_text=dates_as_text)
+    received = _side(Transaction.requester_id, user_id, 'received', cursor, limit,
+                     exclude_column=Transaction.offerer_id, as_text=dates_as_text)
+    merged = db.union_all(db.select(given), db.select(received)).subquery()
+    return db.select(
+        merged.c.id, merged.c.stored_date, merged.c.amount_paid, merged.c.type, Skill.skill_name
+    ).outerjoin(Skill, Skill.id == merged.c.skill_id).order_by(
+        merged.c.stored_date.desc(), merged.c.id.desc()
+    ).limit(limit)
+
+
+def _display_date(stored_date):
+    if stored_date is None:
+        return None
+    if isinstance(stored_date, str):
+        stored_date = datetime.datetime.fromisoformat(stored_date)
+    return stored_date.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def history_page(user_id, cursor=None, limit=50):
+    """(entries, next cursor or None) for one page of a user's history"""
+    # One extra row tells whether another page follows
+    rows = db.session.execute(history_statement(user_id, cursor, limit + 1, _dates_as_text())).all()
+    entries = [
+        {
+            'id': row.id,
+            'date': _display_date(row.stored_date),
+            'skill': row.skill_name if row.skill_name is not None else 'Unknown',
+            'amount': row.amount_paid,
+            'type': row.type
+        } for row in rows[:limit]
+    ]
+    next_cursor = None
+    if len(rows) > limit and rows[limit - 1].stored_date is not None:
+        last = rows[limit - 1]
+        next_cursor = encode_cursor(last.stored_date, last.id)
+    return entries, next_cursor
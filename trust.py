@@ -0,0 +1,199 @@
+"""Trust score rules and the batch recompute that replays them.
+
+The routes change User.trust_score in place: +OFFERER_TRUST_INCREMENT and
++REQUESTER_TRUST_INCREMENT for each transaction, and an exponentially
+weighted average with RATING_WEIGHT for each rating received. Every event
+is an affine map x -> a*x + b, so a user's score is their maps composed in
+order and applied to INITIAL_TRUST_SCORE.
+
+recompute() streams every event ordered by user and time and composes the
+maps chunk by chunk with NumPy. It compares the result with the stored
+score and bulk-writes only the scores that changed. An incremental run
+replays only the users with ratings or transactions newer than the last
+TrustCheckpoint.
+"""
+import numpy as np
+
+from models import db, User, Transaction, TrustScore, TrustCheckpoint
+
+INITIAL_TRUST_SCORE = 5.0
+OFFERER_TRUST_INCREMENT = 0.1
+REQUESTER_TRUST_INCREMENT = 0.05
+RATING_WEIGHT = 0.1  # New score = (1 - w) * old + w * rating
+
+RECOMPUTE_CHUNK_SIZE = 50000
+DIVERGENCE_TOLERANCE = 1e-6
+
+# Event kinds, in the order events at the same instant are applied
+_BASE, _GIVEN, _RECEIVED, _RATING = 0, 1, 2, 3
+
+
+def _event_statement(users=None):
+    """Every user's stored score followed by their events, in replay order.
+
+    users, when given, is a select of the user ids to replay. Dates are
+    compared as stored so all rows sort the same way whatever their format.
+    """
+    stored_date = lambda column: db.type_coerce(column, db.String)
+
+    def restrict(statement, column):
+        return statement.where(column.in_(users)) if users is not None else statement
+
+    base = restrict(db.select(
+        User.id.label('user_id'), db.literal(0).label('phase'), db.null().label('at'),
+        db.literal(_BASE).label('kind'), db.literal(0).label('event_id'),
+        db.func.coalesce(User.trust_score, 0.0).label('value'), User.trust_score.is_(None).label('missing')
+    ), User.id)
+    given = restrict(db.select(
+        Transaction.offerer_id, db.literal(1), stored_date(Transaction.transaction_date),
+        db.literal(_GIVEN), Transaction.id, db.literal(OFFERER_TRUST_INCREMENT), db.literal(False)
+    ), Transaction.offerer_id)
+    received = restrict(db.select(
+        Transaction.requester_id, db.literal(1), stored_date(Transaction.transaction_date),
+        db.literal(_RECEIVED), Transaction.id, db.literal(REQUESTER_TRUST_INCREMENT), db.literal(False)
+    ), Transaction.requester_id)
+    # Ratings made before created_at existed happened some time after their transaction
+    ratings = restrict(db.select(
+        TrustScore.user_id, db.literal(1),
+        stored_date(db.func.coalesce(TrustScore.created_at, Transaction.transaction_date)),
+        db.literal(_RATING), TrustScore.id, db.func.coalesce(TrustScore.score, 5.0), db.literal(False)
+    ).outerjoin(Transaction, Transaction.id == TrustScore.transaction_id), TrustScore.user_id)
+
+    events = db.union_all(base, given, received, ratings).subquery()
+    return db.select(events.c.user_id, events.c.kind, events.c.event_id, events.c.value, events.c.missing).order_by(
+        events.c.user_id, events.c.phase, events.c.at, events.c.kind, events.c.event_id
+    )
+
+
+def _touched_users(checkpoint):
+    """Select of the users with a rating or transaction after the checkpoint"""
+    return db.union(
+        db.select(TrustScore.user_id).where(TrustScore.id > checkpoint.last_rating_id),
+        db.select(Transaction.offerer_id).where(Transaction.id > checkpoint.last_transaction_id),
+        db.select(Transaction.requester_id).where(Transaction.id > checkpoint.last_transaction_id)
+    )
+
+
+def _compose(users, kinds, values):
+    """Per-user (multiplier, offset) of the maps in one chunk, sorted by user.
+
+    Within a run of one user's events, the map of event i is multiplied by
+    (1 - w) once for every rating after it, so offset = sum of b_i times
+    (1 - w) ** ratings_after_i and multiplier = (1 - w) ** ratings.
+    """
+    starts = np.flatnonzero(np.r_[True, users[1:] != users[:-1]])
+    segment = np.cumsum(np.r_[True, users[1:] != users[:-1]]) - 1
+
+    is_rating = kinds == _RATING
+    offsets = np.where(is_rating, RATING_WEIGHT * values, np.where(kinds == _BASE, 0.0, values))
+    ratings = np.bincount(segment, weights=is_rating, minlength=len(starts))
+    running = np.cumsum(is_rating)
+    ratings_through = running - (running[starts] - is_rating[starts])[segment]
+    ratings_after = ratings[segment] - ratings_through
+
+    decay = 1.0 - RATING_WEIGHT
+    offset = np.bincount(segment, weights=offsets * decay ** ratings_after, minlength=len(starts))
+    return users[starts], decay ** ratings, offset
+
+
+def _iter_scores(result, last_ids):
+    """(user ids, stored scores, recomputed scores) for each streamed chunk.
+
+    A user's events can span two chunks, so the last user of a chunk is
+    carried over and finished with the next one. last_ids is updated with
+    the highest rating and transaction ids seen.
+    """
+    carry = None  # (user, multiplier, offset, stored, has_user) of the previous chunk's last user
+    for rows in result.partitions():
+        # All columns are numbers, so one conversion gives every column as an array
+        users, kinds, event_ids, values, missing = np.array(list(map(tuple, rows)), dtype=np.float64).T
+        users, kinds, event_ids = users.astype(np.int64), kinds.astype(np.int8), event_ids.astype(np.int64)
+        values[missing == 1] = np.nan
+        last_ids['rating'] = max(last_ids['rating'], int(event_ids[kinds == _RATING].max(initial=0)))
+        last_ids['transaction'] = max(last_ids['transaction'],
+                                      int(event_ids[(kinds == _GIVEN) | (kinds == _RECEIVED)].max(initial=0)))
+
+        segment_users, multiplier, offset = _compose(users, kinds, values)
+        base = kinds == _BASE
+        stored = np.full(len(segment_users), np.nan)
+        has_user = np.zeros(len(segment_users), dtype=bool)
+        positions = np.searchsorted(segment_users, users[base])
+        stored[positions] = values[base]
+        has_user[positions] = True
+
+        if carry is not None:
+            if segment_users[0] == carry[0]:
+                # The carried user continues here: this chunk's maps apply after the carried ones
+                offset[0] += multiplier[0] * carry[2]
+                multiplier[0] *= carry[1]
+                stored[0], has_user[0] = carry[3], carry[4]
+            else:
+                yield _finish(*(np.array([value]) for value in carry))
+        carry = (segment_users[-1], multiplier[-1], offset[-1], stored[-1], has_user[-1])
+        yield _finish(segment_users[:-1], multiplier[:-1], offset[:-1], stored[:-1], has_user[:-1])
+
+    if carry is not None:
+        yield _finish(*(np.array([value]) for value in carry))
+
+
+def _finish(users, multiplier, offset, stored, has_user):
+    # Events of a user id with no user row (dangling foreign keys) are dropped
+    return users[has_user], stored[has_user], multiplier[has_user] * INITIAL_TRUST_SCORE + offset[has_user]
+
+
+def _write(changes, chunk_size):
+    """Write recomputed scores unless a route changed the score since it was read"""
+    table = User.__table__
+    statement = table.update().where(
+        table.c.id == db.bindparam('user_id'),
+        table.c.trust_score.is_not_distinct_from(db.bindparam('stored'))
+    ).values(trust_score=db.bindparam('recomputed'))
+    updated = 0
+    for start in range(0, len(changes), chunk_size):
+        updated += db.session.execute(statement, changes[start:start + chunk_size]).rowcount
+        db.session.commit()
+    return updated
+
+
+def recompute(incremental=False, dry_run=False, chunk_size=RECOMPUTE_CHUNK_SIZE, tolerance=DIVERGENCE_TOLERANCE):
+    """Replay trust events and fix stored scores that diverge from them.
+
+    Returns a summary dict; 'diverged' lists {user_id, stored,
+    recomputed} for every user whose stored score is off by more than
+    tolerance (or missing). Unless dry_run, those scores are written and a
+    checkpoint is recorded.
+    """
+    checkpoint = TrustCheckpoint.query.order_by(TrustCheckpoint.id.desc()).first() if incremental else None
+    mode = 'incremental' if checkpoint is not None else 'full'
+    users = _touched_users(checkpoint) if checkpoint is not None else None
+
+    # Stored scores and events come from one statement, so they agree with each other
+    result = db.session.connection().execution_options(yield_per=chunk_size).execute(_event_statement(users))
+    checked = 0
+    diverged = []
+    last_ids = {'rating': 0, 'transaction': 0}
+    for user_ids, stored, recomputed in _iter_scores(result, last_ids):
+        checked += len(user_ids)
+        off = np.isnan(stored) | (np.abs(stored - recomputed) > tolerance)
+        diverged.extend({
+            'user_id': int(user_id),
+            'stored': None if np.isnan(old) else float(old),
+            'recomputed': float(new)
+        } for user_id, old, new in zip(user_ids[off], stored[off], recomputed[off]))
+    db.session.commit()  # End the read
+
+    updated = 0
+    if not dry_run:
+        updated = _write(diverged, chunk_size)
+        if checkpoint is not None:
+            # Nothing new may have been replayed; never move the high-water marks back
+            last_ids['rating'] = max(last_ids['rating'], checkpoint.last_rating_id)
+            last_ids['transaction'] = max(last_ids['transaction'], checkpoint.last_transaction_id)
+        db.session.add(TrustCheckpoint(
+            mode=mode, last_rating_id=last_ids['rating'], last_transaction_id=last_ids['transaction'],
+            users_checked=checked, users_diverged=len(diverged), users_updated=updated
+        ))
+        db.session.commit()
+
+    return {'mode': mode, 'users_checked': checked, 'users_diverged': len(diverged),
+            'users_updated': updated, 'diverged': diverged}